@@ -0,0 +1,105 @@
+# abap_chunker.py
+import os
+import re
+
+# Source larger than this (in characters) is analysed in chunks
+ANALYSIS_CHUNK_CHARS = int(os.getenv("FSTS_ANALYSIS_CHUNK_CHARS", 24000))
+# Chunks analysed at the same time
+ANALYSIS_PARALLELISM = int(os.getenv("FSTS_ANALYSIS_PARALLELISM", 4))
+CHUNKED_ANALYSIS_ENABLED = os.getenv("FSTS_CHUNKED_ANALYSIS", "1") == "1"
+
+ROUTINE_START = re.compile(r"^\s*(FORM|MODULE|METHOD|FUNCTION)\s+([\w/~=>-]+)", re.IGNORECASE)
+ROUTINE_END = re.compile(r"^\s*END(FORM|MODULE|METHOD|FUNCTION)\b", re.IGNORECASE)
+
+
+def is_comment(line: str) -> bool:
+    return line.startswith("*") or line.lstrip().startswith('"')
+
+
+class CodeBlock:
+    """A routine (FORM/MODULE/METHOD/FUNCTION ... END*) or a run of code between routines."""
+
+    def __init__(self, kind, name, lines):
+        self.kind = kind  # "form", "module", "method", "function" or "code"
+        self.name = name
+        self.lines = lines
+
+    @property
+    def text(self):
+        return "\n".join(self.lines)
+
+    def __len__(self):
+        return sum(len(line) + 1 for line in self.lines)
+
+
+def split_blocks(code: str) -> list:
+    """
+    Split ABAP source at routine boundaries. The comment header directly above
+    a routine travels with it, so a routine never loses its documentation.
+    """
+    blocks = []
+    pending = []  # lines not yet assigned to a block
+    current = None
+    for line in code.splitlines():
+        if current is None:
+            m = ROUTINE_START.match(line)
+            if m:
+                # Split trailing comment header off the preceding code
+                header_start = len(pending)
+                while header_start > 0 and (is_comment(pending[header_start - 1]) or not pending[header_start - 1].strip()):
+                    header_start -= 1
+                if any(l.strip() for l in pending[:header_start]):
+                    blocks.append(CodeBlock("code", None, pending[:header_start]))
+                current = CodeBlock(m.group(1).lower(), m.group(2).rstrip("."), pending[header_start:] + [line])
+                pending = []
+            else:
+                pending.append(line)
+        else:
+            current.lines.append(line)
+            if ROUTINE_END.match(line):
+                blocks.append(current)
+                current = None
+    if current is not None:
+        blocks.append(current)  # unterminated routine
+    if any(l.strip() for l in pending):
+        blocks.append(CodeBlock("code", None, pending))
+    return blocks
+
+
+def chunk_code(code: str, max_chars: int = ANALYSIS_CHUNK_CHARS) -> list:
+    """
+    Group consecutive blocks into chunks of at most max_chars. A single block
+    larger than that is cut at line boundaries.
+    Returns a list of {"text", "routines"} dicts in source order.
+    """
+    chunks = []
+    lines, routines, size = [], [], 0
+
+    def flush():
+        nonlocal lines, routines, size
+        if lines:
+            chunks.append({"text": "\n".join(lines), "routines": routines})
+        lines, routines, size = [], [], 0
+
+    for block in split_blocks(code):
+        if size and size + len(block) > max_chars:
+            flush()
+        if len(block) > max_chars:
+            for line in block.lines:
+                if size and size + len(line) + 1 > max_chars:
+                    flush()
+                lines.append(line)
+                size += len(line) + 1
+                if block.name and block.name not in routines:
+                    routines.append(block.name)
+            continue
+        lines.extend(block.lines)
+        size += len(block)
+        if block.name:
+            routines.append(block.name)
+    flush()
+    return chunks
+
+
+def should_chunk(code: str) -> bool:
+    return CHUNKED_ANALYSIS_ENABLED and len(code) > ANALYSIS_CHUNK_CHARS
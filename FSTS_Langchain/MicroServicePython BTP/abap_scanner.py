@@ -0,0 +1,413 @@
+# abap_scanner.py
+# Deterministic pre-parse of ABAP source. Extracts the program skeleton
+# (selection screen, database access, call graph, internal tables, ALV output)
+# so the analyst gets a compact summary plus comment-free code instead of the
+# raw source. Pure Python and regex based; it runs in milliseconds.
+import os
+import re
+
+ABAP_PREPARSE_ENABLED = os.getenv("FSTS_ABAP_PREPARSE", "1") == "1"
+
+QUOTES = "'`|"  # text literals, string literals and string templates
+
+EVENTS = re.compile(
+    r"^(LOAD-OF-PROGRAM|INITIALIZATION|START-OF-SELECTION|END-OF-SELECTION|TOP-OF-PAGE"
+    r"|END-OF-PAGE|AT SELECTION-SCREEN(?: \S+)*|AT LINE-SELECTION|AT USER-COMMAND)$",
+    re.IGNORECASE,
+)
+ROUTINE = re.compile(r"^(FORM|MODULE|METHOD|FUNCTION) ([\w/~=>-]+)", re.IGNORECASE)
+ROUTINE_END = re.compile(r"^END(FORM|MODULE|METHOD|FUNCTION)$", re.IGNORECASE)
+PROGRAM = re.compile(r"^(REPORT|PROGRAM|FUNCTION-POOL|CLASS-POOL) ([\w/]+)", re.IGNORECASE)
+INCLUDE = re.compile(r"^INCLUDE (?!STRUCTURE\b|TYPE\b)([\w/]+)", re.IGNORECASE)
+INCLUDE_STRUCTURE = re.compile(r"^INCLUDE (STRUCTURE|TYPE) ([\w/]+)", re.IGNORECASE)
+TABLES = re.compile(r"^TABLES ([\w/]+)", re.IGNORECASE)
+PARAMETER = re.compile(r"^PARAMETERS? ([\w/]+)(.*)$", re.IGNORECASE)
+SELECT_OPTION = re.compile(r"^SELECT-OPTIONS ([\w/]+) FOR (\S+)(.*)$", re.IGNORECASE)
+PERFORM = re.compile(r"^PERFORM ([\w/]+)(?: IN PROGRAM ([\w/]+))?", re.IGNORECASE)
+CALL_FUNCTION = re.compile(r"\bCALL FUNCTION '([^']+)'", re.IGNORECASE)
+SELECT = re.compile(r"\bSELECT (SINGLE )?(.*?) FROM ", re.IGNORECASE)
+FROM_TABLE = re.compile(r"\b(?:FROM|JOIN) ([\w/]+)", re.IGNORECASE)
+FOR_ALL_ENTRIES = re.compile(r"\bFOR ALL ENTRIES IN ([\w/<>-]+)", re.IGNORECASE)
+DB_WRITE = re.compile(
+    r"^(UPDATE|INSERT|MODIFY|DELETE)(?: FROM)? ([\w/]+)(?= FROM\b| SET\b| WHERE\b| VALUES\b|$)",
+    re.IGNORECASE,
+)
+DECLARATION = re.compile(r"^(DATA|CLASS-DATA|STATICS|TYPES) ([\w/]+) (TYPE|LIKE) (.+)$", re.IGNORECASE)
+TABLE_OF = re.compile(
+    r"^(?:(STANDARD|SORTED|HASHED|INDEX|ANY) )?TABLE OF (?:REF TO )?([\w/-]+)(.*)$", re.IGNORECASE
+)
+BEGIN_OF = re.compile(r"^(DATA|TYPES) BEGIN OF ([\w/]+)( OCCURS \d+)?", re.IGNORECASE)
+END_OF = re.compile(r"^(DATA|TYPES) END OF ([\w/]+)", re.IGNORECASE)
+ALV_CALL = re.compile(
+    r"\b(REUSE_ALV_\w+|CL_SALV_TABLE=>FACTORY|CL_SALV_TREE=>FACTORY|CL_SALV_HIERSEQ_TABLE=>FACTORY"
+    r"|SET_TABLE_FOR_FIRST_DISPLAY)\b",
+    re.IGNORECASE,
+)
+ALV_TABLE = re.compile(r"\b(?:T_OUTTAB|IT_OUTTAB|T_TABLE) = ([\w/<>-]+)", re.IGNORECASE)
+WRITE = re.compile(r"^WRITE\b", re.IGNORECASE)
+
+
+def _split_outside_literals(text, separators):
+    """Yield (index, char) for each separator char that is not inside a literal."""
+    quote = None
+    for i, ch in enumerate(text):
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in QUOTES:
+            quote = ch
+        elif ch in separators:
+            yield i, ch
+
+
+def _strip_line_comment(line):
+    if line.startswith("*"):
+        return ""
+    for i, _ in _split_outside_literals(line, '"'):
+        return line[:i]
+    return line
+
+
+def _collapse_spaces(line):
+    """Collapse runs of blanks outside literals (alignment padding) but keep indentation."""
+    indent = len(line) - len(line.lstrip())
+    out, quote, prev_blank = [], None, False
+    for ch in line[indent:]:
+        if quote:
+            out.append(ch)
+            if ch == quote:
+                quote = None
+            continue
+        if ch in QUOTES:
+            quote = ch
+        if ch in " \t":
+            if prev_blank:
+                continue
+            prev_blank = True
+            out.append(" ")
+            continue
+        prev_blank = False
+        out.append(ch)
+    return line[:indent] + "".join(out)
+
+
+def strip_comments(code: str) -> str:
+    """
+    Return the logic-bearing code: full-line (*) and end-of-line (") comments,
+    blank lines and alignment padding removed.
+    """
+    lines = []
+    for line in code.splitlines():
+        line = _strip_line_comment(line).rstrip()
+        if line.strip():
+            lines.append(_collapse_spaces(line))
+    return "\n".join(lines)
+
+
+def split_statements(code: str) -> list:
+    """
+    Split comment-free ABAP into single-line statements, expanding chains
+    ('DATA: a TYPE i, b TYPE c.' becomes two statements).
+    """
+    text = " ".join(strip_comments(code).split("\n"))
+    statements, start = [], 0
+    for i, _ in _split_outside_literals(text, "."):
+        if i + 1 == len(text) or text[i + 1].isspace():
+            statements.append(text[start:i])
+            start = i + 1
+    statements.append(text[start:])
+
+    expanded = []
+    for stmt in statements:
+        stmt = " ".join(stmt.split())
+        if not stmt:
+            continue
+        colon = next((i for i, _ in _split_outside_literals(stmt, ":")), None)
+        if colon is None:
+            expanded.append(stmt)
+            continue
+        prefix, rest = stmt[:colon].strip(), stmt[colon + 1:]
+        parts, last = [], 0
+        for i, _ in _split_outside_literals(rest, ","):
+            parts.append(rest[last:i])
+            last = i + 1
+        parts.append(rest[last:])
+        expanded.extend(f"{prefix} {p.strip()}".strip() for p in parts if p.strip())
+    return expanded
+
+
+def _option(pattern, text):
+    m = re.search(pattern, text, re.IGNORECASE)
+    return m.group(1) if m else None
+
+
+SIGNATURE_KEYWORDS = {"USING", "CHANGING", "TABLES", "RAISING", "IMPORTING", "EXPORTING", "RETURNING", "OPTIONAL"}
+TYPE_KEYWORDS = {"TYPE", "LIKE", "STRUCTURE", "TO", "REF", "STANDARD", "SORTED", "HASHED", "ANY", "TABLE", "OF", "LINE"}
+
+
+def _signature_parameters(signature):
+    """Parameter names of a FORM signature (type names after TYPE/LIKE are skipped)."""
+    names, typing = set(), False
+    for token in re.findall(r"[\w/()-]+", signature):
+        word = token.upper()
+        if word in TYPE_KEYWORDS:
+            typing = True
+        elif word in SIGNATURE_KEYWORDS:
+            typing = False
+        elif typing:
+            typing = False  # the type name itself
+        else:
+            names.add(re.sub(r"^VALUE\((.*)\)$", r"\1", token, flags=re.IGNORECASE).lower())
+    return names
+
+
+def scan_abap(code: str) -> dict:
+    """Scan ABAP source and return its structure as plain dicts and lists."""
+    statements = split_statements(code)
+    structure = {
+        "program": None,
+        "includes": [],
+        "tables_statement": [],
+        "selection_screen": [],
+        "routines": [],
+        "calls": {},  # routine/event -> {"perform": [...], "function": [...]}
+        "db_access": {},  # table -> {"read": [...routines], "write": [...], "fields": [...], "for_all_entries": bool}
+        "internal_tables": [],
+        "local_types": {},  # type name -> [field declarations]
+        "alv": [],
+        "write_statements": 0,
+        "statement_count": len(statements),
+    }
+
+    declared = set()
+    table_types = {}
+    for stmt in statements:
+        m = DECLARATION.match(stmt)
+        if m:
+            declared.add(m.group(2).lower())
+            t = TABLE_OF.match(m.group(4))
+            if m.group(1).upper() == "TYPES" and t:
+                table_types[m.group(2).lower()] = t
+        m = BEGIN_OF.match(stmt)
+        if m:
+            declared.add(m.group(2).lower())
+        m = ROUTINE.match(stmt)
+        if m:  # routine parameters are data objects too
+            declared.update(_signature_parameters(stmt[m.end():]))
+
+    current = "(main program)"
+    in_routine = False
+    open_types = []  # stack of TYPES/DATA BEGIN OF names
+
+    def calls_of(routine):
+        return structure["calls"].setdefault(routine, {"perform": [], "function": []})
+
+    def add_unique(items, value):
+        if value not in items:
+            items.append(value)
+
+    for stmt in statements:
+        upper = stmt.upper()
+
+        m = PROGRAM.match(stmt)
+        if m and not structure["program"]:
+            structure["program"] = m.group(2)
+            continue
+        m = INCLUDE.match(stmt)
+        if m:
+            add_unique(structure["includes"], m.group(1))
+            continue
+        m = TABLES.match(stmt)
+        if m:
+            add_unique(structure["tables_statement"], m.group(1))
+            continue
+
+        if EVENTS.match(stmt):
+            current, in_routine = upper, False
+            continue
+        m = ROUTINE.match(stmt)
+        if m:
+            current, in_routine = m.group(2), True
+            signature = stmt[m.end():].strip()
+            structure["routines"].append({"kind": m.group(1).lower(), "name": current, "signature": signature})
+            continue
+        if ROUTINE_END.match(stmt):
+            current, in_routine = "(main program)", False
+            continue
+        scope = current if in_routine else "global"  # declarations in events are global
+
+        m = SELECT_OPTION.match(stmt)
+        if m:
+            structure["selection_screen"].append({
+                "kind": "SELECT-OPTIONS", "name": m.group(1), "for": m.group(2),
+                "obligatory": "OBLIGATORY" in m.group(3).upper(),
+                "no_intervals": "NO INTERVALS" in m.group(3).upper(),
+                "default": _option(r"\bDEFAULT (\S+)", m.group(3)),
+            })
+            continue
+        m = PARAMETER.match(stmt)
+        if m:
+            rest = m.group(2)
+            structure["selection_screen"].append({
+                "kind": "PARAMETERS", "name": m.group(1),
+                "type": _option(r"\b(?:TYPE|LIKE) (\S+)", rest),
+                "radiobutton_group": _option(r"\bRADIOBUTTON GROUP (\S+)", rest),
+                "checkbox": "AS CHECKBOX" in rest.upper(),
+                "obligatory": "OBLIGATORY" in rest.upper(),
+                "default": _option(r"\bDEFAULT ('[^']*'|\S+)", rest),
+            })
+            continue
+
+        m = BEGIN_OF.match(stmt)
+        if m:
+            open_types.append(m.group(2))
+            structure["local_types"].setdefault(m.group(2), [])
+            if m.group(3):  # DATA BEGIN OF itab OCCURS n: table with header line
+                structure["internal_tables"].append(
+                    {"name": m.group(2), "kind": "STANDARD", "row_type": m.group(2), "routine": scope})
+            continue
+        m = INCLUDE_STRUCTURE.match(stmt)
+        if m and open_types:
+            structure["local_types"][open_types[-1]].append(f"INCLUDE {m.group(1).upper()} {m.group(2)}")
+            continue
+        m = END_OF.match(stmt)
+        if m:
+            if open_types and open_types[-1].lower() == m.group(2).lower():
+                open_types.pop()
+            continue
+        m = DECLARATION.match(stmt)
+        if m:
+            if open_types:
+                structure["local_types"][open_types[-1]].append(f"{m.group(2)} {m.group(3).upper()} {m.group(4)}")
+                continue
+            kind, name, rest = m.group(1).upper(), m.group(2), m.group(4)
+            t = TABLE_OF.match(rest) or table_types.get(rest.split()[0].lower())
+            if t and kind != "TYPES":
+                structure["internal_tables"].append({
+                    "name": name, "kind": (t.group(1) or "STANDARD").upper(),
+                    "row_type": t.group(2), "routine": scope,
+                })
+            continue
+
+        m = PERFORM.match(stmt)
+        if m:
+            target = m.group(1) if not m.group(2) else f"{m.group(1)} IN PROGRAM {m.group(2)}"
+            add_unique(calls_of(current)["perform"], target)
+        for fm in CALL_FUNCTION.findall(stmt):
+            add_unique(calls_of(current)["function"], fm)
+
+        alv = ALV_CALL.search(stmt)
+        if alv:
+            structure["alv"].append({
+                "call": alv.group(1).upper(), "routine": current,
+                "table": _option(ALV_TABLE.pattern, stmt),
+            })
+
+        if WRITE.match(stmt):
+            structure["write_statements"] += 1
+
+        sel = SELECT.search(stmt)
+        if sel:
+            for table in FROM_TABLE.findall(stmt[sel.start():]):
+                if table.lower() in declared:
+                    continue
+                access = structure["db_access"].setdefault(
+                    table.lower(), {"read": [], "write": [], "fields": [], "for_all_entries": False})
+                add_unique(access["read"], current)
+                fields = re.split(r" INTO ", sel.group(2), flags=re.IGNORECASE)[0]
+                fields = " ".join(fields.replace(",", " ").split())
+                add_unique(access["fields"], "*" if fields == "*" else fields[:120])
+                access["for_all_entries"] |= bool(FOR_ALL_ENTRIES.search(stmt))
+            continue
+        m = DB_WRITE.match(stmt)
+        if m and m.group(2).lower() not in declared and not m.group(2).upper().startswith(("SCREEN", "ADJACENT")):
+            access = structure["db_access"].setdefault(
+                m.group(2).lower(), {"read": [], "write": [], "fields": [], "for_all_entries": False})
+            add_unique(access["write"], f"{current} ({m.group(1).upper()})")
+
+    return structure
+
+
+def format_structure(structure: dict) -> str:
+    """Render the scanned structure as a compact text summary for the prompts."""
+    out = []
+    program = structure["program"] or "(not declared)"
+    out.append(f"Program: {program}; {structure['statement_count']} statements")
+    if structure["includes"]:
+        out.append("Includes: " + ", ".join(structure["includes"]))
+    if structure["tables_statement"]:
+        out.append("TABLES: " + ", ".join(structure["tables_statement"]))
+
+    if structure["selection_screen"]:
+        out.append("\nSelection screen:")
+        for field in structure["selection_screen"]:
+            if field["kind"] == "SELECT-OPTIONS":
+                line = f"- SELECT-OPTIONS {field['name']} FOR {field['for']}"
+                if field["no_intervals"]:
+                    line += " NO INTERVALS"
+            else:
+                line = f"- PARAMETERS {field['name']}"
+                if field["type"]:
+                    line += f" TYPE {field['type']}"
+                if field["radiobutton_group"]:
+                    line += f" RADIOBUTTON GROUP {field['radiobutton_group']}"
+                if field["checkbox"]:
+                    line += " AS CHECKBOX"
+            if field["obligatory"]:
+                line += " OBLIGATORY"
+            if field["default"]:
+                line += f" DEFAULT {field['default']}"
+            out.append(line)
+
+    if structure["db_access"]:
+        out.append("\nDatabase access:")
+        for table, access in sorted(structure["db_access"].items()):
+            parts = []
+            if access["read"]:
+                fields = "; ".join(access["fields"])
+                fae = ", FOR ALL ENTRIES" if access["for_all_entries"] else ""
+                parts.append(f"read in {', '.join(access['read'])} [{fields}{fae}]")
+            if access["write"]:
+                parts.append(f"written in {', '.join(access['write'])}")
+            out.append(f"- {table.upper()}: " + "; ".join(parts))
+
+    if structure["calls"]:
+        out.append("\nCall graph:")
+        for routine, calls in structure["calls"].items():
+            targets = calls["perform"] + [f"CALL FUNCTION {fm}" for fm in calls["function"]]
+            if targets:
+                out.append(f"- {routine} -> " + ", ".join(targets))
+
+    if structure["routines"]:
+        out.append("\nRoutines:")
+        for routine in structure["routines"]:
+            signature = f" {routine['signature']}" if routine["signature"] else ""
+            out.append(f"- {routine['kind'].upper()} {routine['name']}{signature}")
+
+    if structure["internal_tables"]:
+        out.append("\nInternal tables:")
+        for itab in structure["internal_tables"]:
+            scope = "global" if itab["routine"] == "global" else f"in {itab['routine']}"
+            out.append(f"- {itab['name']}: {itab['kind']} TABLE OF {itab['row_type']} ({scope})")
+
+    if structure["local_types"]:
+        out.append("\nLocal structures:")
+        for name, fields in structure["local_types"].items():
+            out.append(f"- {name}: " + ", ".join(fields))
+
+    output = [f"{a['call']} in {a['routine']}" + (f" (table {a['table']})" if a["table"] else "")
+              for a in structure["alv"]]
+    if structure["write_statements"]:
+        output.append(f"{structure['write_statements']} WRITE statement(s) (classical list)")
+    if output:
+        out.append("\nOutput:")
+        out.extend(f"- {line}" for line in output)
+
+    return "\n".join(out)
+
+
+def prepare_analysis_inputs(code: str) -> dict:
+    """State entries derived from the source: the structure summary and the comment-free code."""
+    if not ABAP_PREPARSE_ENABLED:
+        return {"abap_structure": "(structural pre-parse disabled)", "analysis_code": code}
+    return {"abap_structure": format_structure(scan_abap(code)), "analysis_code": strip_comments(code)}
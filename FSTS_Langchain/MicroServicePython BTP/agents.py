@@ -1,34 +1,45 @@
 # agents.py
-import re
 # from langchain_core.messages import HumanMessage
 # from langgraph.graph import MessagesState
 # from tasks import analyze_code_task, functional_spec_task, technical_spec_task, initial_consolidation_task, output_review_feedback_task, final_specification_task
-from utils import add_token_usage, load_prompt, format_user_prompt, parse_route
+from utils import parse_route
+from llm_backends import invoke_node, ainvoke_node
+from prompt_registry import get_prompt
+from abap_chunker import should_chunk
+from chunked_analysis import run_chunked_analysis, run_chunked_analysis_async
+from token_estimator import fit_to_budget
+from convergence import after_review, after_revision
+from section_revision import plan_revision, record_plan, revise_sections, arevise_sections
 import inspect
-from langchain.prompts import ChatPromptTemplate, PromptTemplate
 
 
 def get_self_name():
     return inspect.currentframe().f_back.f_code.co_name
 
+def format_agent_prompt(agent_name, state):
+    # YAML prompts are compiled into a ChatPromptTemplate once by the prompt registry
+    chat_prompt = get_prompt(agent_name).chat_prompt
+
+    # Format with state variables
+    return chat_prompt.format_messages(**state)
+
 def generic_run_agent(agent_name, state, output_key, next_node):
-    prompt_def = load_prompt(agent_name)
+    # Trims low-value context if the prompt would exceed the token budget
+    formatted_prompt = fit_to_budget(agent_name, state, lambda s: format_agent_prompt(agent_name, s))
+
+    # Invoke the node's model (escalates to the stronger model on invalid output)
+    response = invoke_node(agent_name, formatted_prompt, state)
 
-    # Convert YAML prompts into a LangChain ChatPromptTemplate
-    chat_prompt = ChatPromptTemplate.from_messages([
-        ("system", prompt_def["system_prompt"]),
-        ("user", prompt_def["user_prompt"])
-    ])
+    state[output_key] = response.content
+    state["next_node"] = next_node
+    return state
 
-    print("chat_prompt: ",chat_prompt)
+async def generic_run_agent_async(agent_name, state, output_key, next_node):
+    # Trims low-value context if the prompt would exceed the token budget
+    formatted_prompt = fit_to_budget(agent_name, state, lambda s: format_agent_prompt(agent_name, s))
 
-    # Format with state variables
-    formatted_prompt = chat_prompt.format_messages(**state)
-    
-    print("formatted_prompt: ",formatted_prompt)
-    # Invoke model
-    response = state["model"].invoke(formatted_prompt)
-    add_token_usage(response, agent_name)
+    # Invoke the node's model without blocking the event loop
+    response = await ainvoke_node(agent_name, formatted_prompt, state)
 
     state[output_key] = response.content
     state["next_node"] = next_node
@@ -36,6 +47,11 @@ def generic_run_agent(agent_name, state, output_key, next_node):
 
 def abap_code_analyst(state):
     agent_name = get_self_name()
+    if should_chunk(state["analysis_code"]):
+        # Too large for one prompt: analyse routine-aligned chunks, then merge
+        state["abap_analysis"] = run_chunked_analysis(state)
+        state["next_node"] = "foreign_dependency_agent"
+        return state
     return generic_run_agent(agent_name, state, output_key="abap_analysis", next_node="foreign_dependency_agent")
 
 def foreign_dependency_agent(state):
@@ -50,9 +66,9 @@ def technical_spec_writer(state):
     agent_name = get_self_name()
     return generic_run_agent(agent_name, state, output_key="ts_output", next_node="manager_agent")
 
-def manager_agent(state):
-    agent_name = get_self_name()
-    prompt_def = load_prompt(agent_name)
+def build_manager_prompt(state):
+    prompt = get_prompt("manager_agent")
+    prompt_def = prompt.definition
 
     # --- Determine dynamic blocks based on feedback ---
     output_reviewer_feedback = state.get("review_feedback", "")
@@ -73,12 +89,7 @@ def manager_agent(state):
         feedback_block = f"--- Functional Spec ---\n{fs}\n\n--- Technical Spec ---\n{ts}\n--- Foreign Dependencies ---\n{fd}\n"
 
     # Use LangChain ChatPromptTemplate for message formatting
-    chat_prompt = ChatPromptTemplate.from_messages([
-        ("system", prompt_def["system_prompt"]),
-        ("user", prompt_def["user_prompt"])
-    ])
-    
-    formatted_prompt = chat_prompt.format_messages(
+    return prompt.chat_prompt.format_messages(
         task_description=task_description,
         task_expected_output=task_expected_output,
         template_text=state["template_text"],
@@ -86,13 +97,11 @@ def manager_agent(state):
         feedback_block=feedback_block,
     )
 
-    state["last_user_prompt"] = formatted_prompt[1].content
-
-    response = state["model"].invoke(formatted_prompt)
-    add_token_usage(response, agent_name)
+def apply_manager_response(state, response):
+    return update_manager_output(state, response.content, parse_route(response.content))
 
+def update_manager_output(state, document, route):
     # --- Dynamic routing logic ---
-    route = parse_route(response.content)
     review_count = state.get("review_count", 0)
     max_reviews = state["max_output_reviews"]
     min_reviews = state["min_output_reviews"]
@@ -103,16 +112,74 @@ def manager_agent(state):
         route = "final_output"
 
     # --- Update state ---
-    state["manager_output"] = response.content
-    state["next_node"] = route
+    previous_output = state.get("manager_output")
+    state["manager_output"] = document
+    state["next_node"] = after_revision(state, previous_output, route)
 
     return state
 
+def section_revision_plan(state):
+    """Plan for rewriting only the sections the review flagged, or None for a full manager pass."""
+    feedback = state.get("review_feedback", "")
+    if not (feedback and feedback.strip() and state.get("manager_output")):
+        return None  # initial consolidation
+    plan = plan_revision(state["manager_output"], feedback)
+    record_plan(state, plan)
+    return plan if plan["mode"] == "sections" else None
+
+def manager_agent(state):
+    agent_name = get_self_name()
+    plan = section_revision_plan(state)
+    if plan:
+        return update_manager_output(state, revise_sections(state, plan), "output_reviewer")
+    formatted_prompt = fit_to_budget("manager_agent", state, build_manager_prompt)
+    state["last_user_prompt"] = formatted_prompt[1].content
+
+    response = invoke_node(agent_name, formatted_prompt, state)
+    return apply_manager_response(state, response)
+
+async def manager_agent_async(state):
+    plan = section_revision_plan(state)
+    if plan:
+        return update_manager_output(state, await arevise_sections(state, plan), "output_reviewer")
+    formatted_prompt = fit_to_budget("manager_agent", state, build_manager_prompt)
+    state["last_user_prompt"] = formatted_prompt[1].content
+
+    response = await ainvoke_node("manager_agent", formatted_prompt, state)
+    return apply_manager_response(state, response)
+
 def output_reviewer(state):
     agent_name = get_self_name()
-    state = generic_run_agent(agent_name, state, output_key="ts_output", next_node="manager_agent")
+    state = generic_run_agent(agent_name, state, output_key="review_feedback", next_node="manager_agent")
     state["review_count"] = state.get("review_count", 0) + 1
+    state["next_node"] = after_review(state)
     return state
 
 def final_output(state):
     return state
+
+# --- Async variants: same prompts and outputs, model called with ainvoke ---
+async def abap_code_analyst_async(state):
+    if should_chunk(state["analysis_code"]):
+        state["abap_analysis"] = await run_chunked_analysis_async(state)
+        state["next_node"] = "foreign_dependency_agent"
+        return state
+    return await generic_run_agent_async("abap_code_analyst", state, output_key="abap_analysis", next_node="foreign_dependency_agent")
+
+async def foreign_dependency_agent_async(state):
+    return await generic_run_agent_async("foreign_dependency_agent", state, output_key="foreign_dependencies", next_node="functional_spec_drafter")
+
+async def functional_spec_drafter_async(state):
+    return await generic_run_agent_async("functional_spec_drafter", state, output_key="fs_output", next_node="technical_spec_writer")
+
+async def technical_spec_writer_async(state):
+    return await generic_run_agent_async("technical_spec_writer", state, output_key="ts_output", next_node="manager_agent")
+
+async def output_reviewer_async(state):
+    state = await generic_run_agent_async("output_reviewer", state, output_key="review_feedback", next_node="manager_agent")
+    state["review_count"] = state.get("review_count", 0) + 1
+    state["next_node"] = after_review(state)
+    return state
+
+async def final_output_async(state):
+    return state
@@ -1,11 +1,85 @@
-import base64, os, traceback, uuid, time
-from fastapi import FastAPI, Body, BackgroundTasks
+import asyncio, base64, gzip, os, shutil, sys, threading, traceback, uuid, time
+from contextlib import asynccontextmanager
+from typing import Optional
+import json
+from fastapi import FastAPI, Body, Request, HTTPException
+from fastapi.responses import FileResponse, StreamingResponse, Response
 from pydantic import BaseModel
-from main import main, generate_final_messages
 from fastapi.middleware.cors import CORSMiddleware
-from utils import process_markdown
+from utils import current_task_id, release_task_usage, summarize_task_usage, merge_task_usage
+from task_registry import (
+    OUTPUTS_DIR, SWEEP_INTERVAL_SECONDS, init_registry, register_task,
+    set_task_status, get_task_status_value, sweep_expired, get_task_events, add_task_event,
+    register_batch, get_batch, set_task_usage, get_task_usage, count_tasks_by_status,
+)
+import progress
+import result_cache
+from job_queue import JobQueue, QueueFull
+from prompt_registry import get_prompt_registry
+from workflow_state import validate_prompts
+import template_store
+import token_estimator
+import incremental
+import batch
+import pdf_renderer
+import metrics
+import resilience
+import checkpoints
+
+
+def load_pipeline():
+    """
+    Import the LangGraph workflow (main.py) on first use. LangGraph and the LLM
+    SDK add over a second of imports, so they are kept off the boot path and
+    warmed in the background once the server is accepting requests.
+    """
+    import main
+    return main
+
+job_queue = JobQueue()
+
+
+async def run_sweeper(interval: int = SWEEP_INTERVAL_SECONDS):
+    """Periodically remove expired tasks and their files, off the request path."""
+    while True:
+        try:
+            await asyncio.to_thread(sweep_expired)
+            await asyncio.to_thread(checkpoints.sweep)
+        except Exception:
+            traceback.print_exc()
+        await asyncio.sleep(interval)
+
+async def run_recovery(interval: int = checkpoints.HEARTBEAT_SECONDS):
+    """Keep this worker's heartbeat fresh and take over runs of workers that died mid-run."""
+    while True:
+        try:
+            await asyncio.to_thread(checkpoints.heartbeat)
+            for task_id in await asyncio.to_thread(checkpoints.orphaned_runs):
+                await recover_interrupted_task(task_id)
+        except Exception:
+            traceback.print_exc()
+        await asyncio.sleep(interval)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    validate_prompts()  # fail fast on template/state mismatches
+    init_registry()
+    result_cache.init_result_cache()
+    checkpoints.init_checkpoints()
+    sweeper = asyncio.create_task(run_sweeper())
+    job_queue.start()
+    recovery = asyncio.create_task(run_recovery())
+    warmup = asyncio.create_task(asyncio.to_thread(load_pipeline))
+    pdf_renderer.warm_up()
+    yield
+    for feeder in list(batch_feeders):
+        feeder.cancel()
+    recovery.cancel()
+    await job_queue.stop()
+    sweeper.cancel()
+    pdf_renderer.shutdown()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -15,120 +89,543 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-OUTPUTS_DIR = "outputs"
-os.makedirs(OUTPUTS_DIR, exist_ok=True)
-TASK_REGISTRY = os.path.join(OUTPUTS_DIR, "task_registry.txt")
-
-def register_task(task_id: str):
-    """Add a task with status 'Processing'."""
-    now = int(time.time())
-    with open(TASK_REGISTRY, "a", encoding="utf-8") as f:
-        f.write(f"{task_id},{now},Processing\n")
-
-def set_task_status(task_id: str, status: str):
-    """Update the status of a task in the registry."""
-    if not os.path.exists(TASK_REGISTRY):
-        return
-    lines = []
-    with open(TASK_REGISTRY, "r", encoding="utf-8") as f:
-        for line in f:
-            parts = line.strip().split(",")
-            if len(parts) != 3:
-                continue
-            tid, tstamp, _ = parts
-            if tid == task_id:
-                lines.append(f"{tid},{tstamp},{status}\n")
-            else:
-                lines.append(line)
-    with open(TASK_REGISTRY, "w", encoding="utf-8") as f:
-        f.writelines(lines)
-
-def get_task_status_value(task_id: str):
-    """Return the status of a task (Processing / Completed / Failed) or None."""
-    if not os.path.exists(TASK_REGISTRY):
-        return None
-    expire_seconds = 3600 * 48
-    now = int(time.time())
-    found = None
-    keep_lines = []
-    with open(TASK_REGISTRY, "r", encoding="utf-8") as f:
-        for line in f:
-            parts = line.strip().split(",")
-            if len(parts) != 3:
-                continue
-            tid, tstamp, status = parts
-            tstamp = int(tstamp)
-            if now - tstamp < expire_seconds:
-                keep_lines.append(line)
-                if tid == task_id:
-                    found = status
-            else:
-                # Clean up expired files
-                for ext in [".txt", ".pdf"]:
-                    path = os.path.join(OUTPUTS_DIR, f"{tid}{ext}")
-                    if os.path.exists(path):
-                        try:
-                            os.remove(path)
-                        except:
-                            pass
-    # Rewrite registry with only non-expired tasks
-    with open(TASK_REGISTRY, "w", encoding="utf-8") as f:
-        f.writelines(keep_lines)
-    return found
-
-def is_task_registered(task_id: str) -> bool:
-    return get_task_status_value(task_id) is not None
-
-
 # Response model for task creation
 class TaskIdResponse(BaseModel):
     status: str
     task_id: str
+    queue_position: Optional[int] = None
+
+def read_base64(path: str) -> str:
+    with open(path, "rb") as f:
+        return base64.b64encode(f.read()).decode("utf-8")
+
+def gzip_file(path: str) -> str:
+    """Return a gzip copy of path, made once and refreshed when the source changes."""
+    gz_path = path + ".gz"
+    if not os.path.exists(gz_path) or os.path.getmtime(gz_path) < os.path.getmtime(path):
+        # Per-writer name: concurrent downloads may gzip the same file at once
+        tmp_path = f"{gz_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(path, "rb") as src, gzip.open(tmp_path, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp_path, gz_path)
+    return gz_path
+
+def file_etag(stat_result) -> str:
+    return f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
 
-# Start workflow in background, return task_id (POST, accepts base64 input)
+def write_text(path: str, text: str):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+async def publish_result(task_id: str, final_messages: str, code_text: str, cache_key=None):
+    """Write the markdown, render the PDF and keep the source as baseline for incremental runs."""
+    output_path = os.path.join(OUTPUTS_DIR, f"{task_id}.txt")
+    await asyncio.to_thread(write_text, output_path, final_messages)
+    await asyncio.to_thread(incremental.save_baseline, task_id, code_text)
+
+    await pdf_renderer.render_pdf(output_path)  # creates PDF in the render pool
+    if cache_key:
+        pdf_path = os.path.splitext(output_path)[0] + ".pdf"
+        await asyncio.to_thread(result_cache.store, cache_key, output_path, pdf_path)
+
+async def store_task_usage(task_id: str, resumed: bool = False):
+    """Keep the run's token ledger with its task record and drop it from memory."""
+    entries = release_task_usage(task_id)
+    if entries:
+        usage = summarize_task_usage(entries)
+        if resumed:  # add to what the interrupted attempt used
+            usage = merge_task_usage(await asyncio.to_thread(get_task_usage, task_id) or {}, usage)
+        await asyncio.to_thread(set_task_usage, task_id, usage)
+
+# Runs in the event loop: LLM calls are awaited and file/PDF work goes to threads.
+# resume=True continues the task from its last checkpoint instead of starting over.
+async def run_workflow(code_input_b64: str, task_id: str, cache_key=None, template_id=None, resume=False):
+    if not set_task_status(task_id, "Processing", expected="Queued"):
+        return  # expired or already handled elsewhere
+    progress.start_run(task_id)
+    try:
+        await asyncio.to_thread(checkpoints.record_run, task_id, cache_key=cache_key, template_id=template_id)
+        pipeline = await asyncio.to_thread(load_pipeline)
+        if resume:
+            final_result = await pipeline.resume_async(task_id)
+            code_text = final_result["code_input"]
+        else:
+            final_result = await pipeline.main_async(code_input_b64=code_input_b64, task_id=task_id, template_id=template_id)
+            code_text = pipeline.data_processor.read_code_files(code_input_b64=code_input_b64)
+        final_messages = pipeline.generate_final_messages(final_result)
+        await publish_result(task_id, final_messages, code_text, cache_key)
+        set_task_status(task_id, "Completed", expected="Processing")
+        progress.finish_run(task_id, "Completed")
+        await asyncio.to_thread(checkpoints.delete_run, task_id)
+    except Exception as e:
+        print(f"[ERROR] Workflow failed for task {task_id}")
+        traceback.print_exc()  # prints the full error traceback
+        set_task_status(task_id, "Failed", expected="Processing")
+        progress.finish_run(task_id, "Failed", error=str(e))
+    finally:
+        await store_task_usage(task_id, resumed=resume)
+
+def queue_resume(task_id: str, client_id: str, priority: int = 0):
+    """Queue a resume of task_id from its checkpoint; the caller has set the task to Queued."""
+    cache_key = checkpoints.get_run_args(task_id).get("cache_key")
+    return job_queue.submit(
+        task_id, client_id, priority,
+        lambda: run_workflow(None, task_id, cache_key, resume=True),
+    )
+
+async def recover_interrupted_task(task_id: str):
+    """Resume a run whose worker died; without a checkpoint it can only be marked Failed."""
+    if not set_task_status(task_id, "Queued", expected="Processing"):
+        return  # another worker took it over
+    if checkpoints.CHECKPOINTS_ENABLED and await asyncio.to_thread(checkpoints.has_checkpoint, task_id):
+        try:
+            queue_resume(task_id, "recovery")
+            print(f"[recovery] Resuming interrupted task {task_id} from its last checkpoint")
+            return
+        except QueueFull:
+            pass  # the task stays resumable on demand
+    set_task_status(task_id, "Failed", expected="Queued")
+    progress.finish_run(task_id, "Failed", error="Interrupted by a worker restart")
+
+async def restore_cached_result(code_input_b64: str, task_id: str, template_id=None):
+    """
+    Identical code + template + prompts + model: copy the stored run to task_id.
+    Returns (hit, cache_key); the key is passed on so a miss is stored after the run.
+    """
+    if not result_cache.RESULT_CACHE_ENABLED:
+        return False, None
+    pipeline = await asyncio.to_thread(load_pipeline)
+    code_text = pipeline.data_processor.read_code_files(code_input_b64=code_input_b64)
+    template_text = await asyncio.to_thread(pipeline.data_processor.read_template_pdf, template_id)
+    cache_key = result_cache.compute_cache_key(
+        code_text, template_text, json.dumps(pipeline.llm_backends.routing_signature(), sort_keys=True),
+        get_prompt_registry().content_hashes(),
+    )
+    if await asyncio.to_thread(result_cache.restore, cache_key, task_id):
+        await asyncio.to_thread(incremental.save_baseline, task_id, code_text)
+        return True, cache_key
+    return False, cache_key
+
+def check_template_id(template_id):
+    """400 for ids that are not a template content hash, 404 for unknown ones."""
+    if not template_id:
+        return  # default template
+    if not template_store.is_valid_template_id(template_id):
+        raise HTTPException(status_code=400, detail="template_id must be 32 lowercase hex characters.")
+    if not template_store.template_exists(template_id):
+        raise HTTPException(status_code=404, detail=f"Unknown template_id '{template_id}'.")
+
+def check_provider_available():
+    """Fail new jobs fast with 503 while a model's circuit breaker is open."""
+    retry_after = resilience.provider_retry_after()
+    if retry_after:
+        raise HTTPException(
+            status_code=503, detail="The LLM provider is unavailable; try again later.",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+def get_client_id(request: Request) -> str:
+    """Fair-scheduling key: explicit X-Client-Id header, else the caller's address."""
+    return request.headers.get("X-Client-Id") or (request.client.host if request.client else "anonymous")
+
+# Queue workflow for a pipeline slot, return task_id (POST, accepts base64 input)
 @app.post("/code2fsts", response_model=TaskIdResponse)
-def get_fsts_base64(background_tasks: BackgroundTasks, input_b64: str = Body(..., embed=True)):
+async def get_fsts_base64(
+    request: Request,
+    input_b64: str = Body(..., embed=True),
+    priority: int = Body(0, embed=True),
+    template_id: Optional[str] = Body(None, embed=True),
+):
     task_id = str(uuid.uuid4())
-    
-    def run_workflow(code_input_b64: str, task_id: str):
-        try:
-            final_result = main(code_input_b64=code_input_b64, task_id=task_id)
-            final_messages = generate_final_messages(final_result)
+    check_template_id(template_id)
+
+    hit, cache_key = await restore_cached_result(input_b64, task_id, template_id)
+    if hit:
+        register_task(task_id, status="Completed")
+        return {"status": "Completed", "task_id": task_id}
+    check_provider_available()
+
+    try:
+        position = job_queue.submit(
+            task_id, get_client_id(request), priority,
+            lambda: run_workflow(input_b64, task_id, cache_key, template_id),
+        )
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    # No await since submit(): the job cannot start before it is registered
+    register_task(task_id, status="Queued")
+    return {"status": "Queued", "task_id": task_id, "queue_position": position}
+
+# Regenerate only the sections affected by a code change, falling back to a full run
+async def run_incremental_workflow(previous_task_id: str, code_input_b64: str, task_id: str, template_id=None):
+    if not set_task_status(task_id, "Processing", expected="Queued"):
+        return
+    progress.start_run(task_id)
+    try:
+        await asyncio.to_thread(checkpoints.record_run, task_id, template_id=template_id)
+        pipeline = await asyncio.to_thread(load_pipeline)
+        code_text = pipeline.data_processor.read_code_files(code_input_b64=code_input_b64)
+        old_code, old_document = await asyncio.to_thread(incremental.load_baseline, previous_task_id)
+        plan = await asyncio.to_thread(incremental.plan_update, old_code, code_text, old_document)
+        summary = {k: plan[k] for k in ("mode", "changed", "added", "removed", "sections_total")}
+        summary["sections_regenerated"] = len(plan["sections"])
+        await asyncio.to_thread(add_task_event, task_id, "incremental_plan", {**summary, "reason": plan.get("reason")})
+
+        if plan["mode"] == "unchanged":
+            final_messages = old_document
+        elif plan["mode"] == "incremental":
+            current_task_id.set(task_id)
+            final_messages = await incremental.regenerate_sections(pipeline.llm_backends.model_for("section_reviser"), plan)
+        else:
+            final_result = await pipeline.main_async(code_input_b64=code_input_b64, task_id=task_id, template_id=template_id)
+            final_messages = pipeline.generate_final_messages(final_result)
+        await publish_result(task_id, final_messages, code_text)
+        set_task_status(task_id, "Completed", expected="Processing")
+        progress.finish_run(task_id, "Completed", **summary)
+        await asyncio.to_thread(checkpoints.delete_run, task_id)
+    except Exception as e:
+        print(f"[ERROR] Incremental workflow failed for task {task_id}")
+        traceback.print_exc()
+        set_task_status(task_id, "Failed", expected="Processing")
+        progress.finish_run(task_id, "Failed", error=str(e))
+    finally:
+        await store_task_usage(task_id)
+
+# Re-document a changed program from a previous completed task
+@app.post("/code2fsts/incremental", response_model=TaskIdResponse)
+async def get_fsts_incremental(
+    request: Request,
+    previous_task_id: str = Body(..., embed=True),
+    input_b64: str = Body(..., embed=True),
+    priority: int = Body(0, embed=True),
+    template_id: Optional[str] = Body(None, embed=True),
+):
+    if get_task_status_value(previous_task_id) != "Completed" or not incremental.has_baseline(previous_task_id):
+        raise HTTPException(status_code=404, detail="Previous task not found, not completed, or expired.")
+    check_template_id(template_id)
+    check_provider_available()
+    task_id = str(uuid.uuid4())
+    try:
+        position = job_queue.submit(
+            task_id, get_client_id(request), priority,
+            lambda: run_incremental_workflow(previous_task_id, input_b64, task_id, template_id),
+        )
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    register_task(task_id, status="Queued")
+    return {"status": "Queued", "task_id": task_id, "queue_position": position}
+
+# Continue a failed task from its last checkpoint instead of starting over
+@app.post("/code2fsts/resume/{task_id}", response_model=TaskIdResponse)
+async def resume_task(request: Request, task_id: str, priority: int = Body(0, embed=True)):
+    status = get_task_status_value(task_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Task not found or expired.")
+    if status != "Failed":
+        raise HTTPException(status_code=409, detail=f"Only failed tasks can be resumed (task is {status}).")
+    if not checkpoints.CHECKPOINTS_ENABLED or not await asyncio.to_thread(checkpoints.has_checkpoint, task_id):
+        raise HTTPException(status_code=404, detail="No checkpoint to resume from; submit the program again.")
+    check_provider_available()
+    if not set_task_status(task_id, "Queued", expected="Failed"):
+        raise HTTPException(status_code=409, detail="Task is already being resumed.")
+    try:
+        position = queue_resume(task_id, get_client_id(request), priority)
+    except QueueFull as e:
+        set_task_status(task_id, "Failed", expected="Queued")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    return {"status": "Queued", "task_id": task_id, "queue_position": position}
 
-            output_path = os.path.join(OUTPUTS_DIR, f"{task_id}.txt")
-            with open(output_path, "w", encoding="utf-8") as f:
-                f.write(final_messages)
+batch_feeders = set()  # running feed_batch tasks (kept referenced until done)
+BATCH_FEED_RETRY_SECONDS = 5
 
-            process_markdown(output_path)  # creates PDF
-            set_task_status(task_id, "Completed")
+async def feed_batch(programs: list, client_id: str, priority: int, template_id=None):
+    """
+    Hand a batch's programs to the job queue as it admits them. The batch shares
+    the caller's per-client allowance, so a large bundle cannot starve other
+    clients; cached programs complete without taking a slot.
+    """
+    for task_id, code_input_b64 in programs:
+        try:
+            hit, cache_key = await restore_cached_result(code_input_b64, task_id, template_id)
+            if hit:
+                set_task_status(task_id, "Completed", expected="Queued")
+                continue
+            while True:
+                # Hold the rest of the batch back while the provider is down
+                while resilience.provider_retry_after():
+                    await asyncio.sleep(min(resilience.provider_retry_after(), BATCH_FEED_RETRY_SECONDS))
+                try:
+                    job_queue.submit(
+                        task_id, client_id, priority,
+                        lambda t=task_id, c=code_input_b64, k=cache_key: run_workflow(c, t, k, template_id),
+                    )
+                    break
+                except QueueFull as e:
+                    await asyncio.sleep(min(e.retry_after, BATCH_FEED_RETRY_SECONDS))
         except Exception as e:
-            print(f"[ERROR] Workflow failed for task {task_id}")
-            traceback.print_exc()  # prints the full error traceback
-            set_task_status(task_id, "Failed")
-    
-    register_task(task_id)
-    background_tasks.add_task(run_workflow, code_input_b64=input_b64, task_id=task_id)
-    return {"status": "Processing", "task_id": task_id}
-
-# Status/result endpoint
+            print(f"[ERROR] Could not queue batch task {task_id}: {e}")
+            set_task_status(task_id, "Failed", expected="Queued")
+
+# Submit many programs (zip or manifest) with one shared template; returns a batch_id
+@app.post("/code2fsts/batch")
+async def submit_batch(
+    request: Request,
+    zip_b64: Optional[str] = Body(None, embed=True),
+    programs: Optional[list] = Body(None, embed=True),
+    name: Optional[str] = Body(None, embed=True),
+    priority: int = Body(0, embed=True),
+    template_id: Optional[str] = Body(None, embed=True),
+):
+    check_template_id(template_id)
+    try:
+        if zip_b64:
+            sources = await asyncio.to_thread(batch.programs_from_zip, base64.b64decode(zip_b64))
+        elif programs:
+            sources = batch.programs_from_manifest(programs)
+        else:
+            raise ValueError("Provide zip_b64 or programs.")
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not read batch: {e}")
+    if not sources:
+        raise HTTPException(status_code=400, detail="The batch contains no programs.")
+    if len(sources) > batch.BATCH_MAX_PROGRAMS:
+        raise HTTPException(status_code=413, detail=f"A batch may contain at most {batch.BATCH_MAX_PROGRAMS} programs.")
+    check_provider_available()
+
+    batch_id = str(uuid.uuid4())
+    entries = [(program, str(uuid.uuid4()), code) for program, code in sources]
+    for _, task_id, _ in entries:
+        register_task(task_id, status="Queued")
+    register_batch(batch_id, name, template_id, [(program, task_id) for program, task_id, _ in entries])
+
+    to_feed = [(task_id, base64.b64encode(code.encode("utf-8")).decode("ascii")) for _, task_id, code in entries]
+    feeder = asyncio.create_task(feed_batch(to_feed, get_client_id(request), priority, template_id))
+    batch_feeders.add(feeder)
+    feeder.add_done_callback(batch_feeders.discard)
+    return {"status": "Queued", "batch_id": batch_id, "programs": [
+        {"program": program, "task_id": task_id} for program, task_id, _ in entries
+    ]}
+
+# Aggregate status of a batch: overall status, counts per status and each program's task
+@app.get("/code2fsts/batch/{batch_id}")
+async def get_batch_status(batch_id: str):
+    found = await asyncio.to_thread(get_batch, batch_id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Batch does not exist or has expired.")
+    return batch.summarize(found)
+
+# Zip of every completed program's PDF plus manifest.json, once the whole batch has finished
+@app.get("/code2fsts/batch/{batch_id}/archive")
+async def get_batch_archive(batch_id: str):
+    found = await asyncio.to_thread(get_batch, batch_id)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Batch does not exist or has expired.")
+    summary = batch.summarize(found)
+    if summary["finished"] < summary["total"]:
+        raise HTTPException(status_code=409, detail=f"Batch not finished: {summary['finished']} of {summary['total']} programs done.")
+    path = await asyncio.to_thread(batch.build_archive, summary)
+    return FileResponse(path, media_type="application/zip", filename=f"{summary['name'] or batch_id}.zip")
+
+# Pre-flight: predicted tokens and cost per node and in total, without calling the model
+@app.post("/code2fsts/estimate")
+async def estimate_fsts(input_b64: str = Body(..., embed=True), template_id: Optional[str] = Body(None, embed=True)):
+    check_template_id(template_id)
+    pipeline = await asyncio.to_thread(load_pipeline)
+    code_text = pipeline.data_processor.read_code_files(code_input_b64=input_b64)
+    template_text = await asyncio.to_thread(pipeline.data_processor.read_template_pdf, template_id)
+    return await asyncio.to_thread(
+        token_estimator.estimate_run, code_text, template_text,
+        pipeline.MIN_OUTPUT_REVIEWS, pipeline.MAX_OUTPUT_REVIEWS,
+    )
+
+# Upload a template PDF (base64); returns the template_id to pass to /code2fsts
+@app.post("/templates")
+async def upload_template(pdf_b64: str = Body(..., embed=True), name: Optional[str] = Body(None, embed=True)):
+    try:
+        pdf_bytes = base64.b64decode(pdf_b64, validate=True)
+        return await asyncio.to_thread(template_store.ingest_template, pdf_bytes, name)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not read template PDF: {e}")
+
+@app.get("/templates")
+def get_templates():
+    return template_store.list_templates()
+
+# Content hash of each prompt version currently loaded
+@app.get("/prompts")
+def get_prompt_versions():
+    return get_prompt_registry().content_hashes()
+
+# Liveness probe: answers as soon as the app has started, before the pipeline is warm
+@app.get("/health")
+def health():
+    return {"status": "ok", "pipeline_loaded": "main" in sys.modules}
+
+# Pipeline slot usage and queue depth for this worker
+@app.get("/code2fsts/queue")
+def get_queue_stats():
+    return job_queue.stats()
+
+# Status endpoint: a small JSON document; the PDF is fetched from download_url.
+# inline=true still embeds it as base64_fsts for older clients.
 @app.get("/code2fsts/status/{task_id}")
-def get_task_status(task_id: str):
+async def get_task_status(task_id: str, inline: bool = False):
     status = get_task_status_value(task_id)
     if status is None:
         return {"status": "NotFound", "detail": "Task does not exist or has expired.", "base64_fsts": None}
     elif status == "Completed":
         output_path = os.path.join(OUTPUTS_DIR, f"{task_id}.pdf")
-        if os.path.exists(output_path):
-            with open(output_path, "rb") as f:
-                encoded = base64.b64encode(f.read()).decode("utf-8")
-            return {"status": "Completed", "base64_fsts": encoded}
-        else:
+        if not os.path.exists(output_path):
             return {"status": "Error", "detail": "PDF missing.", "base64_fsts": None}
+        encoded = await asyncio.to_thread(read_base64, output_path) if inline else None
+        return {"status": "Completed", "download_url": f"/code2fsts/download/{task_id}", "base64_fsts": encoded}
     elif status == "Failed":
         return {"status": "Failed", "detail": "Workflow encountered an error.", "base64_fsts": None}
+    elif status == "Queued":
+        # Position is only known to the worker that holds the job
+        return {"status": "Queued", "queue_position": job_queue.position(task_id), "base64_fsts": None}
     else:
         return {"status": "Processing", "base64_fsts": None}
 
+DOWNLOAD_FORMATS = {
+    "pdf": ("pdf", "application/pdf"),
+    "md": ("txt", "text/markdown; charset=utf-8"),
+}
+
+# Streams the result file: Content-Length, ETag/If-None-Match and Range come
+# from FileResponse; markdown is sent gzip-encoded when the client accepts it.
+@app.api_route("/code2fsts/download/{task_id}", methods=["GET", "HEAD"])
+async def download_result(task_id: str, request: Request, format: str = "pdf"):
+    if format not in DOWNLOAD_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {sorted(DOWNLOAD_FORMATS)}")
+    status = get_task_status_value(task_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Task does not exist or has expired.")
+    if status != "Completed":
+        raise HTTPException(status_code=409, detail=f"Task is {status}.")
+    extension, media_type = DOWNLOAD_FORMATS[format]
+    path = os.path.join(OUTPUTS_DIR, f"{task_id}.{extension}")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Result file missing.")
+
+    headers = {"Cache-Control": "private, max-age=3600"}
+    if format == "md":
+        headers["Vary"] = "Accept-Encoding"
+        if "gzip" in request.headers.get("accept-encoding", ""):
+            path = await asyncio.to_thread(gzip_file, path)
+            headers["Content-Encoding"] = "gzip"
+    stat_result = await asyncio.to_thread(os.stat, path)
+    headers["ETag"] = file_etag(stat_result)
+    if headers["ETag"] in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(
+        path, media_type=media_type, headers=headers, stat_result=stat_result,
+        filename=f"{task_id}.{'md' if format == 'md' else 'pdf'}",
+    )
+
+# Token usage of a task: billed and cache-served totals, overall and per agent
+@app.get("/code2fsts/usage/{task_id}")
+async def get_task_token_usage(task_id: str):
+    usage = await asyncio.to_thread(get_task_usage, task_id)
+    if usage is None:
+        raise HTTPException(status_code=404, detail="Task does not exist or has expired.")
+    return {"task_id": task_id, "status": get_task_status_value(task_id), "token_usage": usage}
+
+# Prometheus scrape target: token, latency and cache counters of this worker
+# plus task, queue and PDF render pool gauges
+@app.get("/metrics")
+async def get_metrics():
+    tasks = await asyncio.to_thread(count_tasks_by_status)
+    queue, pdf = job_queue.stats(), pdf_renderer.stats()
+    gauges = {
+        "fsts_tasks": ("Unexpired tasks by status", {(("status", k),): v for k, v in sorted(tasks.items())}),
+        "fsts_job_queue_running": ("Workflows running in this worker", {(): queue["running"]}),
+        "fsts_job_queue_pending": ("Workflows waiting for a slot in this worker", {(): queue["pending"]}),
+        "fsts_pdf_render_in_flight": ("PDF renders submitted and not finished", {(): pdf["in_flight"]}),
+        "fsts_pdf_render_queue_depth": ("PDF renders waiting for a render process", {(): pdf["queue_depth"]}),
+        "fsts_pdf_render_failed": ("PDF renders failed since start", {(): pdf["failed"]}),
+        "fsts_llm_circuit_open": ("1 while the model's circuit breaker refuses calls", {
+            (("model", key),): int(retry_after > 0) for key, retry_after in sorted(resilience.breaker_states().items())
+        }),
+    }
+    return Response(metrics.render(gauges), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# PDF render pool: in-flight jobs, queue depth, render and queue-wait latency
+@app.get("/code2fsts/pdf/stats")
+def get_pdf_render_stats():
+    return pdf_renderer.stats()
+
+# Result cache counters (hits/misses/evictions) and current size
+@app.get("/code2fsts/cache/stats")
+def get_result_cache_stats():
+    return result_cache.cache_stats()
+
+STREAM_POLL_SECONDS = float(os.getenv("FSTS_STREAM_POLL_SECONDS", 0.5))
+STREAM_HEARTBEAT_SECONDS = 15
+
+# Server-sent events for a task: node_started / node_finished (with elapsed
+# time, token usage and artifact name), node_failed and run_finished.
+# Reconnecting clients send Last-Event-ID and only receive newer events.
+@app.get("/code2fsts/stream/{task_id}")
+async def stream_task_progress(task_id: str, request: Request):
+    if get_task_status_value(task_id) is None:
+        raise HTTPException(status_code=404, detail="Task does not exist or has expired.")
+    try:
+        last_id = int(request.headers.get("Last-Event-ID", 0))
+    except ValueError:
+        last_id = 0
+
+    async def fetch():
+        nonlocal last_id
+        new_events = await asyncio.to_thread(get_task_events, task_id, last_id)
+        if new_events:
+            last_id = new_events[-1]["id"]
+        return [
+            f"id: {ev['id']}\nevent: {ev['event']}\ndata: {json.dumps({'time': ev['time'], **ev['data']})}\n\n"
+            for ev in new_events
+        ]
+
+    async def events():
+        idle = 0.0
+        while not await request.is_disconnected():
+            new_events = await fetch()
+            for message in new_events:
+                yield message
+            if new_events:
+                idle = 0.0
+            status = get_task_status_value(task_id)
+            if status in (None, "Completed", "Failed"):
+                # Events written after the fetch above (run_finished follows the status change)
+                for message in await fetch():
+                    yield message
+                yield f"event: end\ndata: {json.dumps({'status': status or 'NotFound'})}\n\n"
+                return
+            await asyncio.sleep(STREAM_POLL_SECONDS)
+            idle += STREAM_POLL_SECONDS
+            if idle >= STREAM_HEARTBEAT_SECONDS:
+                idle = 0.0
+                yield ": keep-alive\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+# Intermediate artifacts, available as soon as the producing node finishes
+@app.get("/code2fsts/artifacts/{task_id}")
+def list_task_artifacts(task_id: str):
+    if get_task_status_value(task_id) is None:
+        raise HTTPException(status_code=404, detail="Task does not exist or has expired.")
+    return {"artifacts": sorted(
+        name for name in progress.ARTIFACT_NAMES if os.path.exists(progress.artifact_path(task_id, name))
+    )}
+
+@app.get("/code2fsts/artifacts/{task_id}/{name}")
+def get_task_artifact(task_id: str, name: str):
+    if name not in progress.ARTIFACT_NAMES or get_task_status_value(task_id) is None:
+        raise HTTPException(status_code=404, detail="Unknown task or artifact.")
+    path = progress.artifact_path(task_id, name)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Artifact not produced yet.")
+    return FileResponse(path, media_type="text/markdown; charset=utf-8", filename=f"{task_id}.{name}.md")
+
 # --- POST endpoint to accept base64 input and decode it ---
 # @app.post("/code2fstsb64", response_model=FSTSResponse)
 # def get_fsts_base64_with_input(input_b64: str = Body(..., embed=True)):
@@ -0,0 +1,111 @@
+# batch.py
+# Multi-program bundles: unpack a zip or manifest into programs, summarise the
+# status of a batch and build the combined archive of PDFs.
+import base64
+import io
+import json
+import os
+import posixpath
+import re
+import threading
+import zipfile
+from collections import Counter
+from task_registry import OUTPUTS_DIR
+
+BATCH_MAX_PROGRAMS = int(os.getenv("FSTS_BATCH_MAX_PROGRAMS", 500))
+# Total uncompressed source accepted in one batch
+BATCH_MAX_BYTES = int(os.getenv("FSTS_BATCH_MAX_BYTES", 50 * 1024 * 1024))
+SOURCE_EXTENSIONS = (".txt", ".abap", "")
+
+FINISHED = ("Completed", "Failed", "Expired")
+
+
+def _unique_name(name, used):
+    base = re.sub(r"[^\w.-]+", "_", name).strip("._") or "program"
+    candidate, n = base, 2
+    while candidate.lower() in used:
+        candidate, n = f"{base}_{n}", n + 1
+    used.add(candidate.lower())
+    return candidate
+
+
+def programs_from_zip(zip_bytes: bytes) -> list:
+    """
+    Return [(program_name, code_text)] from a zip. Every top-level folder is one
+    program whose files (e.g. main report + TOP/SEL/F01 includes) are joined in
+    name order, like test/code_files_unused; every top-level file is a program.
+    """
+    grouped, total = {}, 0
+    with zipfile.ZipFile(io.BytesIO(zip_bytes)) as zf:
+        for info in sorted(zf.infolist(), key=lambda i: i.filename):
+            path = info.filename
+            parts = [p for p in path.split("/") if p]
+            if info.is_dir() or not parts or parts[0] == "__MACOSX" or any(p.startswith(".") for p in parts):
+                continue
+            if posixpath.splitext(path)[1].lower() not in SOURCE_EXTENSIONS:
+                continue
+            total += info.file_size
+            if total > BATCH_MAX_BYTES:
+                raise ValueError(f"Batch exceeds {BATCH_MAX_BYTES} bytes of source")
+            program = parts[0] if len(parts) > 1 else posixpath.splitext(parts[0])[0]
+            grouped.setdefault(program, []).append(zf.read(info).decode("utf-8", errors="replace"))
+    used = set()
+    return [(_unique_name(name, used), "\n".join(files)) for name, files in grouped.items()]
+
+
+def programs_from_manifest(programs: list) -> list:
+    """Return [(program_name, code_text)] from [{"name": ..., "input_b64": ...}]."""
+    used, result, total = set(), [], 0
+    for i, entry in enumerate(programs, start=1):
+        code = base64.b64decode(entry["input_b64"]).decode("utf-8", errors="replace")
+        total += len(code)
+        if total > BATCH_MAX_BYTES:
+            raise ValueError(f"Batch exceeds {BATCH_MAX_BYTES} bytes of source")
+        result.append((_unique_name(entry.get("name") or f"program_{i}", used), code))
+    return result
+
+
+def summarize(batch: dict) -> dict:
+    """Aggregate status: counts per task status and one overall status."""
+    counts = Counter(p["status"] for p in batch["programs"])
+    total = len(batch["programs"])
+    finished = sum(counts[s] for s in FINISHED)
+    if finished < total:
+        status = "Processing" if counts["Processing"] or finished else "Queued"
+    elif counts["Completed"] == total:
+        status = "Completed"
+    elif counts["Completed"]:
+        status = "PartiallyFailed"
+    else:
+        status = "Failed"
+    return {
+        "batch_id": batch["batch_id"],
+        "name": batch["name"],
+        "status": status,
+        "total": total,
+        "finished": finished,
+        "counts": dict(counts),
+        "programs": batch["programs"],
+    }
+
+
+def archive_path(batch_id: str) -> str:
+    return os.path.join(OUTPUTS_DIR, f"{batch_id}.zip")
+
+
+def build_archive(summary: dict) -> str:
+    """Zip the PDF of every completed program plus a manifest.json; built once per batch."""
+    path = archive_path(summary["batch_id"])
+    if os.path.exists(path):
+        return path
+    # Per-writer name: concurrent downloads of a just-finished batch may both build it
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for entry in summary["programs"]:
+            pdf = os.path.join(OUTPUTS_DIR, f"{entry['task_id']}.pdf")
+            if entry["status"] == "Completed" and os.path.exists(pdf):
+                zf.write(pdf, f"{entry['program']}.pdf")
+        manifest = {k: summary[k] for k in ("batch_id", "name", "status", "counts", "programs")}
+        zf.writestr("manifest.json", json.dumps(manifest, indent=2))
+    os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,166 @@
+# checkpoint_saver.py
+# LangGraph checkpoint saver on the tables of checkpoints.py. Checkpoints are
+# serialised with LangGraph's msgpack serializer and compressed with zstd.
+import asyncio
+import time
+import zstandard
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP, BaseCheckpointSaver, CheckpointTuple, get_checkpoint_id, get_checkpoint_metadata,
+)
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from checkpoints import CHECKPOINTS_ENABLED, delete_checkpoints
+from task_registry import get_connection
+
+COMPRESS_MIN_BYTES = 512  # smaller values are stored as plain msgpack
+
+
+class CompressedSerializer(JsonPlusSerializer):
+    """LangGraph's msgpack serializer with zstd on top; the type tag records the compression."""
+
+    def dumps_typed(self, obj):
+        type_, data = super().dumps_typed(obj)
+        if len(data) < COMPRESS_MIN_BYTES:
+            return type_, data
+        return f"{type_}+zstd", zstandard.ZstdCompressor(level=3).compress(data)
+
+    def loads_typed(self, data):
+        type_, payload = data
+        if type_.endswith("+zstd"):
+            type_, payload = type_[:-len("+zstd")], zstandard.ZstdDecompressor().decompress(payload)
+        return super().loads_typed((type_, payload))
+
+
+class SqliteSaver(BaseCheckpointSaver):
+    """
+    Checkpoint saver on the registry database. Only the latest checkpoint of a
+    run and its parent are kept: resuming needs nothing older.
+    """
+
+    def __init__(self):
+        super().__init__(serde=CompressedSerializer())
+
+    def _tuple(self, row, thread_id, checkpoint_ns):
+        conn = get_connection()
+        writes = conn.execute(
+            "SELECT task_id, channel, type, value FROM checkpoint_writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, row["checkpoint_id"]),
+        ).fetchall()
+
+        def config(checkpoint_id):
+            return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}}
+
+        return CheckpointTuple(
+            config=config(row["checkpoint_id"]),
+            checkpoint=self.serde.loads_typed((row["type"], row["checkpoint"])),
+            metadata=self.serde.loads_typed((row["metadata_type"], row["metadata"])),
+            parent_config=config(row["parent_id"]) if row["parent_id"] else None,
+            pending_writes=[(w["task_id"], w["channel"], self.serde.loads_typed((w["type"], w["value"]))) for w in writes],
+        )
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        sql = "SELECT * FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+        params = [thread_id, checkpoint_ns]
+        if checkpoint_id := get_checkpoint_id(config):
+            sql += " AND checkpoint_id = ?"
+            params.append(checkpoint_id)
+        row = get_connection().execute(sql + " ORDER BY checkpoint_id DESC LIMIT 1", params).fetchone()
+        return self._tuple(row, thread_id, checkpoint_ns) if row else None
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        sql, params = "SELECT * FROM checkpoints WHERE 1 = 1", []
+        if config:
+            sql += " AND thread_id = ?"
+            params.append(config["configurable"]["thread_id"])
+            if (checkpoint_ns := config["configurable"].get("checkpoint_ns")) is not None:
+                sql += " AND checkpoint_ns = ?"
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                sql += " AND checkpoint_id = ?"
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            sql += " AND checkpoint_id < ?"
+            params.append(before_id)
+        rows = get_connection().execute(sql + " ORDER BY checkpoint_id DESC", params).fetchall()
+        for row in rows:
+            item = self._tuple(row, row["thread_id"], row["checkpoint_ns"])
+            if filter and any(item.metadata.get(k) != v for k, v in filter.items()):
+                continue
+            if limit is not None:
+                if limit <= 0:
+                    break
+                limit -= 1
+            yield item
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        parent_id = config["configurable"].get("checkpoint_id")
+        type_, data = self.serde.dumps_typed(checkpoint)
+        metadata_type, metadata_data = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        conn = get_connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (thread_id, checkpoint_ns, checkpoint["id"], parent_id, time.time(), type_, data, metadata_type, metadata_data),
+            )
+            if parent_id:
+                for table in ("checkpoints", "checkpoint_writes"):
+                    conn.execute(
+                        f"DELETE FROM {table} WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                        (thread_id, checkpoint_ns, parent_id),
+                    )
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, data = self.serde.dumps_typed(value)
+            rows.append((thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx), channel, type_, data, task_path))
+        # Special channels (errors, interrupts) may be rewritten; regular writes are kept once
+        special = all(WRITES_IDX_MAP.get(channel, 0) < 0 for channel, _ in writes)
+        conn = get_connection()
+        with conn:
+            conn.executemany(
+                f"INSERT OR {'REPLACE' if special else 'IGNORE'} INTO checkpoint_writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def delete_thread(self, thread_id):
+        delete_checkpoints(thread_id)
+
+    # Async variants: serialisation and SQLite writes go to a thread
+    async def aget_tuple(self, config):
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+
+_saver = None
+
+
+def get_saver():
+    """The process-wide saver, or None when checkpointing is switched off."""
+    global _saver
+    if not CHECKPOINTS_ENABLED:
+        return None
+    if _saver is None:
+        _saver = SqliteSaver()
+    return _saver
@@ -0,0 +1,130 @@
+# checkpoints.py
+# Per-node checkpoints of API workflow runs, kept in the registry database so a
+# crash, redeploy or failed publish does not lose the finished LLM steps (the
+# LangGraph saver is in checkpoint_saver.py, loaded with the pipeline). Each
+# worker process records the runs it owns and a heartbeat; runs of a worker
+# whose heartbeat has gone stale are resumed by another one.
+import json
+import os
+import time
+import uuid
+from task_registry import get_connection
+
+CHECKPOINTS_ENABLED = os.getenv("FSTS_CHECKPOINTS_ENABLED", "1") == "1"
+HEARTBEAT_SECONDS = int(os.getenv("FSTS_WORKER_HEARTBEAT_SECONDS", 15))
+# A worker silent for this long is presumed dead and its runs are resumed elsewhere
+WORKER_STALE_SECONDS = int(os.getenv("FSTS_WORKER_STALE_SECONDS", 60))
+
+WORKER_ID = uuid.uuid4().hex  # this process; pids are reused across container restarts
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id     TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    parent_id     TEXT,
+    created_at    REAL NOT NULL,
+    type          TEXT NOT NULL,
+    checkpoint    BLOB NOT NULL,
+    metadata_type TEXT NOT NULL,
+    metadata      BLOB NOT NULL,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS checkpoint_writes (
+    thread_id     TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL,
+    checkpoint_id TEXT NOT NULL,
+    task_id       TEXT NOT NULL,
+    idx           INTEGER NOT NULL,
+    channel       TEXT NOT NULL,
+    type          TEXT NOT NULL,
+    value         BLOB NOT NULL,
+    task_path     TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS workflow_runs (
+    task_id    TEXT PRIMARY KEY,
+    worker_id  TEXT NOT NULL,
+    started_at INTEGER NOT NULL,
+    args       TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS workers (
+    worker_id    TEXT PRIMARY KEY,
+    heartbeat_at INTEGER NOT NULL
+);
+"""
+
+
+def init_checkpoints():
+    get_connection().executescript(SCHEMA)
+    heartbeat()
+
+
+def run_config(task_id) -> dict:
+    return {"configurable": {"thread_id": task_id}}
+
+
+def has_checkpoint(task_id) -> bool:
+    return get_connection().execute(
+        "SELECT 1 FROM checkpoints WHERE thread_id = ? LIMIT 1", (task_id,)
+    ).fetchone() is not None
+
+
+def record_run(task_id, **args):
+    """Mark task_id as run by this worker; args (e.g. the result cache key) are kept for a resume."""
+    get_connection().execute(
+        "INSERT OR REPLACE INTO workflow_runs (task_id, worker_id, started_at, args) VALUES (?, ?, ?, ?)",
+        (task_id, WORKER_ID, int(time.time()), json.dumps(args)),
+    )
+
+
+def delete_checkpoints(task_id):
+    conn = get_connection()
+    with conn:
+        conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (task_id,))
+        conn.execute("DELETE FROM checkpoint_writes WHERE thread_id = ?", (task_id,))
+
+
+def get_run_args(task_id) -> dict:
+    row = get_connection().execute("SELECT args FROM workflow_runs WHERE task_id = ?", (task_id,)).fetchone()
+    return json.loads(row["args"]) if row else {}
+
+
+def delete_run(task_id):
+    """Drop a finished run's record and checkpoints."""
+    get_connection().execute("DELETE FROM workflow_runs WHERE task_id = ?", (task_id,))
+    delete_checkpoints(task_id)
+
+
+def heartbeat():
+    get_connection().execute(
+        "INSERT OR REPLACE INTO workers (worker_id, heartbeat_at) VALUES (?, ?)", (WORKER_ID, int(time.time()))
+    )
+
+
+def orphaned_runs() -> list:
+    """Task ids still Processing whose worker has stopped sending heartbeats."""
+    cutoff = int(time.time()) - WORKER_STALE_SECONDS
+    rows = get_connection().execute(
+        "SELECT r.task_id FROM workflow_runs r JOIN tasks t ON t.task_id = r.task_id "
+        "LEFT JOIN workers w ON w.worker_id = r.worker_id "
+        "WHERE t.status = 'Processing' AND r.worker_id != ? AND COALESCE(w.heartbeat_at, 0) < ?",
+        (WORKER_ID, cutoff),
+    ).fetchall()
+    return [r["task_id"] for r in rows]
+
+
+def sweep() -> int:
+    """Remove checkpoints and run records of tasks that expired, and long-dead workers."""
+    conn = get_connection()
+    stale = [r["task_id"] for r in conn.execute(
+        "SELECT task_id FROM workflow_runs WHERE task_id NOT IN (SELECT task_id FROM tasks)"
+    )]
+    stale += [r["thread_id"] for r in conn.execute(
+        "SELECT DISTINCT thread_id FROM checkpoints WHERE thread_id NOT IN (SELECT task_id FROM tasks)"
+    )]
+    for task_id in set(stale):
+        conn.execute("DELETE FROM workflow_runs WHERE task_id = ?", (task_id,))
+        delete_checkpoints(task_id)
+    conn.execute("DELETE FROM workers WHERE heartbeat_at < ?", (int(time.time()) - 86400,))
+    return len(set(stale))
@@ -0,0 +1,83 @@
+# chunked_analysis.py
+# Map-reduce analysis for programs too large for one abap_code_analyst prompt:
+# each chunk is analysed on its own (bounded parallelism), then one merge call
+# combines the partial analyses into the final abap_analysis.
+import asyncio
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from abap_chunker import chunk_code, ANALYSIS_CHUNK_CHARS, ANALYSIS_PARALLELISM
+from llm_backends import invoke_node, ainvoke_node
+from prompt_registry import get_prompt
+from token_estimator import fit_to_budget
+import tracing
+
+AGENT_NAME = "abap_code_analyst"  # routing, validation and token usage follow the node that runs this
+
+
+def _format_chunk(view):
+    return get_prompt("abap_chunk_analyst").chat_prompt.format_messages(**view)
+
+
+def _format_merge(view):
+    return get_prompt("abap_analysis_merger").chat_prompt.format_messages(**view)
+
+
+def _chunk_prompt(state, chunk, index, count):
+    view = {
+        "task_id": state.get("task_id"),
+        "chunk_index": index,
+        "chunk_count": count,
+        "routine_names": ", ".join(chunk["routines"]) or "(top-level code only)",
+        "chunk_code": chunk["text"],
+    }
+    return fit_to_budget("abap_chunk_analyst", view, _format_chunk)
+
+
+def _merge_prompt(state, partials):
+    sections = [f"### Part {i} of {len(partials)}\n{text}" for i, text in enumerate(partials, start=1)]
+    view = {
+        "task_id": state.get("task_id"),
+        "chunk_count": len(partials),
+        "partial_analyses": "\n\n".join(sections),
+        "abap_structure": state["abap_structure"],
+    }
+    return fit_to_budget("abap_analysis_merger", view, _format_merge)
+
+
+def run_chunked_analysis(state, max_chars=ANALYSIS_CHUNK_CHARS, parallelism=ANALYSIS_PARALLELISM):
+    code = state["analysis_code"]
+    chunks = chunk_code(code, max_chars)
+    tracing.event(logging.INFO, "chunked_analysis", chars=len(code), chunks=len(chunks), parallelism=parallelism)
+
+    def analyse(args):
+        index, chunk = args
+        return invoke_node(AGENT_NAME, _chunk_prompt(state, chunk, index, len(chunks)), state).content
+
+    with ThreadPoolExecutor(max_workers=max(1, parallelism)) as pool:
+        # copy_context: usage is charged to the task of the calling run
+        futures = [pool.submit(contextvars.copy_context().run, analyse, args) for args in enumerate(chunks, start=1)]
+        partials = [f.result() for f in futures]
+    if len(partials) == 1:
+        return partials[0]
+
+    return invoke_node(AGENT_NAME, _merge_prompt(state, partials), state).content
+
+
+async def run_chunked_analysis_async(state, max_chars=ANALYSIS_CHUNK_CHARS, parallelism=ANALYSIS_PARALLELISM):
+    code = state["analysis_code"]
+    chunks = chunk_code(code, max_chars)
+    tracing.event(logging.INFO, "chunked_analysis", chars=len(code), chunks=len(chunks), parallelism=parallelism)
+    semaphore = asyncio.Semaphore(max(1, parallelism))
+
+    async def analyse(index, chunk):
+        async with semaphore:
+            response = await ainvoke_node(AGENT_NAME, _chunk_prompt(state, chunk, index, len(chunks)), state)
+        return response.content
+
+    partials = await asyncio.gather(*(analyse(i, c) for i, c in enumerate(chunks, start=1)))
+    if len(partials) == 1:
+        return partials[0]
+
+    response = await ainvoke_node(AGENT_NAME, _merge_prompt(state, partials), state)
+    return response.content
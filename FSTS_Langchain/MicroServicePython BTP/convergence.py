@@ -0,0 +1,107 @@
+# convergence.py
+# Early exit for the manager/reviewer loop. A review that raises no issues
+# goes straight to the final output, and a manager revision that barely
+# changed the document (section-level diff) is taken as final instead of
+# being reviewed again. Rounds saved are recorded with the task.
+import difflib
+import logging
+import os
+import re
+from incremental import split_sections
+from task_registry import add_task_event
+import metrics
+import tracing
+
+CONVERGENCE_ENABLED = os.getenv("FSTS_REVIEW_CONVERGENCE", "1") == "1"
+# A revision changing at most this share of the document has converged
+CONVERGENCE_MAX_CHANGE = float(os.getenv("FSTS_REVIEW_CONVERGENCE_MAX_CHANGE", 0.05))
+
+ROUTE_DIRECTIVE = re.compile(r"\[ROUTE:\s*\w+\]")
+NO_ISSUES = re.compile(r"^\W*no (further )?issues\W*$", re.IGNORECASE)
+FEEDBACK_POINT = re.compile(r"^\s*([-*+•]|\d+[.)])\s+\S")
+
+
+def _text(content) -> str:
+    return content if isinstance(content, str) else str(content or "")
+
+
+def feedback_points(feedback) -> list:
+    """The reviewer's list items (with their continuation lines); prose feedback is one point."""
+    text = _text(feedback).strip()
+    if not text or NO_ISSUES.match(text):
+        return []
+    points = []
+    for line in text.splitlines():
+        if FEEDBACK_POINT.match(line):
+            points.append(line.strip())
+        elif points and line.strip():
+            points[-1] += "\n" + line.strip()
+    return points or [text]
+
+
+def count_issues(feedback) -> int:
+    return len(feedback_points(feedback))
+
+
+def _section_key(section: str) -> str:
+    heading = section.splitlines()[0] if section else ""
+    return re.sub(r"[\W_]+", " ", heading).strip().lower()
+
+
+def document_change(old, new) -> dict:
+    """
+    Section-level diff of two manager outputs: sections are matched by
+    heading, and each contributes its share of changed characters. Added and
+    removed sections count in full.
+    """
+    old_sections = {_section_key(s): s for s in split_sections(ROUTE_DIRECTIVE.sub("", _text(old)))}
+    new_sections = [(_section_key(s), s) for s in split_sections(ROUTE_DIRECTIVE.sub("", _text(new)))]
+    changed_chars, changed_sections = 0.0, 0
+    for key, section in new_sections:
+        before = old_sections.pop(key, "")
+        if before.strip() == section.strip():
+            continue
+        ratio = difflib.SequenceMatcher(None, before.splitlines(), section.splitlines(), autojunk=False).ratio()
+        changed_chars += (1 - ratio) * max(len(before), len(section))
+        changed_sections += 1
+    changed_chars += sum(len(s) for s in old_sections.values())
+    changed_sections += len(old_sections)
+    total = max(len(_text(new)), len(_text(old)), 1)
+    return {
+        "sections_changed": changed_sections,
+        "sections_total": len(new_sections),
+        "change_ratio": round(min(1.0, changed_chars / total), 4),
+    }
+
+
+def record_early_exit(state, reason: str, **details):
+    """Note the review rounds the loop did not need in the state, the task's events and metrics."""
+    saved = max(0, state["max_output_reviews"] - state.get("review_count", 0))
+    state["review_rounds_saved"] = saved
+    task_id = state.get("task_id")
+    data = {"reason": reason, "review_count": state.get("review_count", 0), "rounds_saved": saved, **details}
+    tracing.event(logging.INFO, "review_converged", task=task_id, **data)
+    metrics.inc("fsts_review_converged_total", reason=reason)
+    metrics.inc("fsts_review_rounds_saved_total", saved)
+    if task_id:
+        add_task_event(task_id, "review_converged", data)
+
+
+def after_review(state) -> str:
+    """Route after output_reviewer: skip the manager's revision when nothing was raised."""
+    issues = count_issues(state.get("review_feedback"))
+    if CONVERGENCE_ENABLED and issues == 0:
+        record_early_exit(state, "no_issues")
+        return "final_output"
+    return "manager_agent"
+
+
+def after_revision(state, previous_output, route: str) -> str:
+    """Route after a manager revision: end the loop once the document has stopped changing."""
+    if not CONVERGENCE_ENABLED or route != "output_reviewer" or not state.get("review_count"):
+        return route
+    change = document_change(previous_output, state["manager_output"])
+    if change["change_ratio"] <= CONVERGENCE_MAX_CHANGE:
+        record_early_exit(state, "small_revision", **change)
+        return "final_output"
+    return route
@@ -1,5 +1,5 @@
 import os
-import PyPDF2
+import template_store
 # from fpdf import FPDF
 
 
@@ -8,7 +8,6 @@ class DataProcessor:
         self.base_path = base_path
         self.run_folder = "last_run_output"
         self.final_dir = os.path.join(self.base_path, self.run_folder)
-        os.makedirs(self.final_dir, exist_ok=True)
     
     def get_run_folder(self):
         """Get the run folder name"""
@@ -28,32 +27,15 @@ class DataProcessor:
                 return f"[Error decoding provided code_input_b64: {e}]"
         return "[No code input provided]"
     
-    def read_template_pdf(self):
-        """Read the template from an uploaded PDF"""
+    def read_template_pdf(self, template_id=None):
+        """
+        Return the template text: an uploaded template by id, or the default
+        template.pdf. Text is extracted once per template content and reused.
+        """
+        if template_id:
+            return template_store.get_template_text(template_id)
         template_pdf_path = os.path.join(self.base_path, 'template.pdf')
-        template_text = ""
-        
-        # try:
-        with open(template_pdf_path, 'rb') as f:
-            reader = PyPDF2.PdfReader(f)
-            for page in reader.pages:
-                template_text += page.extract_text()
-        # except FileNotFoundError:
-        #     print("Please upload a 'template.pdf' file to use as the template.")
-        #     # Create a dummy template.pdf for demonstration if it doesn't exist
-        #     pdf = FPDF()
-        #     pdf.add_page()
-        #     pdf.set_font("Arial", size=12)
-        #     pdf.cell(200, 10, txt="This is a dummy template.", ln=True, align='C')
-        #     pdf.output(template_pdf_path)
-        #     print("A dummy 'template.pdf' has been created for you.")
-            
-        #     with open(template_pdf_path, 'rb') as f:
-        #         reader = PyPDF2.PdfReader(f)
-        #         for page in reader.pages:
-        #             template_text += page.extract_text()
-        
-        return template_text
+        return template_store.get_template_text(template_store.ingest_template_file(template_pdf_path))
     
     def get_data(self):
         """Get both code input and template text"""
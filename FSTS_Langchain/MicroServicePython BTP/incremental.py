@@ -0,0 +1,198 @@
+# incremental.py
+# Incremental re-documentation: diff a changed program against the code of a
+# previous task at routine level, regenerate only the sections of the previous
+# FS/TS that document the changed routines, and splice them back in.
+import asyncio
+import difflib
+import os
+import re
+from abap_chunker import split_blocks
+from abap_scanner import scan_abap, format_structure, strip_comments
+from llm_cache import cached_ainvoke
+from prompt_registry import get_prompt
+from task_registry import OUTPUTS_DIR
+from utils import add_token_usage, current_task_id
+import tracing
+
+INCREMENTAL_PARALLELISM = int(os.getenv("FSTS_INCREMENTAL_PARALLELISM", 4))
+# Above this share of sections affected, a full run is cheaper and more coherent
+INCREMENTAL_MAX_SECTION_RATIO = float(os.getenv("FSTS_INCREMENTAL_MAX_SECTION_RATIO", 0.5))
+
+MAIN_PROGRAM = "(main program)"
+HEADING_LINE = re.compile(r"^#{1,6}\s+\S")
+
+
+def code_path(task_id: str) -> str:
+    """Source a task was generated from, kept as the baseline for incremental runs."""
+    return os.path.join(OUTPUTS_DIR, f"{task_id}.abap")
+
+
+def document_path(task_id: str) -> str:
+    return os.path.join(OUTPUTS_DIR, f"{task_id}.txt")
+
+
+def save_baseline(task_id: str, code_text: str):
+    with open(code_path(task_id), "w", encoding="utf-8") as f:
+        f.write(code_text)
+
+
+def has_baseline(task_id: str) -> bool:
+    return os.path.exists(code_path(task_id)) and os.path.exists(document_path(task_id))
+
+
+def load_baseline(task_id: str):
+    """Return (code, document) of a previous task."""
+    with open(code_path(task_id), "r", encoding="utf-8") as f:
+        code = f.read()
+    with open(document_path(task_id), "r", encoding="utf-8") as f:
+        document = f.read()
+    return code, document
+
+
+# --- Routine-level diff -------------------------------------------------------
+
+def routine_map(code: str) -> dict:
+    """name -> comment-free code of each routine; code between routines is one MAIN_PROGRAM unit."""
+    units, main = {}, []
+    for block in split_blocks(code):
+        text = strip_comments(block.text)
+        if block.name:
+            units[block.name.lower()] = text
+        elif text:
+            main.append(text)
+    units[MAIN_PROGRAM] = "\n".join(main)
+    return units
+
+
+def diff_routines(old_code: str, new_code: str) -> dict:
+    """Changed, added and removed routines; comment-only edits do not count as changes."""
+    old, new = routine_map(old_code), routine_map(new_code)
+    return {
+        "changed": sorted(n for n in old.keys() & new.keys() if old[n] != new[n]),
+        "added": sorted(new.keys() - old.keys()),
+        "removed": sorted(old.keys() - new.keys()),
+        "old": old,
+        "new": new,
+    }
+
+
+def _changed_lines(old_text: str, new_text: str) -> list:
+    return [
+        line[1:] for line in difflib.unified_diff(old_text.splitlines(), new_text.splitlines(), lineterm="", n=0)
+        if line[:1] in "+-" and not line.startswith(("+++", "---"))
+    ]
+
+
+def describe_changes(diff: dict) -> str:
+    """Unified diff per changed routine, full code of added ones, names of removed ones."""
+    parts = []
+    for name in diff["changed"]:
+        lines = difflib.unified_diff(
+            diff["old"][name].splitlines(), diff["new"][name].splitlines(),
+            fromfile=f"{name} (previous)", tofile=f"{name} (new)", lineterm="",
+        )
+        parts.append("\n".join(lines))
+    for name in diff["added"]:
+        parts.append(f"+++ {name} (new routine)\n{diff['new'][name]}")
+    for name in diff["removed"]:
+        parts.append(f"--- {name} (routine removed)")
+    return "\n\n".join(parts)
+
+
+def affected_names(diff: dict, structure: dict) -> set:
+    """
+    Names whose mention marks a section as affected: the changed, added and
+    removed routines, the callers of added routines, and the selection-screen
+    fields, tables and function modules that appear on changed lines.
+    """
+    names = {n for n in diff["changed"] + diff["added"] + diff["removed"] if n != MAIN_PROGRAM}
+    for caller, calls in structure["calls"].items():
+        if any(c.lower() in diff["added"] for c in calls["perform"]):
+            names.add(caller.lower())
+
+    known = {f["name"].lower() for f in structure["selection_screen"]}
+    known |= set(structure["db_access"])
+    known |= {t["name"].lower() for t in structure["internal_tables"]}
+    known |= {fm.lower() for calls in structure["calls"].values() for fm in calls["function"]}
+    changed_lines = []
+    for name in diff["changed"]:
+        changed_lines += _changed_lines(diff["old"][name], diff["new"][name])
+    for name in diff["added"]:
+        changed_lines += diff["new"][name].splitlines()
+    tokens = {t.lower() for line in changed_lines for t in re.findall(r"[\w/]+", line)}
+    return names | (tokens & known)
+
+
+# --- Document sections --------------------------------------------------------
+
+def split_sections(document: str) -> list:
+    """Split markdown at every heading; the text before the first heading is its own section."""
+    sections, current = [], []
+    for line in document.splitlines(keepends=True):
+        if HEADING_LINE.match(line) and current:
+            sections.append("".join(current))
+            current = []
+        current.append(line)
+    if current:
+        sections.append("".join(current))
+    return sections
+
+
+def mentions(text: str, names: set) -> bool:
+    lowered = text.lower()
+    return any(re.search(rf"(?<![\w/]){re.escape(name)}(?![\w/])", lowered) for name in names)
+
+
+def plan_update(old_code: str, new_code: str, document: str) -> dict:
+    """Work out what an incremental run has to regenerate; plan["mode"] is "unchanged", "incremental" or "full"."""
+    diff = diff_routines(old_code, new_code)
+    structure = scan_abap(new_code)
+    sections = split_sections(document)
+    plan = {
+        "changed": diff["changed"], "added": diff["added"], "removed": diff["removed"],
+        "sections_total": len(sections), "sections": [],
+    }
+    if not (diff["changed"] or diff["added"] or diff["removed"]):
+        plan["mode"] = "unchanged"
+        return plan
+
+    names = affected_names(diff, structure)
+    plan["sections"] = [i for i, text in enumerate(sections) if HEADING_LINE.match(text) and mentions(text, names)]
+    if not plan["sections"]:
+        plan["mode"], plan["reason"] = "full", "no section of the previous document refers to the changed code"
+    elif len(plan["sections"]) > INCREMENTAL_MAX_SECTION_RATIO * len(sections):
+        plan["mode"], plan["reason"] = "full", f"{len(plan['sections'])} of {len(sections)} sections affected"
+    else:
+        plan["mode"] = "incremental"
+    plan["code_changes"] = describe_changes(diff)
+    plan["abap_structure"] = format_structure(structure)
+    plan["document_sections"] = sections
+    return plan
+
+
+async def regenerate_sections(model, plan: dict) -> str:
+    """Revise the affected sections concurrently and return the spliced document."""
+    sections = list(plan["document_sections"])
+    changed_routines = ", ".join(plan["changed"] + plan["added"] + plan["removed"])
+    prompt = get_prompt("section_reviser").chat_prompt
+    semaphore = asyncio.Semaphore(max(1, INCREMENTAL_PARALLELISM))
+
+    async def revise(index):
+        messages = prompt.format_messages(
+            changed_routines=changed_routines,
+            code_changes=plan["code_changes"],
+            abap_structure=plan["abap_structure"],
+            section_text=sections[index],
+        )
+        async with semaphore:
+            response, cached = await cached_ainvoke(model, messages, "section_reviser")
+        add_token_usage(response, "section_reviser", cached=cached)
+        revised = response.content.strip("\n")
+        # Keep the section boundary: each section ends where the next heading starts
+        return index, revised + ("\n" if sections[index].endswith("\n") else "")
+
+    with tracing.span("section_reviser", current_task_id.get(), sections=len(plan["sections"])):
+        revised_sections = await asyncio.gather(*(revise(i) for i in plan["sections"]))
+    for index, revised in revised_sections:
+        sections[index] = revised
+    return "".join(sections)
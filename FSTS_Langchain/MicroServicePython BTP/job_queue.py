@@ -0,0 +1,143 @@
+# job_queue.py
+import asyncio
+import math
+import os
+import time
+import traceback
+from collections import OrderedDict, deque
+
+JOB_SLOTS = int(os.getenv("FSTS_JOB_SLOTS", 2))
+JOB_QUEUE_MAX_PENDING = int(os.getenv("FSTS_JOB_QUEUE_MAX_PENDING", 20))
+JOB_QUEUE_MAX_PER_CLIENT = int(os.getenv("FSTS_JOB_QUEUE_MAX_PER_CLIENT", 5))
+JOB_MAX_PRIORITY = int(os.getenv("FSTS_JOB_MAX_PRIORITY", 9))
+# Initial guess for one pipeline run, refined from observed run times
+JOB_DEFAULT_DURATION_SECONDS = float(os.getenv("FSTS_JOB_DEFAULT_DURATION_SECONDS", 180))
+
+
+class QueueFull(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Job:
+    def __init__(self, job_id, client_id, priority, run):
+        self.job_id = job_id
+        self.client_id = client_id
+        self.priority = priority
+        self.run = run  # zero-argument callable returning a coroutine
+        self.submitted_at = time.time()
+
+
+class JobQueue:
+    """
+    Bounded queue feeding a fixed number of pipeline slots.
+    Higher priority jobs are dispatched first; within a priority level clients
+    take turns (round-robin), so one client's burst cannot starve the others.
+    """
+
+    def __init__(self, slots=JOB_SLOTS, max_pending=JOB_QUEUE_MAX_PENDING,
+                 max_per_client=JOB_QUEUE_MAX_PER_CLIENT):
+        self.slots = slots
+        self.max_pending = max_pending
+        self.max_per_client = max_per_client
+        # priority -> OrderedDict(client_id -> deque[Job]); dict order is the turn order
+        self._levels = {}
+        self._pending = 0
+        self._per_client = {}
+        self._running = 0
+        self._avg_duration = JOB_DEFAULT_DURATION_SECONDS
+        self._wakeup = asyncio.Event()
+        self._workers = []
+
+    # --- Admission ---
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to free up for a new submission."""
+        waves = (self._pending + self._running) / max(self.slots, 1)
+        return max(1, math.ceil(max(waves, 1) * self._avg_duration))
+
+    def submit(self, job_id, client_id, priority, run) -> int:
+        """Enqueue a job and return its 1-based queue position, or raise QueueFull."""
+        if self._pending >= self.max_pending:
+            raise QueueFull("Job queue is full.", self.retry_after())
+        if self.max_per_client and self._per_client.get(client_id, 0) >= self.max_per_client:
+            raise QueueFull("Too many queued jobs for this client.", self.retry_after())
+
+        priority = min(max(int(priority), 0), JOB_MAX_PRIORITY)
+        clients = self._levels.setdefault(priority, OrderedDict())
+        clients.setdefault(client_id, deque()).append(Job(job_id, client_id, priority, run))
+        self._pending += 1
+        self._per_client[client_id] = self._per_client.get(client_id, 0) + 1
+        self._wakeup.set()
+        return self.position(job_id)
+
+    # --- Scheduling ---
+    def _dispatch_order(self):
+        """Yield pending jobs in the order they will be started."""
+        for priority in sorted(self._levels, reverse=True):
+            queues = [list(q) for q in self._levels[priority].values()]
+            for i in range(max((len(q) for q in queues), default=0)):
+                for q in queues:
+                    if i < len(q):
+                        yield q[i]
+
+    def position(self, job_id):
+        for i, job in enumerate(self._dispatch_order(), start=1):
+            if job.job_id == job_id:
+                return i
+        return None
+
+    def _pop_next(self):
+        for priority in sorted(self._levels, reverse=True):
+            clients = self._levels[priority]
+            client_id, jobs = next(iter(clients.items()))
+            job = jobs.popleft()
+            # Client goes to the back of the line for its next job
+            del clients[client_id]
+            if jobs:
+                clients[client_id] = jobs
+            if not clients:
+                del self._levels[priority]
+            self._pending -= 1
+            self._per_client[client_id] -= 1
+            if not self._per_client[client_id]:
+                del self._per_client[client_id]
+            return job
+        return None
+
+    async def _worker(self):
+        while True:
+            job = self._pop_next()
+            if job is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            self._running += 1
+            started = time.time()
+            try:
+                # Own task, so context variables set by one job (current_task_id) do not leak into the next
+                await asyncio.create_task(job.run())
+            except Exception:
+                traceback.print_exc()
+            finally:
+                self._running -= 1
+                # Exponentially weighted average keeps Retry-After close to reality
+                self._avg_duration = 0.8 * self._avg_duration + 0.2 * (time.time() - started)
+
+    def start(self):
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.slots)]
+
+    async def stop(self):
+        for w in self._workers:
+            w.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def stats(self) -> dict:
+        return {
+            "slots": self.slots,
+            "running": self._running,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "avg_duration_seconds": round(self._avg_duration, 1),
+        }
@@ -0,0 +1,187 @@
+# llm_backends.py
+# Backend registry and per-node model routing. A model is named by a spec
+# "backend:model" (e.g. "gemini:gemini-2.5-flash", "openai:meta-llama-3.1-8b-instruct",
+# "fake"); each workflow node uses its configured spec or the default one.
+# Nodes on a cheaper model are re-run on the escalation model only when their
+# output fails validation.
+import logging
+import os
+import re
+from functools import lru_cache
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from llm_cache import cached_invoke, cached_ainvoke
+from utils import add_token_usage
+import metrics
+import tracing
+
+DEFAULT_MODEL = os.getenv("FSTS_LLM_DEFAULT", "gemini:gemini-2.5-pro")
+# node=spec pairs, comma separated; nodes not listed use DEFAULT_MODEL
+NODE_MODELS_SPEC = os.getenv(
+    "FSTS_LLM_NODE_MODELS",
+    "foreign_dependency_agent=gemini:gemini-2.5-flash,output_reviewer=gemini:gemini-2.5-flash",
+)
+ESCALATION_MODEL = os.getenv("FSTS_LLM_ESCALATION_MODEL", DEFAULT_MODEL)
+OPENAI_BASE_URL = os.getenv("FSTS_OPENAI_BASE_URL", "http://localhost:1234/v1")  # LM Studio default
+MIN_OUTPUT_CHARS = int(os.getenv("FSTS_LLM_MIN_OUTPUT_CHARS", 200))
+# node=chars pairs overriding MIN_OUTPUT_CHARS; the reviewer may approve with a bare "NO ISSUES"
+NODE_MIN_OUTPUT_CHARS_SPEC = os.getenv("FSTS_LLM_NODE_MIN_OUTPUT_CHARS", "output_reviewer=0")
+
+# Responses that mean the model gave up rather than did the task
+REFUSAL = re.compile(r"^\s*(i('m| am) sorry|i can(no|')t|i am unable|as an ai)", re.IGNORECASE)
+TRUNCATED_FINISH_REASONS = {"MAX_TOKENS", "length"}
+
+
+def parse_node_models(spec: str) -> dict:
+    models = {}
+    for pair in filter(None, (p.strip() for p in spec.split(","))):
+        node, _, model = pair.partition("=")
+        if not model:
+            raise ValueError(f"FSTS_LLM_NODE_MODELS entry '{pair}' is not node=backend:model")
+        models[node.strip()] = model.strip()
+    return models
+
+
+NODE_MODELS = parse_node_models(NODE_MODELS_SPEC)
+
+def parse_node_min_chars(spec: str) -> dict:
+    limits = {}
+    for pair in filter(None, (p.strip() for p in spec.split(","))):
+        node, _, chars = pair.partition("=")
+        if not chars.strip().isdigit():
+            raise ValueError(f"FSTS_LLM_NODE_MIN_OUTPUT_CHARS entry '{pair}' is not node=chars")
+        limits[node.strip()] = int(chars)
+    return limits
+
+
+NODE_MIN_OUTPUT_CHARS = parse_node_min_chars(NODE_MIN_OUTPUT_CHARS_SPEC)
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic local model for development: echoes the prompt size, never calls out."""
+    model: str = "fake"
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"model": self.model}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        prompt_chars = sum(len(str(m.content)) for m in messages)
+        content = (
+            "# Specification\n\n## 1. Overview\n\n"
+            f"Placeholder generated by the fake backend for a {prompt_chars}-character prompt.\n\n"
+            "[ROUTE: final_output]"
+        )
+        usage = {"input_tokens": prompt_chars // 4, "output_tokens": len(content) // 4}
+        usage["total_tokens"] = usage["input_tokens"] + usage["output_tokens"]
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content, usage_metadata=usage))])
+
+
+def _gemini(model_name):
+    from dotenv import load_dotenv
+    from langchain_google_genai import ChatGoogleGenerativeAI  # SDK import alone takes over a second
+    load_dotenv()
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY not found in .env file")
+    return ChatGoogleGenerativeAI(model=model_name, google_api_key=api_key)
+
+
+def _openai(model_name):
+    try:
+        from langchain_openai import ChatOpenAI
+    except ImportError as e:
+        raise RuntimeError("The openai backend needs the langchain-openai package") from e
+    return ChatOpenAI(
+        model=model_name,
+        openai_api_base=OPENAI_BASE_URL,
+        openai_api_key=os.getenv("FSTS_OPENAI_API_KEY", "none"),  # local servers need no key
+    )
+
+
+def _fake(model_name):
+    return FakeChatModel(model=model_name or "fake")
+
+
+BACKENDS = {"gemini": _gemini, "openai": _openai, "fake": _fake}
+
+
+@lru_cache(maxsize=None)
+def get_model(spec: str):
+    """Build the client for a "backend:model" spec once per process."""
+    backend, _, model_name = spec.partition(":")
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend '{backend}' in '{spec}' (known: {', '.join(BACKENDS)})")
+    return BACKENDS[backend](model_name)
+
+
+def node_model_spec(node: str) -> str:
+    return NODE_MODELS.get(node, DEFAULT_MODEL)
+
+
+def model_for(node: str, state=None):
+    """The node's model; a "model" in the state (e.g. from a benchmark) overrides routing."""
+    override = state.get("model") if state else None
+    return override or get_model(node_model_spec(node))
+
+
+def routing_signature() -> dict:
+    """Everything that decides which model answers which node (part of the result cache key)."""
+    return {"default": DEFAULT_MODEL, "nodes": dict(sorted(NODE_MODELS.items())), "escalation": ESCALATION_MODEL}
+
+
+def validate_output(response, node=None) -> str:
+    """Reason the response is unusable, or "" if it passes."""
+    content = response.content if isinstance(response.content, str) else str(response.content)
+    finish = (getattr(response, "response_metadata", None) or {}).get("finish_reason")
+    if finish in TRUNCATED_FINISH_REASONS:
+        return f"truncated ({finish})"
+    if len(content.strip()) < NODE_MIN_OUTPUT_CHARS.get(node, MIN_OUTPUT_CHARS):
+        return f"only {len(content.strip())} characters"
+    if REFUSAL.match(content):
+        return "refusal"
+    return ""
+
+
+def _escalation(node, state):
+    """(model, escalation model or None) for one node call."""
+    if state and state.get("model"):
+        return state["model"], None
+    spec = node_model_spec(node)
+    return get_model(spec), (get_model(ESCALATION_MODEL) if spec != ESCALATION_MODEL else None)
+
+
+def _escalate(node, reason):
+    tracing.event(logging.WARNING, "llm_escalation", node=node, model=node_model_spec(node), to=ESCALATION_MODEL, reason=reason)
+    metrics.inc("fsts_llm_escalations_total", node=node)
+
+
+def invoke_node(node: str, messages, state=None):
+    """Call the node's model (memoized), book the tokens, escalate if the output fails validation."""
+    model, stronger = _escalation(node, state)
+    response, cached = cached_invoke(model, messages, node)
+    add_token_usage(response, node, cached=cached)
+    reason = validate_output(response, node) if stronger is not None else ""
+    if reason:
+        _escalate(node, reason)
+        response, cached = cached_invoke(stronger, messages, node)
+        add_token_usage(response, node, cached=cached)
+    return response
+
+
+async def ainvoke_node(node: str, messages, state=None):
+    """Async counterpart of invoke_node."""
+    model, stronger = _escalation(node, state)
+    response, cached = await cached_ainvoke(model, messages, node)
+    add_token_usage(response, node, cached=cached)
+    reason = validate_output(response, node) if stronger is not None else ""
+    if reason:
+        _escalate(node, reason)
+        response, cached = await cached_ainvoke(stronger, messages, node)
+        add_token_usage(response, node, cached=cached)
+    return response
@@ -0,0 +1,195 @@
+# llm_cache.py
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from langchain_core.messages import message_to_dict, messages_from_dict
+import resilience
+import tracing
+
+LLM_CACHE_ENABLED = os.getenv("FSTS_LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_DIR = os.getenv("FSTS_LLM_CACHE_DIR", os.path.join("outputs", "llm_cache"))
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("FSTS_LLM_CACHE_MEMORY_ENTRIES", 64))
+LLM_CACHE_DISK_ENTRIES = int(os.getenv("FSTS_LLM_CACHE_DISK_ENTRIES", 1000))
+LLM_CACHE_MAX_AGE_SECONDS = int(os.getenv("FSTS_LLM_CACHE_MAX_AGE_SECONDS", 3600 * 24 * 7))
+
+
+def model_fingerprint(model) -> dict:
+    """Model name and generation parameters that affect the response."""
+    params = getattr(model, "_identifying_params", None)
+    if not isinstance(params, dict):
+        params = {"model": getattr(model, "model", None)}
+    params = {k: v for k, v in params.items() if "key" not in k.lower()}
+    return {"class": type(model).__name__, **params}
+
+
+def cache_key(model, messages) -> str:
+    """Digest of the model fingerprint and the formatted prompt messages."""
+    payload = {
+        "model": model_fingerprint(model),
+        "messages": [(m.type, m.content) for m in messages],
+    }
+    raw = json.dumps(payload, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class MemoryLRUCache:
+    """In-process tier: the most recently used responses, bounded by entry count."""
+
+    def __init__(self, max_entries=LLM_CACHE_MEMORY_ENTRIES):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, message):
+        with self._lock:
+            self._data[key] = message
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+
+class DiskCache:
+    """
+    On-disk tier shared by all workers: one JSON file per response.
+    File mtimes double as the LRU clock; entries past max_age are ignored and
+    the oldest files are evicted once max_entries is exceeded.
+    """
+
+    def __init__(self, directory=LLM_CACHE_DIR, max_entries=LLM_CACHE_DISK_ENTRIES,
+                 max_age_seconds=LLM_CACHE_MAX_AGE_SECONDS):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.max_age_seconds:
+                os.remove(path)
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                message = messages_from_dict([json.load(f)])[0]
+            os.utime(path)
+            return message
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, key, message):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(message_to_dict(message), f, ensure_ascii=False)
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self):
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith(".json")]
+        except OSError:
+            return
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        for e in entries[: len(entries) - self.max_entries]:
+            try:
+                os.remove(e.path)
+            except OSError:
+                pass
+
+
+class TieredLLMCache:
+    """Memory LRU in front of the disk cache; disk hits are promoted to memory."""
+
+    def __init__(self, memory=None, disk=None):
+        self.memory = memory or MemoryLRUCache()
+        self.disk = disk or DiskCache()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        message = self.memory.get(key)
+        if message is None:
+            message = self.disk.get(key)
+            if message is not None:
+                self.memory.put(key, message)
+        if message is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return message
+
+    def put(self, key, message):
+        self.memory.put(key, message)
+        self.disk.put(key, message)
+
+
+_llm_cache = TieredLLMCache() if LLM_CACHE_ENABLED else None
+
+
+def get_llm_cache():
+    return _llm_cache
+
+
+def set_llm_cache(cache):
+    """Install any object with get(key)/put(key, message), or None to disable memoization."""
+    global _llm_cache
+    _llm_cache = cache
+
+
+def cached_invoke(model, messages, node=None):
+    """
+    model.invoke(messages) memoized on the model fingerprint and messages.
+    Returns (response, cached) so callers can book cached tokens separately.
+    Uncached calls go through resilience.call (retries, circuit breaker) for `node`.
+    """
+    response, cached = _cached_invoke(model, messages, node)
+    tracing.record_llm_call(messages, response, cached)
+    return response, cached
+
+
+def _cached_invoke(model, messages, node):
+    cache = _llm_cache
+    if cache is None:
+        return resilience.call(model, messages, node), False
+    key = cache_key(model, messages)
+    response = cache.get(key)
+    if response is not None:
+        return response, True
+    response = resilience.call(model, messages, node)
+    cache.put(key, response)
+    return response, False
+
+
+async def cached_ainvoke(model, messages, node=None):
+    """Async counterpart of cached_invoke: awaits model.ainvoke (with timeout and hedging), cache I/O off the event loop."""
+    response, cached = await _cached_ainvoke(model, messages, node)
+    tracing.record_llm_call(messages, response, cached)
+    return response, cached
+
+
+async def _cached_ainvoke(model, messages, node):
+    cache = _llm_cache
+    if cache is None:
+        return await resilience.acall(model, messages, node), False
+    key = cache_key(model, messages)
+    response = await asyncio.to_thread(cache.get, key)
+    if response is not None:
+        return response, True
+    response = await resilience.acall(model, messages, node)
+    await asyncio.to_thread(cache.put, key, response)
+    return response, False
@@ -1,31 +1,39 @@
+import asyncio
 import os
 import warnings
 warnings.filterwarnings('ignore')
-from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
 from data_processor import DataProcessor
+from abap_scanner import prepare_analysis_inputs
+import llm_backends
+import checkpoints
+from checkpoint_saver import get_saver
 # from tasks import analyze_code_task, foreign_dependency_task, functional_spec_task, technical_spec_task, initial_consolidation_task, output_review_feedback_task, final_specification_task
 # from agents import abap_code_analyst, functional_spec_drafter, technical_spec_writer, manager_agent, output_reviewer, final_output
-from utils import token_usage_history, print_total_token_usage
+from utils import task_usage_entries, summarize_task_usage, current_task_id
+import logging
+import tracing
 from langchain_core.messages import BaseMessage
 import time
-from workflow_graph import build_workflow
+from workflow_graph import build_workflow, build_parallel_workflow, validate_prompts
 
 # --- User configuration ---
 BASE_PATH = os.getcwd()
+# Run independent agents concurrently (see workflow_graph.build_parallel_workflow)
+PARALLEL_WORKFLOW = os.getenv("FSTS_PARALLEL_WORKFLOW", "1") == "1"
 
 # --- Data loading ---
+# Nothing is read or created at import; the template is loaded on first use
 data_processor = DataProcessor(BASE_PATH)
-RUN_FOLDER = data_processor.get_run_folder()
-final_dir = data_processor.get_final_dir()
-_, template_text = data_processor.get_data()
 
 # --- LLM initialization ---
-load_dotenv()
-api_key = os.getenv('GEMINI_API_KEY')
-if not api_key:
-    raise ValueError("GOOGLE_API_KEY not found in .env file")
-llm_model = ChatGoogleGenerativeAI(model="gemini-2.5-pro", google_api_key=api_key)
+# Models are chosen per node by llm_backends (FSTS_LLM_DEFAULT / FSTS_LLM_NODE_MODELS)
+# Review rounds between manager_agent and output_reviewer
+MIN_OUTPUT_REVIEWS = 1
+MAX_OUTPUT_REVIEWS = 2
+
+def get_llm_model():
+    """The default model's client, built on first use (the Gemini SDK import alone takes over a second)."""
+    return llm_backends.get_model(llm_backends.DEFAULT_MODEL)
 
 
 # --- Main function ---
@@ -33,11 +41,38 @@ llm_model = ChatGoogleGenerativeAI(model="gemini-2.5-pro", google_api_key=api_ke
 # It initializes the data processor, loads the code files, sets up the LLM,
 # builds the workflow graph, and runs the workflow.
 # The final output is saved to a markdown file in the last run output folder.
-def main(code_input_b64=None, task_id=None):
-   
+def compile_workflow(use_async=False, checkpointer=None):
     # --- Build the LangGraph StateGraph ---
-    workflow = build_workflow()
-    app = workflow.compile()
+    workflow = build_parallel_workflow(use_async) if PARALLEL_WORKFLOW else build_workflow(use_async)
+    return workflow.compile(checkpointer=checkpointer)
+
+def build_initial_state(code_input_val, template_text_val, task_id=None, model=None):
+    """Initial workflow state; `model` replaces the per-node models for the whole run (e.g. in benchmarks)."""
+    state = {
+        "task_id": task_id,
+        "code_input": code_input_val,
+        **prepare_analysis_inputs(code_input_val),
+        "template_text": template_text_val,
+        "messages": [],
+        "review_count": 0,
+        "review_rounds_saved": 0,
+        "min_output_reviews": MIN_OUTPUT_REVIEWS,
+        "max_output_reviews": MAX_OUTPUT_REVIEWS,
+    }
+    if model is not None:
+        state["model"] = model
+    return state
+
+def report_run(start_time):
+    usage = summarize_task_usage(task_usage_entries())
+    tracing.event(
+        logging.INFO, "run", task=current_task_id.get(), duration_s=round(time.time() - start_time, 3),
+        llm_calls=usage["calls"], billed_tokens=usage["billed"].get("total_tokens", 0),
+        cached_tokens=usage["cached"].get("total_tokens", 0),
+    )
+
+def main(code_input_b64=None, task_id=None, template_id=None):
+    app = compile_workflow()
 
     # Export workflow graph as PNG using provided task_id (from API)
     # graph_png_path = os.path.join(final_dir, f"workflow_graph_{task_id}.png")
@@ -46,27 +81,54 @@ def main(code_input_b64=None, task_id=None):
     
     # --- Prepare data for workflow ---
     code_input_val = data_processor.read_code_files(code_input_b64=code_input_b64)
-    template_text_val = data_processor.read_template_pdf()
+    template_text_val = data_processor.read_template_pdf(template_id)
 
     # --- Run the workflow ---
-    initial_state = {
-        "code_input": code_input_val,
-        "template_text": template_text_val,
-        "model": llm_model,
-        "messages": [],
-        "review_count": 0,
-        "min_output_reviews": 1,
-        "max_output_reviews": 2,
-    }
+    initial_state = build_initial_state(code_input_val, template_text_val, task_id)
+    current_task_id.set(task_id)
 
     start_time = time.time()
     final_result = app.invoke(initial_state)
-    success = True
-    end_time = time.time()
-    execution_time = end_time - start_time  # in seconds
-    print(f"Execution time: {execution_time:.3f} seconds")
-    print(token_usage_history)
-    print_total_token_usage(token_usage_history)
+    report_run(start_time)
+
+    return final_result
+
+# --- Async entry point used by the API server ---
+# Nodes await model.ainvoke, so one event loop can drive many runs at once
+# without holding a threadpool thread per task.
+# With a task_id, every finished node is checkpointed (see checkpoints.py).
+async def main_async(code_input_b64=None, task_id=None, template_id=None):
+    saver = get_saver() if task_id else None
+    app = compile_workflow(use_async=True, checkpointer=saver)
+
+    code_input_val = data_processor.read_code_files(code_input_b64=code_input_b64)
+    template_text_val = await asyncio.to_thread(data_processor.read_template_pdf, template_id)
+    initial_state = build_initial_state(code_input_val, template_text_val, task_id)
+    current_task_id.set(task_id)  # scoped to this run's asyncio task
+
+    start_time = time.time()
+    final_result = await app.ainvoke(initial_state, checkpoints.run_config(task_id) if saver else None)
+    report_run(start_time)
+
+    return final_result
+
+async def resume_async(task_id):
+    """
+    Continue a task's run from its last checkpoint: nodes that finished (also
+    those that completed next to a failed one) are not run again. A run that
+    got through the whole graph just returns its final state.
+    """
+    app = compile_workflow(use_async=True, checkpointer=get_saver())
+    config = checkpoints.run_config(task_id)
+    snapshot = await app.aget_state(config)
+    if not snapshot.values:
+        raise LookupError(f"No checkpoint to resume task {task_id} from")
+    current_task_id.set(task_id)
+
+    start_time = time.time()
+    tracing.event(logging.INFO, "run_resumed", task=task_id, next=",".join(snapshot.next) or "publish")
+    final_result = await app.ainvoke(None, config) if snapshot.next else snapshot.values
+    report_run(start_time)
 
     return final_result
 
@@ -84,17 +146,12 @@ def generate_final_messages(final_result):
         final_messages = str(final_messages)
     return final_messages
 
-output_path = os.path.join(final_dir, "final_specifications.md")
-
-# --- For API/static testing and import: always define final_messages from file ---
-try:
-    with open(output_path, "r", encoding="utf-8") as f:
-        final_messages = f.read()
-except Exception:
-    final_messages = ""
-
 # --- For normal workflow run: Generate and save output ---
 if __name__ == "__main__":
+    final_dir = data_processor.get_final_dir()
+    os.makedirs(final_dir, exist_ok=True)
+    output_path = os.path.join(final_dir, "final_specifications.md")
+    validate_prompts()
     final_result = main()
     final_messages = generate_final_messages(final_result)
     with open(output_path, "w", encoding="utf-8") as f:
@@ -0,0 +1,116 @@
+# metrics.py
+# Process-wide counters and histograms for capacity planning, rendered in the
+# Prometheus text format by GET /metrics. Each uvicorn worker process keeps
+# its own values; Prometheus sums them across scrape targets.
+import threading
+from collections import defaultdict
+
+NODE_SECONDS_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600)
+CALL_TOKENS_BUCKETS = (1000, 5000, 10000, 25000, 50000, 100000, 200000, 500000)
+PDF_SECONDS_BUCKETS = (0.5, 1, 2, 5, 10, 30, 60)
+
+# name -> (type, help)
+METRICS = {
+    "fsts_llm_tokens_total": ("counter", "Billed LLM tokens by node and type (input, output, cache_read)"),
+    "fsts_llm_calls_total": ("counter", "LLM calls by node; cached=true calls were served from the LLM cache"),
+    "fsts_llm_cache_saved_tokens_total": ("counter", "Tokens served from the LLM response cache instead of the model"),
+    "fsts_llm_escalations_total": ("counter", "Node outputs that failed validation and were re-run on the escalation model"),
+    "fsts_llm_retries_total": ("counter", "LLM call attempts retried after a transient error, by node and error"),
+    "fsts_llm_timeouts_total": ("counter", "LLM call attempts that hit the node timeout"),
+    "fsts_llm_hedges_total": ("counter", "Duplicate requests started for calls slower than the hedge percentile"),
+    "fsts_llm_hedge_wins_total": ("counter", "Hedged calls by the request that answered first"),
+    "fsts_llm_circuit_opened_total": ("counter", "Times a model's circuit breaker opened"),
+    "fsts_llm_call_tokens": ("histogram", "Billed total tokens per LLM call by node"),
+    "fsts_node_duration_seconds": ("histogram", "Workflow node run time"),
+    "fsts_pdf_render_seconds": ("histogram", "PDF render time in the render pool"),
+    "fsts_review_converged_total": ("counter", "Manager/reviewer loops ended early, by reason (no_issues, small_revision)"),
+    "fsts_review_rounds_saved_total": ("counter", "Review rounds not run because the loop converged early"),
+    "fsts_tasks_finished_total": ("counter", "Task runs finished by this worker, by final status"),
+}
+
+_lock = threading.Lock()
+_counters = defaultdict(float)  # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [count per bucket..., sum, count]
+_buckets = {
+    "fsts_llm_call_tokens": CALL_TOKENS_BUCKETS,
+    "fsts_node_duration_seconds": NODE_SECONDS_BUCKETS,
+    "fsts_pdf_render_seconds": PDF_SECONDS_BUCKETS,
+}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels):
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+
+def observe(name: str, value: float, **labels):
+    buckets = _buckets[name]
+    with _lock:
+        series = _histograms.setdefault(_key(name, labels), [0] * (len(buckets) + 2))
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+
+
+def record_llm_call(node: str, usage: dict, cached: bool = False):
+    """Count one model response; usage is LangChain usage_metadata."""
+    inc("fsts_llm_calls_total", node=node, cached=str(cached).lower())
+    total = usage.get("total_tokens", 0)
+    if cached:
+        inc("fsts_llm_cache_saved_tokens_total", total, node=node)
+        return
+    inc("fsts_llm_tokens_total", usage.get("input_tokens", 0), node=node, type="input")
+    inc("fsts_llm_tokens_total", usage.get("output_tokens", 0), node=node, type="output")
+    cache_read = (usage.get("input_token_details") or {}).get("cache_read", 0)
+    if cache_read:
+        inc("fsts_llm_tokens_total", cache_read, node=node, type="cache_read")
+    observe("fsts_llm_call_tokens", total, node=node)
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+def render(gauges: dict = None) -> str:
+    """
+    Text exposition of all metrics plus point-in-time gauges passed by the
+    caller as {name: (help, {((label, value), ...): gauge_value})}.
+    """
+    with _lock:
+        counters = dict(_counters)
+        histograms = {k: list(v) for k, v in _histograms.items()}
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        if kind == "counter":
+            for (n, labels), value in sorted(counters.items()):
+                if n == name:
+                    lines.append(f"{name}{_labels(labels)} {_number(value)}")
+            continue
+        for (n, labels), series in sorted(histograms.items()):
+            if n != name:
+                continue
+            for bound, count in zip(_buckets[name], series):
+                lines.append(f"{name}_bucket{_labels(labels, [('le', bound)])} {count}")
+            lines.append(f"{name}_bucket{_labels(labels, [('le', '+Inf')])} {series[-1]}")
+            lines.append(f"{name}_sum{_labels(labels)} {_number(series[-2])}")
+            lines.append(f"{name}_count{_labels(labels)} {series[-1]}")
+    for name, (help_text, values) in (gauges or {}).items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        for labels, value in values.items():
+            lines.append(f"{name}{_labels(labels)} {_number(value)}")
+    return "\n".join(lines) + "\n"
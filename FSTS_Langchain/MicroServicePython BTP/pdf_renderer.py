@@ -0,0 +1,143 @@
+# pdf_renderer.py
+# Renders markdown to PDF in a dedicated process pool so weasyprint never runs
+# on the API worker. Each render process loads weasyprint, parses the CSS and
+# lays out a warm-up page once, then is replaced after a fixed number of jobs
+# to cap memory growth.
+import asyncio
+import multiprocessing
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import metrics
+
+# Render processes (0 = render in a thread of the API worker instead)
+PDF_WORKERS = int(os.getenv("FSTS_PDF_WORKERS", 1))
+# Jobs a render process handles before it is replaced
+PDF_MAX_TASKS_PER_CHILD = int(os.getenv("FSTS_PDF_MAX_TASKS_PER_CHILD", 20))
+LATENCY_WINDOW = 100  # recent renders kept for the latency figures
+
+_pool = None
+_pool_lock = threading.Lock()
+_pending = 0
+_stats = {"completed": 0, "failed": 0, "pool_restarts": 0}
+_render_seconds = deque(maxlen=LATENCY_WINDOW)
+_wait_seconds = deque(maxlen=LATENCY_WINDOW)
+
+
+def _init_worker():
+    """Preload weasyprint, the parsed stylesheet and fonts in a fresh render process."""
+    try:
+        from utils import load_weasyprint, get_pdf_stylesheet
+        weasyprint = load_weasyprint()
+        stylesheet = get_pdf_stylesheet()
+        # Laying out one page loads the fonts (fontconfig/pango caches) up front
+        weasyprint.HTML(string="<p>warm-up</p>").write_pdf(stylesheets=[stylesheet])
+    except Exception as e:
+        # Leave the process usable; the real render reports the error
+        print(f"[pdf_renderer] Preload failed: {e}")
+
+
+def _render_job(md_file: str, submitted_at: float):
+    """Runs in a render process; returns (wait_seconds, render_seconds)."""
+    started = time.time()
+    from utils import process_markdown
+    process_markdown(md_file)
+    return started - submitted_at, time.time() - started
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: max_tasks_per_child needs a start method other than fork,
+            # and the render processes should not inherit the server's state
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                max_tasks_per_child=PDF_MAX_TASKS_PER_CHILD,
+            )
+        return _pool
+
+
+def _reset_pool(broken):
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+            _stats["pool_restarts"] += 1
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+async def render_pdf(md_file: str):
+    """Clean the markdown and write {base}.pdf next to it without blocking the event loop."""
+    global _pending
+    _pending += 1
+    submitted_at = time.time()
+    try:
+        if PDF_WORKERS <= 0:
+            wait_s, render_s = await asyncio.to_thread(_render_job, md_file, submitted_at)
+        else:
+            pool = _get_pool()
+            try:
+                wait_s, render_s = await asyncio.wrap_future(pool.submit(_render_job, md_file, submitted_at))
+            except BrokenProcessPool:
+                # A render process died (e.g. out of memory); start a fresh pool for later jobs
+                _reset_pool(pool)
+                raise
+        _stats["completed"] += 1
+        _wait_seconds.append(wait_s)
+        _render_seconds.append(render_s)
+        metrics.observe("fsts_pdf_render_seconds", render_s)
+    except Exception:
+        _stats["failed"] += 1
+        raise
+    finally:
+        _pending -= 1
+
+
+def warm_up():
+    """Start the render processes ahead of the first job (they preload in their initializer)."""
+    if PDF_WORKERS > 0:
+        pool = _get_pool()
+        for _ in range(PDF_WORKERS):
+            pool.submit(time.sleep, 0)
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        # wait: the spawned workers hold both ends of the call queue and outlive
+        # the server unless they are given their exit sentinel
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _latency(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return {
+        "last_s": round(values[-1], 3),
+        "avg_s": round(statistics.fmean(values), 3),
+        "p95_s": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 3),
+        "max_s": round(ordered[-1], 3),
+    }
+
+
+def stats() -> dict:
+    workers = max(PDF_WORKERS, 1)
+    return {
+        "workers": PDF_WORKERS,
+        "max_tasks_per_child": PDF_MAX_TASKS_PER_CHILD,
+        "in_flight": _pending,
+        "queue_depth": max(0, _pending - workers),
+        **_stats,
+        "render_latency": _latency(_render_seconds),
+        "queue_wait": _latency(_wait_seconds),
+    }
@@ -0,0 +1,111 @@
+# progress.py
+import asyncio
+import inspect
+import os
+import time
+from task_registry import OUTPUTS_DIR, add_task_event
+from utils import task_usage_entries, sum_token_usage
+import metrics
+
+# node -> state key published as a downloadable artifact when the node finishes
+ARTIFACT_NODES = {
+    "abap_code_analyst": "abap_analysis",
+    "foreign_dependency_agent": "foreign_dependencies",
+    "functional_spec_drafter": "fs_output",
+    "technical_spec_writer": "ts_output",
+}
+ARTIFACT_NAMES = set(ARTIFACT_NODES.values())
+
+_run_started = {}  # task_id -> time.time() when the run began
+
+
+def artifact_path(task_id: str, name: str) -> str:
+    return os.path.join(OUTPUTS_DIR, f"{task_id}.{name}.md")
+
+
+def start_run(task_id: str):
+    _run_started[task_id] = time.time()
+    add_task_event(task_id, "run_started", {})
+
+
+def finish_run(task_id: str, status: str, **data):
+    started = _run_started.pop(task_id, None)
+    elapsed = round(time.time() - started, 3) if started else None
+    add_task_event(task_id, "run_finished", {"status": status, "elapsed_s": elapsed, **data})
+    metrics.inc("fsts_tasks_finished_total", status=status)
+
+
+def _elapsed(task_id):
+    started = _run_started.get(task_id)
+    return round(time.time() - started, 3) if started else None
+
+
+def _node_started(name, state):
+    add_task_event(state["task_id"], "node_started", {"node": name, "elapsed_s": _elapsed(state["task_id"])})
+    return time.time(), len(task_usage_entries(state["task_id"]))
+
+
+def _node_finished(name, state, result, started, before_usage_count):
+    task_id = state["task_id"]
+    duration = time.time() - started
+    metrics.observe("fsts_node_duration_seconds", duration, node=name)
+    usages = [e for e in task_usage_entries(task_id)[before_usage_count:] if e["agent"] == name]
+    artifact = ARTIFACT_NODES.get(name)
+    if artifact and result.get(artifact):
+        content = result[artifact]
+        with open(artifact_path(task_id, artifact), "w", encoding="utf-8") as f:
+            f.write(content if isinstance(content, str) else str(content))
+    add_task_event(task_id, "node_finished", {
+        "node": name,
+        "elapsed_s": _elapsed(task_id),
+        "duration_s": round(duration, 3),
+        "token_usage": dict(sum_token_usage(usages)),
+        "artifact": artifact if artifact and result.get(artifact) else None,
+    })
+
+
+def _node_failed(name, state, error, started):
+    duration = time.time() - started
+    metrics.observe("fsts_node_duration_seconds", duration, node=name)
+    add_task_event(state["task_id"], "node_failed", {
+        "node": name,
+        "elapsed_s": _elapsed(state["task_id"]),
+        "duration_s": round(duration, 3),
+        "error": f"{type(error).__name__}: {error}",
+    })
+
+
+def progress_wrapper(fn, name):
+    """
+    Record node_started/node_finished (or node_failed) events for the task in
+    state["task_id"] and publish the node's artifact; runs without a task_id
+    (CLI) are untouched.
+    """
+    if inspect.iscoroutinefunction(fn):
+        async def wrapped_async(state):
+            if not state.get("task_id"):
+                return await fn(state)
+            started, before = await asyncio.to_thread(_node_started, name, state)
+            try:
+                result = await fn(state)
+            except Exception as e:
+                await asyncio.to_thread(_node_failed, name, state, e, started)
+                raise
+            await asyncio.to_thread(_node_finished, name, state, result, started, before)
+            return result
+
+        return wrapped_async
+
+    def wrapped(state):
+        if not state.get("task_id"):
+            return fn(state)
+        started, before = _node_started(name, state)
+        try:
+            result = fn(state)
+        except Exception as e:
+            _node_failed(name, state, e, started)
+            raise
+        _node_finished(name, state, result, started, before)
+        return result
+
+    return wrapped
@@ -0,0 +1,143 @@
+# prompt_registry.py
+import glob
+import hashlib
+import os
+import string
+import threading
+import time
+import yaml
+from langchain_core.prompts import ChatPromptTemplate
+
+PROMPTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts")
+# How often (at most) a prompt file's mtime is checked for hot reload
+PROMPT_RELOAD_INTERVAL_SECONDS = float(os.getenv("FSTS_PROMPT_RELOAD_INTERVAL_SECONDS", 2))
+
+
+def template_placeholders(text: str) -> set:
+    """Names of the {placeholders} in an f-string style template."""
+    return {field for _, field, _, _ in string.Formatter().parse(text) if field}
+
+
+class CompiledPrompt:
+    """One prompts/{name}.yaml, parsed and compiled into a ChatPromptTemplate."""
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+        with open(path, "rb") as f:
+            raw = f.read()
+        self.mtime = os.path.getmtime(path)
+        self.content_hash = hashlib.sha256(raw).hexdigest()
+        self.definition = yaml.safe_load(raw)
+        self.chat_prompt = ChatPromptTemplate.from_messages([
+            ("system", self.definition["system_prompt"]),
+            ("user", self.definition["user_prompt"])
+        ])
+        self.placeholders = (
+            template_placeholders(self.definition["system_prompt"])
+            | template_placeholders(self.definition["user_prompt"])
+        )
+        # `parameters:` lists the inputs the prompt expects; YAML reads
+        # `key: {key}` as a mapping, so only the keys matter
+        self.declared_parameters = set((self.definition.get("parameters") or {}).keys())
+
+    def problems(self, available_keys) -> list:
+        issues = []
+        missing = self.placeholders - set(available_keys)
+        if missing:
+            issues.append(f"{self.name}: placeholders not provided by the workflow: {sorted(missing)}")
+        if self.declared_parameters and self.declared_parameters != self.placeholders:
+            issues.append(
+                f"{self.name}: declared parameters {sorted(self.declared_parameters)} "
+                f"do not match placeholders {sorted(self.placeholders)}"
+            )
+        return issues
+
+
+class PromptRegistry:
+    """
+    Loads every prompt once and serves the compiled templates from memory.
+    Files are re-read only when their mtime changes (checked at most every
+    reload_interval seconds), so edits apply without a restart.
+    """
+
+    def __init__(self, prompts_dir=PROMPTS_DIR, reload_interval=PROMPT_RELOAD_INTERVAL_SECONDS):
+        self.prompts_dir = prompts_dir
+        self.reload_interval = reload_interval
+        self._prompts = {}
+        self._checked_at = {}
+        self._expected_inputs = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def load_all(self):
+        with self._lock:
+            for path in sorted(glob.glob(os.path.join(self.prompts_dir, "*.yaml"))):
+                name = os.path.splitext(os.path.basename(path))[0]
+                self._prompts[name] = CompiledPrompt(name, path)
+                self._checked_at[name] = time.monotonic()
+            self._loaded = True
+
+    def _maybe_reload(self, name):
+        now = time.monotonic()
+        if now - self._checked_at.get(name, 0) < self.reload_interval:
+            return
+        self._checked_at[name] = now
+        current = self._prompts[name]
+        try:
+            if os.path.getmtime(current.path) == current.mtime:
+                return
+            reloaded = CompiledPrompt(name, current.path)
+        except (OSError, yaml.YAMLError, KeyError) as e:
+            print(f"[prompts] Keeping previous '{name}' prompt, reload failed: {e}")
+            return
+        issues = reloaded.problems(self._expected_inputs[name]) if name in self._expected_inputs else []
+        if issues:
+            print(f"[prompts] Keeping previous '{name}' prompt, reload rejected: {'; '.join(issues)}")
+            current.mtime = reloaded.mtime  # don't retry until the file changes again
+            return
+        self._prompts[name] = reloaded
+        print(f"[prompts] Reloaded '{name}' ({reloaded.content_hash[:12]})")
+
+    def get(self, name) -> CompiledPrompt:
+        if not self._loaded:
+            self.load_all()
+        with self._lock:
+            if name not in self._prompts:
+                raise KeyError(f"No prompt named '{name}' in {self.prompts_dir}")
+            self._maybe_reload(name)
+            return self._prompts[name]
+
+    def content_hashes(self) -> dict:
+        """name -> sha256 of the YAML currently in use."""
+        if not self._loaded:
+            self.load_all()
+        return {name: self.get(name).content_hash for name in sorted(self._prompts)}
+
+    def validate(self, expected_inputs: dict):
+        """
+        Check each prompt against the keys its caller will format it with.
+        Raises ValueError listing every mismatch, so a bad template stops the
+        server at boot instead of failing a task minutes into a run.
+        """
+        self.load_all()
+        issues = []
+        for name, keys in expected_inputs.items():
+            if name not in self._prompts:
+                issues.append(f"{name}: prompts/{name}.yaml is missing")
+                continue
+            issues.extend(self._prompts[name].problems(keys))
+        if issues:
+            raise ValueError("Prompt validation failed:\n  " + "\n  ".join(issues))
+        self._expected_inputs = {name: set(keys) for name, keys in expected_inputs.items()}
+
+
+_registry = PromptRegistry()
+
+
+def get_prompt_registry() -> PromptRegistry:
+    return _registry
+
+
+def get_prompt(name) -> CompiledPrompt:
+    return _registry.get(name)
@@ -0,0 +1,253 @@
+# resilience.py
+# Guards around the actual model call: per-node timeouts, retries with
+# exponential backoff on transient errors (429, 5xx, timeouts, dropped
+# connections), optional hedged duplicate requests for calls slower than a
+# latency percentile, and a circuit breaker per model that fails calls and new
+# jobs fast while the provider is down. Timeouts and hedging need the async
+# path (API server); the sync path (CLI) gets retries and the breaker.
+import asyncio
+import logging
+import math
+import os
+import random
+import threading
+import time
+from collections import defaultdict, deque
+import metrics
+import tracing
+
+LLM_TIMEOUT_SECONDS = float(os.getenv("FSTS_LLM_TIMEOUT_SECONDS", 300))
+# node=seconds pairs, comma separated, overriding FSTS_LLM_TIMEOUT_SECONDS
+NODE_TIMEOUTS_SPEC = os.getenv("FSTS_LLM_NODE_TIMEOUTS", "foreign_dependency_agent=120,output_reviewer=120")
+LLM_MAX_RETRIES = int(os.getenv("FSTS_LLM_MAX_RETRIES", 3))
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("FSTS_LLM_BACKOFF_BASE_SECONDS", 2))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("FSTS_LLM_BACKOFF_MAX_SECONDS", 60))
+# Start a duplicate request once a call is slower than this percentile of the
+# node's recent latencies (0 = hedging off)
+LLM_HEDGE_PERCENTILE = float(os.getenv("FSTS_LLM_HEDGE_PERCENTILE", 0))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("FSTS_LLM_HEDGE_MIN_SAMPLES", 20))
+BREAKER_FAILURES = int(os.getenv("FSTS_BREAKER_FAILURES", 5))
+BREAKER_RESET_SECONDS = float(os.getenv("FSTS_BREAKER_RESET_SECONDS", 60))
+
+LATENCY_WINDOW = 200
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+# Exception class names of the Google, OpenAI and httpx clients that are worth retrying
+TRANSIENT_ERRORS = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "DeadlineExceeded",
+    "InternalServerError", "GatewayTimeout", "BadGateway", "Aborted",
+    "RateLimitError", "APITimeoutError", "APIConnectionError",
+    "ConnectError", "ReadTimeout", "ConnectTimeout", "RemoteProtocolError",
+}
+
+
+class CircuitOpen(RuntimeError):
+    """The model's provider failed repeatedly; calls are refused until retry_after passes."""
+
+    def __init__(self, key, retry_after):
+        super().__init__(f"LLM provider for {key} is unavailable, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+def _parse_timeouts(spec):
+    timeouts = {}
+    for pair in filter(None, (p.strip() for p in spec.split(","))):
+        node, _, seconds = pair.partition("=")
+        timeouts[node.strip()] = float(seconds)
+    return timeouts
+
+
+NODE_TIMEOUTS = _parse_timeouts(NODE_TIMEOUTS_SPEC)
+
+
+def node_timeout(node) -> float:
+    return NODE_TIMEOUTS.get(node, LLM_TIMEOUT_SECONDS)
+
+
+def is_transient(error) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    response = getattr(error, "response", None)
+    status = status or getattr(response, "status_code", None)
+    if isinstance(status, int) and status in TRANSIENT_STATUS:
+        return True
+    return any(cls.__name__ in TRANSIENT_ERRORS for cls in type(error).__mro__)
+
+
+class CircuitBreaker:
+    """Opens after BREAKER_FAILURES consecutive transient failures; one probe call is let through after the reset time."""
+
+    def __init__(self, key):
+        self.key = key
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def retry_after(self) -> int:
+        """Seconds until calls are accepted again (0 = closed or ready for a probe call)."""
+        if self.opened_at is None:
+            return 0
+        return max(0, math.ceil(self.opened_at + BREAKER_RESET_SECONDS - time.time()))
+
+    def before_call(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if time.time() - self.opened_at < BREAKER_RESET_SECONDS or self.probing:
+                raise CircuitOpen(self.key, self.retry_after() or int(BREAKER_RESET_SECONDS))
+            self.probing = True  # half-open: this call decides
+
+    def release(self):
+        """A call ended without an outcome (cancelled, interrupted): let the next call probe again."""
+        with self._lock:
+            self.probing = False
+
+    def record(self, ok: bool):
+        with self._lock:
+            was_open = self.opened_at is not None
+            self.probing = False
+            if ok:
+                self.failures, self.opened_at = 0, None
+                if was_open:
+                    tracing.event(logging.INFO, "circuit_closed", model=self.key)
+                return
+            self.failures += 1
+            if was_open or self.failures >= BREAKER_FAILURES:
+                if not was_open:
+                    tracing.event(logging.ERROR, "circuit_open", model=self.key, failures=self.failures)
+                    metrics.inc("fsts_llm_circuit_opened_total", model=self.key)
+                self.opened_at = time.time()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+_latencies = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))  # node -> recent successful call seconds
+
+
+def breaker_for(model) -> CircuitBreaker:
+    key = f"{type(model).__name__}:{getattr(model, 'model', '') or ''}"
+    with _breakers_lock:
+        if key not in _breakers:
+            _breakers[key] = CircuitBreaker(key)
+        return _breakers[key]
+
+
+def provider_retry_after() -> int:
+    """Seconds until the slowest open breaker accepts calls again; 0 if all are closed."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return max((b.retry_after() for b in breakers), default=0)
+
+
+def breaker_states() -> dict:
+    with _breakers_lock:
+        return {key: b.retry_after() for key, b in _breakers.items()}
+
+
+def backoff_seconds(attempt: int) -> float:
+    """Full-jitter exponential backoff for retry number `attempt` (1-based)."""
+    return random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** (attempt - 1)))
+
+
+def hedge_delay(node):
+    """Latency percentile of the node's recent calls, or None while hedging is off or unsampled."""
+    samples = _latencies[node]
+    if LLM_HEDGE_PERCENTILE <= 0 or len(samples) < LLM_HEDGE_MIN_SAMPLES:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(LLM_HEDGE_PERCENTILE / 100 * len(ordered)))]
+
+
+def _retry_or_raise(node, breaker, error, attempt):
+    """Backoff before the next attempt, or re-raise if the error is permanent or retries are used up."""
+    transient = is_transient(error)
+    breaker.record(ok=not transient)  # e.g. a 400 still means the provider is up
+    if not transient or attempt > LLM_MAX_RETRIES:
+        raise error
+    reason = type(error).__name__
+    delay = backoff_seconds(attempt)
+    tracing.event(logging.WARNING, "llm_retry", node=node, attempt=attempt, reason=reason, backoff_s=round(delay, 2))
+    metrics.inc("fsts_llm_retries_total", node=node, reason=reason)
+    return delay
+
+
+def call(model, messages, node=None):
+    """model.invoke with retries on transient errors and the model's circuit breaker."""
+    breaker = breaker_for(model)
+    attempt = 0
+    while True:
+        attempt += 1
+        breaker.before_call()
+        started = time.time()
+        try:
+            response = model.invoke(messages)
+        except Exception as e:
+            time.sleep(_retry_or_raise(node, breaker, e, attempt))
+            continue
+        except BaseException:
+            breaker.release()
+            raise
+        breaker.record(ok=True)
+        _latencies[node].append(time.time() - started)
+        return response
+
+
+async def _hedged(model, messages, node, timeout):
+    """One attempt; past the hedge delay a duplicate request races the first and the loser is cancelled."""
+    delay = hedge_delay(node)
+    primary = asyncio.ensure_future(model.ainvoke(messages))
+    if delay is None or delay >= timeout:
+        try:
+            return await asyncio.wait_for(primary, timeout)
+        except asyncio.TimeoutError:
+            metrics.inc("fsts_llm_timeouts_total", node=node)
+            raise
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done:
+        return primary.result()
+    metrics.inc("fsts_llm_hedges_total", node=node)
+    tracing.event(logging.INFO, "llm_hedge", node=node, after_s=round(delay, 2))
+    hedge = asyncio.ensure_future(model.ainvoke(messages))
+    pending = {primary, hedge}
+    deadline = time.monotonic() + timeout - delay
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=max(0, deadline - time.monotonic()), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                metrics.inc("fsts_llm_timeouts_total", node=node)
+                raise asyncio.TimeoutError()
+            for task in done:
+                if task.exception() is None:
+                    metrics.inc("fsts_llm_hedge_wins_total", node=node, winner="hedge" if task is hedge else "primary")
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in (primary, hedge):
+            task.cancel()
+
+
+async def acall(model, messages, node=None):
+    """model.ainvoke with a per-node timeout, optional hedging, retries and the circuit breaker."""
+    breaker = breaker_for(model)
+    timeout = node_timeout(node)
+    attempt = 0
+    while True:
+        attempt += 1
+        breaker.before_call()
+        started = time.time()
+        try:
+            response = await _hedged(model, messages, node, timeout)
+        except Exception as e:
+            await asyncio.sleep(_retry_or_raise(node, breaker, e, attempt))
+            continue
+        except BaseException:
+            breaker.release()
+            raise
+        breaker.record(ok=True)
+        _latencies[node].append(time.time() - started)
+        return response
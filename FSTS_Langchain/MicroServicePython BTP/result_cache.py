@@ -0,0 +1,175 @@
+# result_cache.py
+import hashlib
+import os
+import shutil
+import time
+from task_registry import OUTPUTS_DIR, get_connection
+
+RESULT_CACHE_DIR = os.path.join(OUTPUTS_DIR, "result_cache")
+RESULT_CACHE_ENABLED = os.getenv("FSTS_RESULT_CACHE_ENABLED", "1") == "1"
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("FSTS_RESULT_CACHE_MAX_ENTRIES", 200))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("FSTS_RESULT_CACHE_MAX_BYTES", 50 * 1024 * 1024))
+RESULT_CACHE_MAX_AGE_SECONDS = int(os.getenv("FSTS_RESULT_CACHE_MAX_AGE_SECONDS", 3600 * 24 * 14))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS result_cache (
+    cache_key  TEXT PRIMARY KEY,
+    created_at INTEGER NOT NULL,
+    last_used  INTEGER NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    hits       INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_result_cache_last_used ON result_cache(last_used);
+CREATE TABLE IF NOT EXISTS result_cache_stats (
+    name  TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def init_result_cache():
+    os.makedirs(RESULT_CACHE_DIR, exist_ok=True)
+    get_connection().executescript(SCHEMA)
+
+
+def compute_cache_key(code_text: str, template_text: str, model_name: str, prompt_hashes: dict) -> str:
+    """
+    Content address of a whole run: the decoded code, the template text, the
+    content hash of every prompt YAML and the model name (the per-node model
+    routing). Any change to one of them yields a new key.
+    """
+    h = hashlib.sha256()
+    parts = [code_text, template_text, model_name]
+    parts += [f"{name}:{digest}" for name, digest in sorted(prompt_hashes.items())]
+    for part in parts:
+        data = part.encode("utf-8")
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+def _entry_paths(cache_key: str):
+    base = os.path.join(RESULT_CACHE_DIR, cache_key)
+    return base + ".txt", base + ".pdf"
+
+
+def _bump(name: str, amount: int = 1):
+    get_connection().execute(
+        "INSERT INTO result_cache_stats (name, value) VALUES (?, ?) "
+        "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+        (name, amount),
+    )
+
+
+def _copy(src: str, dst: str):
+    # Hard links are free; fall back to a copy across filesystems
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def lookup(cache_key: str):
+    """Return (markdown_path, pdf_path) for a fresh cached result, or None."""
+    conn = get_connection()
+    now = int(time.time())
+    row = conn.execute(
+        "SELECT created_at FROM result_cache WHERE cache_key = ?", (cache_key,)
+    ).fetchone()
+    md_path, pdf_path = _entry_paths(cache_key)
+    if (
+        row is None
+        or now - row["created_at"] > RESULT_CACHE_MAX_AGE_SECONDS
+        or not (os.path.exists(md_path) and os.path.exists(pdf_path))
+    ):
+        _bump("misses")
+        return None
+    conn.execute(
+        "UPDATE result_cache SET last_used = ?, hits = hits + 1 WHERE cache_key = ?",
+        (now, cache_key),
+    )
+    _bump("hits")
+    return md_path, pdf_path
+
+
+def restore(cache_key: str, task_id: str) -> bool:
+    """Materialise a cached result as outputs/{task_id}.txt and .pdf."""
+    entry = lookup(cache_key)
+    if entry is None:
+        return False
+    md_path, pdf_path = entry
+    _copy(md_path, os.path.join(OUTPUTS_DIR, f"{task_id}.txt"))
+    _copy(pdf_path, os.path.join(OUTPUTS_DIR, f"{task_id}.pdf"))
+    return True
+
+
+def store(cache_key: str, md_file: str, pdf_file: str):
+    """Add a finished run's markdown and PDF to the cache, then enforce the limits."""
+    os.makedirs(RESULT_CACHE_DIR, exist_ok=True)
+    md_path, pdf_path = _entry_paths(cache_key)
+    for src, dst in ((md_file, md_path), (pdf_file, pdf_path)):
+        tmp = f"{dst}.{os.getpid()}.tmp"
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+    now = int(time.time())
+    size = os.path.getsize(md_path) + os.path.getsize(pdf_path)
+    get_connection().execute(
+        "INSERT INTO result_cache (cache_key, created_at, last_used, size_bytes) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(cache_key) DO UPDATE SET created_at = excluded.created_at, "
+        "last_used = excluded.last_used, size_bytes = excluded.size_bytes",
+        (cache_key, now, now, size),
+    )
+    evict()
+
+
+def _remove(cache_key: str):
+    for path in _entry_paths(cache_key):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    get_connection().execute("DELETE FROM result_cache WHERE cache_key = ?", (cache_key,))
+
+
+def evict() -> int:
+    """Drop entries past the age limit, then least recently used ones until the size limits hold."""
+    conn = get_connection()
+    cutoff = int(time.time()) - RESULT_CACHE_MAX_AGE_SECONDS
+    removed = [r["cache_key"] for r in conn.execute(
+        "SELECT cache_key FROM result_cache WHERE created_at <= ?", (cutoff,)
+    )]
+    for key in removed:
+        _remove(key)
+
+    rows = conn.execute(
+        "SELECT cache_key, size_bytes FROM result_cache ORDER BY last_used DESC"
+    ).fetchall()
+    total_bytes = 0
+    for i, row in enumerate(rows):
+        total_bytes += row["size_bytes"]
+        if i >= RESULT_CACHE_MAX_ENTRIES or total_bytes > RESULT_CACHE_MAX_BYTES:
+            _remove(row["cache_key"])
+            removed.append(row["cache_key"])
+    if removed:
+        _bump("evictions", len(removed))
+    return len(removed)
+
+
+def cache_stats() -> dict:
+    conn = get_connection()
+    stats = {r["name"]: r["value"] for r in conn.execute("SELECT name, value FROM result_cache_stats")}
+    entries = conn.execute(
+        "SELECT COUNT(*) AS n, COALESCE(SUM(size_bytes), 0) AS b FROM result_cache"
+    ).fetchone()
+    hits, misses = stats.get("hits", 0), stats.get("misses", 0)
+    return {
+        "hits": hits,
+        "misses": misses,
+        "evictions": stats.get("evictions", 0),
+        "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        "entries": entries["n"],
+        "size_bytes": entries["b"],
+        "max_entries": RESULT_CACHE_MAX_ENTRIES,
+        "max_bytes": RESULT_CACHE_MAX_BYTES,
+        "max_age_seconds": RESULT_CACHE_MAX_AGE_SECONDS,
+    }
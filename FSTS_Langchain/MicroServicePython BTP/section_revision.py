@@ -0,0 +1,136 @@
+# section_revision.py
+# Section-scoped manager revisions: each point of the reviewer's feedback is
+# mapped to the document sections it refers to, only those sections are
+# rewritten (concurrently on the async path) and spliced back into the
+# previous output. Feedback that cannot be placed, or that touches most of the
+# document, falls back to the manager's full revision.
+import asyncio
+import logging
+import os
+import re
+from collections import defaultdict
+from convergence import ROUTE_DIRECTIVE, feedback_points
+from incremental import split_sections, HEADING_LINE
+from llm_backends import invoke_node, ainvoke_node
+from prompt_registry import get_prompt
+from task_registry import add_task_event
+import tracing
+
+SECTION_REVISIONS_ENABLED = os.getenv("FSTS_MANAGER_SECTION_REVISIONS", "1") == "1"
+SECTION_REVISION_PARALLELISM = int(os.getenv("FSTS_MANAGER_SECTION_PARALLELISM", 4))
+# Above this share of sections flagged, one full revision is cheaper and more coherent
+SECTION_REVISION_MAX_RATIO = float(os.getenv("FSTS_MANAGER_SECTION_MAX_RATIO", 0.5))
+
+HEADING_NUMBER = re.compile(r"^#{1,6}\s+((?:\d+\.)*\d+)\.?\s+(.*)")  # "## 3.2 Logic Flow" -> ("3.2", "Logic Flow")
+SECTION_REFERENCE = re.compile(r"\bsection\s+((?:\d+\.)*\d+)|\b(\d+\.\d+(?:\.\d+)*)\b", re.IGNORECASE)
+BRACKET_LABEL = re.compile(r"^\s*(?:[-*+•]|\d+[.)])?\s*\[([^\]]+)\]")  # "- [3.2 Logic Flow] ..."
+MIN_TITLE_CHARS = 4
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"[\W_]+", " ", text).strip().lower()
+
+
+def _heading(section: str):
+    """(number, normalized title) of a section's heading line, or None for text before the first heading."""
+    line = section.splitlines()[0] if section else ""
+    if not HEADING_LINE.match(line):
+        return None
+    numbered = HEADING_NUMBER.match(line)
+    if numbered:
+        return numbered.group(1), _normalize(numbered.group(2))
+    return None, _normalize(line.lstrip("#"))
+
+
+def locate(point: str, headings: list) -> set:
+    """Indices of the sections a feedback point refers to, by section number or heading title."""
+    label = BRACKET_LABEL.match(point)
+    text = label.group(1) if label else point
+    numbers = {a or b for a, b in SECTION_REFERENCE.findall(text)}
+    lowered = f" {_normalize(text)} "
+    found = set()
+    for index, heading in enumerate(headings):
+        if heading is None:
+            continue
+        number, title = heading
+        if number and number in numbers:
+            found.add(index)
+        elif len(title) >= MIN_TITLE_CHARS and f" {title} " in lowered:
+            found.add(index)
+    return found
+
+
+def plan_revision(document, feedback) -> dict:
+    """Map the feedback to sections; plan["mode"] is "sections" or "full" (with a reason)."""
+    sections = split_sections(ROUTE_DIRECTIVE.sub("", document if isinstance(document, str) else str(document)).rstrip() + "\n")
+    headings = [_heading(s) for s in sections]
+    flagged, unplaced = defaultdict(list), []
+    for point in feedback_points(feedback):
+        indices = locate(point, headings)
+        if not indices:
+            unplaced.append(point)
+        for index in indices:
+            flagged[index].append(point)
+    plan = {"sections_total": len(sections), "document_sections": sections, "flagged": dict(flagged), "mode": "full"}
+    if not SECTION_REVISIONS_ENABLED:
+        plan["reason"] = "disabled"
+    elif unplaced:
+        plan["reason"] = f"{len(unplaced)} feedback point(s) not tied to a section"
+    elif not flagged:
+        plan["reason"] = "no section flagged"
+    elif len(flagged) > SECTION_REVISION_MAX_RATIO * len(sections):
+        plan["reason"] = f"{len(flagged)} of {len(sections)} sections flagged"
+    else:
+        plan["mode"] = "sections"
+    return plan
+
+
+def record_plan(state, plan):
+    data = {
+        "mode": plan["mode"], "sections_revised": len(plan["flagged"]) if plan["mode"] == "sections" else None,
+        "sections_total": plan["sections_total"], "reason": plan.get("reason"),
+    }
+    tracing.event(logging.INFO, "manager_revision", task=state.get("task_id"), **data)
+    if state.get("task_id"):
+        add_task_event(state["task_id"], "manager_revision", data)
+
+
+def _messages(plan, index):
+    sections = plan["document_sections"]
+    outline = "\n".join(s.splitlines()[0] for s in sections if HEADING_LINE.match(s))
+    return get_prompt("manager_section_reviser").chat_prompt.format_messages(
+        document_outline=outline,
+        section_feedback="\n".join(plan["flagged"][index]),
+        section_text=sections[index],
+    )
+
+
+def _revised_section(original: str, content) -> str:
+    revised = ROUTE_DIRECTIVE.sub("", content if isinstance(content, str) else str(content)).strip("\n")
+    # Keep the section boundary: the original's trailing blank lines separate it from the next heading
+    return revised + original[len(original.rstrip("\n")):]
+
+
+def _splice(plan, revised: dict) -> str:
+    return "".join(revised.get(i, s) for i, s in enumerate(plan["document_sections"]))
+
+
+def revise_sections(state, plan) -> str:
+    """Rewrite the flagged sections one after another and return the spliced document."""
+    revised = {}
+    for index in plan["flagged"]:
+        response = invoke_node("manager_agent", _messages(plan, index), state)
+        revised[index] = _revised_section(plan["document_sections"][index], response.content)
+    return _splice(plan, revised)
+
+
+async def arevise_sections(state, plan) -> str:
+    """Rewrite the flagged sections concurrently and return the spliced document."""
+    semaphore = asyncio.Semaphore(max(1, SECTION_REVISION_PARALLELISM))
+
+    async def revise(index):
+        async with semaphore:
+            response = await ainvoke_node("manager_agent", _messages(plan, index), state)
+        return index, _revised_section(plan["document_sections"][index], response.content)
+
+    return _splice(plan, dict(await asyncio.gather(*(revise(i) for i in plan["flagged"]))))
@@ -0,0 +1,275 @@
+# task_registry.py
+import glob
+import json
+import os
+import sqlite3
+import threading
+import time
+
+OUTPUTS_DIR = "outputs"
+REGISTRY_DB = os.path.join(OUTPUTS_DIR, "task_registry.db")
+LEGACY_REGISTRY = os.path.join(OUTPUTS_DIR, "task_registry.txt")
+
+TASK_EXPIRE_SECONDS = int(os.getenv("FSTS_TASK_EXPIRE_SECONDS", 3600 * 48))
+SWEEP_INTERVAL_SECONDS = int(os.getenv("FSTS_SWEEP_INTERVAL_SECONDS", 600))
+
+_local = threading.local()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id    TEXT PRIMARY KEY,
+    created_at INTEGER NOT NULL,
+    updated_at INTEGER NOT NULL,
+    status     TEXT NOT NULL,
+    token_usage TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks(created_at);
+CREATE TABLE IF NOT EXISTS task_events (
+    event_id   INTEGER PRIMARY KEY AUTOINCREMENT,
+    task_id    TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    event      TEXT NOT NULL,
+    data       TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_task_events_task ON task_events(task_id, event_id);
+CREATE TABLE IF NOT EXISTS batches (
+    batch_id    TEXT PRIMARY KEY,
+    created_at  INTEGER NOT NULL,
+    name        TEXT,
+    template_id TEXT
+);
+CREATE TABLE IF NOT EXISTS batch_tasks (
+    batch_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    program  TEXT NOT NULL,
+    task_id  TEXT NOT NULL,
+    PRIMARY KEY (batch_id, position)
+);
+"""
+
+
+def get_connection():
+    """
+    Return this thread's connection to the registry database.
+    sqlite3 connections cannot be shared between threads, so each worker thread
+    (and each uvicorn worker process) opens its own; WAL mode lets readers poll
+    while another connection writes.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        os.makedirs(OUTPUTS_DIR, exist_ok=True)
+        conn = sqlite3.connect(REGISTRY_DB, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        _add_missing_columns(conn)
+        _local.conn = conn
+    return conn
+
+
+def _add_missing_columns(conn):
+    """Upgrade a registry created before the token_usage column existed."""
+    columns = {r["name"] for r in conn.execute("PRAGMA table_info(tasks)")}
+    if "token_usage" not in columns:
+        try:
+            conn.execute("ALTER TABLE tasks ADD COLUMN token_usage TEXT")
+        except sqlite3.OperationalError:
+            pass  # added concurrently by another worker
+
+
+def init_registry():
+    """Create the schema and import any tasks left in the legacy text registry."""
+    get_connection()
+    return migrate_legacy_registry()
+
+
+def migrate_legacy_registry(path: str = LEGACY_REGISTRY) -> int:
+    """
+    Import 'task_id,timestamp,status' lines from the old task_registry.txt.
+    The file is renamed to *.migrated afterwards so the import runs only once.
+    Every worker process runs this at startup: one that finds the file gone
+    at any point treats it as migrated by another (the insert is idempotent).
+    """
+    rows = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                parts = line.strip().split(",")
+                if len(parts) != 3:
+                    continue
+                tid, tstamp, status = parts
+                try:
+                    tstamp = int(tstamp)
+                except ValueError:
+                    continue
+                rows.append((tid, tstamp, tstamp, status))
+    except FileNotFoundError:
+        return 0
+    conn = get_connection()
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO tasks (task_id, created_at, updated_at, status) VALUES (?, ?, ?, ?)",
+            rows,
+        )
+    try:
+        os.replace(path, path + ".migrated")
+    except FileNotFoundError:
+        return 0
+    print(f"[registry] Migrated {len(rows)} task(s) from {path}")
+    return len(rows)
+
+
+def register_task(task_id: str, status: str = "Processing"):
+    """Add a task with status 'Processing'."""
+    now = int(time.time())
+    conn = get_connection()
+    conn.execute(
+        "INSERT INTO tasks (task_id, created_at, updated_at, status) VALUES (?, ?, ?, ?)",
+        (task_id, now, now, status),
+    )
+
+
+def set_task_status(task_id: str, status: str, expected=None) -> bool:
+    """
+    Update the status of a task in the registry.
+    If `expected` is given (a status or list of statuses) the update only applies
+    while the task is still in one of them, so concurrent writers cannot clobber
+    each other. Returns True if the row was updated.
+    """
+    sql = "UPDATE tasks SET status = ?, updated_at = ? WHERE task_id = ?"
+    params = [status, int(time.time()), task_id]
+    if expected is not None:
+        expected = [expected] if isinstance(expected, str) else list(expected)
+        sql += f" AND status IN ({','.join('?' * len(expected))})"
+        params.extend(expected)
+    cur = get_connection().execute(sql, params)
+    return cur.rowcount == 1
+
+
+def get_task_status_value(task_id: str):
+    """Return the status of a task (Processing / Completed / Failed) or None."""
+    cutoff = int(time.time()) - TASK_EXPIRE_SECONDS
+    row = get_connection().execute(
+        "SELECT status FROM tasks WHERE task_id = ? AND created_at > ?", (task_id, cutoff)
+    ).fetchone()
+    return row["status"] if row else None
+
+
+def set_task_usage(task_id: str, usage: dict):
+    """Store the token ledger summary of a finished run with its task."""
+    get_connection().execute(
+        "UPDATE tasks SET token_usage = ? WHERE task_id = ?", (json.dumps(usage), task_id)
+    )
+
+
+def get_task_usage(task_id: str):
+    """Return the stored token usage of a task, {} if none was recorded, or None if unknown."""
+    cutoff = int(time.time()) - TASK_EXPIRE_SECONDS
+    row = get_connection().execute(
+        "SELECT token_usage FROM tasks WHERE task_id = ? AND created_at > ?", (task_id, cutoff)
+    ).fetchone()
+    if row is None:
+        return None
+    return json.loads(row["token_usage"]) if row["token_usage"] else {}
+
+
+def count_tasks_by_status() -> dict:
+    """Live (unexpired) tasks per status, across all workers."""
+    cutoff = int(time.time()) - TASK_EXPIRE_SECONDS
+    rows = get_connection().execute(
+        "SELECT status, COUNT(*) AS n FROM tasks WHERE created_at > ? GROUP BY status", (cutoff,)
+    ).fetchall()
+    return {r["status"]: r["n"] for r in rows}
+
+
+def is_task_registered(task_id: str) -> bool:
+    return get_task_status_value(task_id) is not None
+
+
+def add_task_event(task_id: str, event: str, data: dict):
+    """Append a progress event; event ids increase, so readers can resume after the last one seen."""
+    get_connection().execute(
+        "INSERT INTO task_events (task_id, created_at, event, data) VALUES (?, ?, ?, ?)",
+        (task_id, time.time(), event, json.dumps(data, default=str)),
+    )
+
+
+def get_task_events(task_id: str, after_id: int = 0) -> list:
+    rows = get_connection().execute(
+        "SELECT event_id, created_at, event, data FROM task_events "
+        "WHERE task_id = ? AND event_id > ? ORDER BY event_id",
+        (task_id, after_id),
+    ).fetchall()
+    return [
+        {"id": r["event_id"], "time": r["created_at"], "event": r["event"], "data": json.loads(r["data"])}
+        for r in rows
+    ]
+
+
+def register_batch(batch_id: str, name, template_id, programs: list):
+    """Record a batch and its (program, task_id) pairs; the tasks are registered separately."""
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "INSERT INTO batches (batch_id, created_at, name, template_id) VALUES (?, ?, ?, ?)",
+            (batch_id, int(time.time()), name, template_id),
+        )
+        conn.executemany(
+            "INSERT INTO batch_tasks (batch_id, position, program, task_id) VALUES (?, ?, ?, ?)",
+            [(batch_id, i, program, task_id) for i, (program, task_id) in enumerate(programs)],
+        )
+
+
+def get_batch(batch_id: str):
+    """Return the batch with each program's task status, or None if unknown or expired."""
+    conn = get_connection()
+    cutoff = int(time.time()) - TASK_EXPIRE_SECONDS
+    batch = conn.execute(
+        "SELECT batch_id, created_at, name, template_id FROM batches WHERE batch_id = ? AND created_at > ?",
+        (batch_id, cutoff),
+    ).fetchone()
+    if batch is None:
+        return None
+    rows = conn.execute(
+        "SELECT b.program, b.task_id, t.status FROM batch_tasks b "
+        "LEFT JOIN tasks t ON t.task_id = b.task_id WHERE b.batch_id = ? ORDER BY b.position",
+        (batch_id,),
+    ).fetchall()
+    return {
+        **dict(batch),
+        "programs": [{"program": r["program"], "task_id": r["task_id"], "status": r["status"] or "Expired"} for r in rows],
+    }
+
+
+def sweep_expired(now=None) -> int:
+    """Delete expired tasks and their output files. Returns the number removed."""
+    now = int(now if now is not None else time.time())
+    cutoff = now - TASK_EXPIRE_SECONDS
+    conn = get_connection()
+    expired = [r["task_id"] for r in conn.execute(
+        "SELECT task_id FROM tasks WHERE created_at <= ?", (cutoff,)
+    )]
+    for tid in expired:
+        # Clean up expired files
+        for path in glob.glob(os.path.join(OUTPUTS_DIR, f"{glob.escape(tid)}.*")):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        conn.execute("DELETE FROM task_events WHERE task_id = ?", (tid,))
+        conn.execute("DELETE FROM tasks WHERE task_id = ?", (tid,))
+    expired_batches = [r["batch_id"] for r in conn.execute(
+        "SELECT batch_id FROM batches WHERE created_at <= ?", (cutoff,)
+    )]
+    for bid in expired_batches:
+        for path in glob.glob(os.path.join(OUTPUTS_DIR, f"{glob.escape(bid)}.*")):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        conn.execute("DELETE FROM batch_tasks WHERE batch_id = ?", (bid,))
+        conn.execute("DELETE FROM batches WHERE batch_id = ?", (bid,))
+    if expired:
+        print(f"[registry] Swept {len(expired)} expired task(s)")
+    return len(expired)
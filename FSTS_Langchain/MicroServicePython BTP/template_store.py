@@ -0,0 +1,145 @@
+# template_store.py
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import PyPDF2
+
+TEMPLATES_DIR = os.getenv("FSTS_TEMPLATES_DIR", "templates")
+# PDFs with at least this many pages are extracted in parallel worker processes
+PARALLEL_EXTRACT_MIN_PAGES = int(os.getenv("FSTS_TEMPLATE_PARALLEL_MIN_PAGES", 24))
+EXTRACT_WORKERS = int(os.getenv("FSTS_TEMPLATE_EXTRACT_WORKERS", min(4, os.cpu_count() or 1)))
+
+TEMPLATE_ID = re.compile(r"^[0-9a-f]{32}$")  # see template_id_for
+
+_text_cache = {}  # template_id -> extracted text
+_file_ids = {}    # (path, mtime, size) -> template_id
+_lock = threading.Lock()
+
+
+def template_id_for(pdf_bytes: bytes) -> str:
+    """Templates are addressed by content, so re-uploading the same PDF is free."""
+    return hashlib.sha256(pdf_bytes).hexdigest()[:32]
+
+
+def is_valid_template_id(template_id) -> bool:
+    return isinstance(template_id, str) and TEMPLATE_ID.match(template_id) is not None
+
+
+def _paths(template_id: str):
+    # Ids go into file paths: anything but a content hash could point outside TEMPLATES_DIR
+    if not is_valid_template_id(template_id):
+        raise ValueError(f"Invalid template_id '{template_id}'")
+    base = os.path.join(TEMPLATES_DIR, template_id)
+    return base + ".pdf", base + ".txt", base + ".json"
+
+
+def _extract_page_range(path: str, start: int, stop: int) -> str:
+    with open(path, "rb") as f:
+        reader = PyPDF2.PdfReader(f)
+        return "".join(reader.pages[i].extract_text() for i in range(start, stop))
+
+
+def extract_pdf_text(path: str):
+    """Return (text, page_count); large PDFs are split into page ranges across processes."""
+    with open(path, "rb") as f:
+        page_count = len(PyPDF2.PdfReader(f).pages)
+    if page_count < PARALLEL_EXTRACT_MIN_PAGES or EXTRACT_WORKERS < 2:
+        return _extract_page_range(path, 0, page_count), page_count
+
+    step = -(-page_count // EXTRACT_WORKERS)
+    ranges = [(i, min(i + step, page_count)) for i in range(0, page_count, step)]
+    with ProcessPoolExecutor(max_workers=len(ranges)) as pool:
+        parts = pool.map(_extract_page_range, [path] * len(ranges), *zip(*ranges))
+        return "".join(parts), page_count
+
+
+def _write_atomic(path: str, data: bytes):
+    # Per-writer temp name: the same PDF may be uploaded twice at once
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def ingest_template(pdf_bytes: bytes, name: str = None) -> dict:
+    """
+    Store a template PDF and its extracted text under templates/{template_id}.*
+    Extraction happens once per content hash; later runs only read the .txt.
+    """
+    template_id = template_id_for(pdf_bytes)
+    pdf_path, txt_path, meta_path = _paths(template_id)
+    if os.path.exists(txt_path) and os.path.exists(meta_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    os.makedirs(TEMPLATES_DIR, exist_ok=True)
+    _write_atomic(pdf_path, pdf_bytes)
+
+    text, page_count = extract_pdf_text(pdf_path)
+    _write_atomic(txt_path, text.encode("utf-8"))
+
+    meta = {
+        "template_id": template_id,
+        "name": name or template_id,
+        "pages": page_count,
+        "chars": len(text),
+        "created_at": int(time.time()),
+    }
+    _write_atomic(meta_path, json.dumps(meta).encode("utf-8"))
+    with _lock:
+        _text_cache[template_id] = text
+    return meta
+
+
+def template_exists(template_id: str) -> bool:
+    return is_valid_template_id(template_id) and os.path.exists(_paths(template_id)[1])
+
+
+def get_template_text(template_id: str) -> str:
+    """Extracted text of a stored template; raises KeyError for unknown ids."""
+    with _lock:
+        if template_id in _text_cache:
+            return _text_cache[template_id]
+    pdf_path, txt_path, _ = _paths(template_id)
+    if not os.path.exists(txt_path):
+        if not os.path.exists(pdf_path):
+            raise KeyError(f"Unknown template '{template_id}'")
+        with open(pdf_path, "rb") as f:
+            ingest_template(f.read())
+    with open(txt_path, "r", encoding="utf-8") as f:
+        text = f.read()
+    with _lock:
+        _text_cache[template_id] = text
+    return text
+
+
+def ingest_template_file(path: str, name: str = None) -> str:
+    """
+    template_id of a PDF on disk, ingesting it on first sight.
+    Keyed by (path, mtime, size) so an unchanged file is not even re-hashed.
+    """
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_mtime_ns, st.st_size)
+    with _lock:
+        if key in _file_ids:
+            return _file_ids[key]
+    with open(path, "rb") as f:
+        meta = ingest_template(f.read(), name=name or os.path.basename(path))
+    with _lock:
+        _file_ids[key] = meta["template_id"]
+    return meta["template_id"]
+
+
+def list_templates() -> list:
+    if not os.path.isdir(TEMPLATES_DIR):
+        return []
+    templates = []
+    for entry in sorted(os.listdir(TEMPLATES_DIR)):
+        if entry.endswith(".json"):
+            with open(os.path.join(TEMPLATES_DIR, entry), "r", encoding="utf-8") as f:
+                templates.append(json.load(f))
+    return templates
@@ -0,0 +1,19 @@
+# conftest.py
+# Unit tests run against the service modules directly, in a scratch working
+# directory so the registry database and outputs/ never touch the real ones.
+import os
+import sys
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+os.environ.setdefault("FSTS_LLM_CACHE_ENABLED", "0")
+
+import pytest
+
+
+@pytest.fixture(scope="session", autouse=True)
+def scratch_dir(tmp_path_factory):
+    previous = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("service"))
+    yield
+    os.chdir(previous)
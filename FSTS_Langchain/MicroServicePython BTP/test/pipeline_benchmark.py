@@ -0,0 +1,283 @@
+"""
+Offline end-to-end benchmark of the FSTS workflow.
+
+Runs build_workflow() (or build_parallel_workflow() with --parallel) over the
+programs in test/code_files_unused with a deterministic local chat model
+instead of Gemini, so no API quota is used. Reports per node:
+  - wall time and CPU time
+  - peak Python memory (tracemalloc; disable with --no-memory for timing-only runs)
+  - model calls, prompt characters and estimated prompt/response tokens
+plus the PDF render time of the final document.
+
+Run from the service directory:
+    python test/pipeline_benchmark.py [--runs 3] [--latency 0.0] [--output-tokens 800]
+                                      [--json bench.json] [--compare old.json]
+
+Results are medians over the runs. With --compare, the node and total wall
+times are printed next to those of an earlier --json file. With --parallel,
+concurrent nodes overlap, so their CPU and memory figures include each other.
+"""
+import argparse
+import contextvars
+import hashlib
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+try:
+    import resource  # not available on Windows
+except ImportError:
+    resource = None
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS_DIR = os.path.join(SERVICE_DIR, "test", "code_files_unused")
+sys.path.insert(0, SERVICE_DIR)
+os.chdir(SERVICE_DIR)
+os.environ.setdefault("FSTS_LOG_LEVEL", "WARNING")  # keep span lines out of the report
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+import llm_cache
+import main
+import utils
+import workflow_graph
+
+# Used when the service directory has no template.pdf
+FALLBACK_TEMPLATE = """Functional and Technical Specification
+1. Document Control
+2. Overview and Business Purpose
+3. Selection Screen
+4. Processing Logic
+5. Data Sources and Tables
+6. Output and Reports
+7. Error Handling
+8. Technical Objects
+"""
+
+_current_node = contextvars.ContextVar("benchmark_node", default=None)
+_calls = defaultdict(list)  # node -> [{"prompt_chars", "input_tokens", "output_tokens"}]
+
+
+class BenchmarkChatModel(BaseChatModel):
+    """Deterministic stand-in for Gemini: fixed latency, response derived from the prompt digest."""
+    latency_s: float = 0.0
+    output_tokens: int = 800
+    chars_per_token: float = 4.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "benchmark"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"model": "benchmark", "output_tokens": self.output_tokens}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        prompt_chars = sum(len(m.content) if isinstance(m.content, str) else len(str(m.content)) for m in messages)
+        digest = hashlib.sha1("".join(str(m.content) for m in messages).encode()).hexdigest()[:12]
+        target_chars = int(self.output_tokens * self.chars_per_token)
+        lines = ["# Specification", "", f"## 1. Overview ({digest})", ""]
+        section = 2
+        while sum(len(line) + 1 for line in lines) < target_chars:
+            lines += [f"## {section}. Section {section}", "", f"Generated text for section {section} of {digest}. " * 4, ""]
+            section += 1
+        lines.append("[ROUTE: final_output]")
+        content = "\n".join(lines)
+        input_tokens = int(prompt_chars / self.chars_per_token)
+        output_tokens = int(len(content) / self.chars_per_token)
+        _calls[_current_node.get()].append(
+            {"prompt_chars": prompt_chars, "input_tokens": input_tokens, "output_tokens": output_tokens}
+        )
+        message = AIMessage(content, usage_metadata={
+            "input_tokens": input_tokens, "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def load_corpus(only=None) -> dict:
+    """program -> source; each folder's files are joined in name order (main report + includes)."""
+    programs = {}
+    for name in sorted(os.listdir(CORPUS_DIR)):
+        folder = os.path.join(CORPUS_DIR, name)
+        if not os.path.isdir(folder) or (only and name not in only):
+            continue
+        parts = []
+        for file_name in sorted(os.listdir(folder)):
+            with open(os.path.join(folder, file_name), "r", encoding="utf-8", errors="replace") as f:
+                parts.append(f.read())
+        programs[name] = "\n".join(parts)
+    return programs
+
+
+def load_template() -> str:
+    if os.path.exists(os.path.join(SERVICE_DIR, "template.pdf")):
+        return main.data_processor.read_template_pdf()
+    return FALLBACK_TEMPLATE
+
+
+def measured(fn, name, samples, track_memory):
+    """Wrap a sync node so each run appends wall, CPU and peak-memory figures to samples[name]."""
+    def wrapped(state):
+        token = _current_node.set(name)
+        if track_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            return fn(state)
+        finally:
+            sample = {"wall_s": time.perf_counter() - wall, "cpu_s": time.process_time() - cpu}
+            if track_memory:
+                sample["peak_mem_mb"] = (tracemalloc.get_traced_memory()[1] - base) / 2**20
+            samples[name].append(sample)
+            _current_node.reset(token)
+    return wrapped
+
+
+def run_program(code, template, model, parallel, track_memory, render_pdf, out_dir):
+    """One workflow run; returns {node: [samples]}, total wall time and PDF render time."""
+    samples = defaultdict(list)
+    original = dict(workflow_graph.AGENT_NODES)
+    try:
+        for name, (sync_fn, async_fn) in original.items():
+            workflow_graph.AGENT_NODES[name] = (measured(sync_fn, name, samples, track_memory), async_fn)
+        graph = (workflow_graph.build_parallel_workflow() if parallel else workflow_graph.build_workflow()).compile()
+    finally:
+        workflow_graph.AGENT_NODES.update(original)
+
+    _calls.clear()
+    state = main.build_initial_state(code, template, task_id=None, model=model)
+    started = time.perf_counter()
+    result = graph.invoke(state)
+    total_s = time.perf_counter() - started
+
+    pdf = {"render_s": None, "error": None}
+    if render_pdf:
+        md_path = os.path.join(out_dir, "benchmark.txt")
+        with open(md_path, "w", encoding="utf-8") as f:
+            f.write(main.generate_final_messages(result))
+        t = time.perf_counter()
+        try:
+            utils.process_markdown(md_path)
+            pdf["render_s"] = time.perf_counter() - t
+        except Exception as e:  # e.g. WeasyPrint system libraries missing
+            pdf["error"] = f"{type(e).__name__}: {str(e)[:80]}"
+    return samples, {node: list(calls) for node, calls in _calls.items()}, total_s, pdf
+
+
+def _median(values):
+    values = [v for v in values if v is not None]
+    return round(statistics.median(values), 4) if values else None
+
+
+def summarize(runs) -> dict:
+    """Median per node over runs; a node that runs twice in one run (manager) is summed per run."""
+    nodes = {}
+    for name in dict.fromkeys(n for run in runs for n in run["nodes"]):
+        per_run = [run["nodes"].get(name, []) for run in runs]
+        calls = [run["calls"].get(name, []) for run in runs]
+        nodes[name] = {
+            "executions": _median([len(s) for s in per_run]),
+            "wall_s": _median([sum(x["wall_s"] for x in s) for s in per_run]),
+            "cpu_s": _median([sum(x["cpu_s"] for x in s) for s in per_run]),
+            "peak_mem_mb": _median([max((x.get("peak_mem_mb", 0) for x in s), default=0) for s in per_run])
+            if any("peak_mem_mb" in x for s in per_run for x in s) else None,
+            "llm_calls": _median([len(c) for c in calls]),
+            "prompt_chars": _median([sum(x["prompt_chars"] for x in c) for c in calls]),
+            "input_tokens": _median([sum(x["input_tokens"] for x in c) for c in calls]),
+            "output_tokens": _median([sum(x["output_tokens"] for x in c) for c in calls]),
+        }
+    return {
+        "total_wall_s": _median([run["total_s"] for run in runs]),
+        "pdf_render_s": _median([run["pdf"]["render_s"] for run in runs]),
+        "pdf_error": next((run["pdf"]["error"] for run in runs if run["pdf"]["error"]), None),
+        "nodes": nodes,
+    }
+
+
+def print_report(results, baseline=None):
+    for program, summary in results["programs"].items():
+        old = (baseline or {}).get("programs", {}).get(program)
+        print(f"\n{program}  total {summary['total_wall_s']:.3f}s"
+              + (f"  (was {old['total_wall_s']:.3f}s)" if old else "")
+              + (f"  pdf {summary['pdf_render_s']:.3f}s" if summary["pdf_render_s"] is not None
+                 else f"  pdf n/a ({summary['pdf_error'] or 'skipped'})"))
+        print(f"  {'node':<26}{'wall s':>9}{'cpu s':>9}{'mem MB':>9}{'calls':>7}{'prompt ch':>11}{'in tok':>9}{'out tok':>9}"
+              + (f"{'was wall s':>12}" if old else ""))
+        for name, n in summary["nodes"].items():
+            mem = f"{n['peak_mem_mb']:9.1f}" if n["peak_mem_mb"] is not None else f"{'-':>9}"
+            was = ""
+            if old and name in old["nodes"]:
+                was = f"{old['nodes'][name]['wall_s']:12.4f}"
+            print(f"  {name:<26}{n['wall_s']:9.4f}{n['cpu_s']:9.4f}{mem}{n['llm_calls']:7.0f}"
+                  f"{n['prompt_chars']:11.0f}{n['input_tokens']:9.0f}{n['output_tokens']:9.0f}{was}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--programs", nargs="*", help="subset of test/code_files_unused folders")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the fake model waits per call")
+    parser.add_argument("--output-tokens", type=int, default=800, help="approximate tokens per fake response")
+    parser.add_argument("--parallel", action="store_true", help="benchmark build_parallel_workflow()")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc (it slows the run)")
+    parser.add_argument("--no-pdf", action="store_true", help="skip the PDF render")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="earlier --json results to compare against")
+    args = parser.parse_args()
+
+    llm_cache.set_llm_cache(None)  # every run must reach the model
+    model = BenchmarkChatModel(latency_s=args.latency, output_tokens=args.output_tokens)
+    template = load_template()
+    programs = load_corpus(args.programs)
+    out_dir = os.path.join(SERVICE_DIR, "outputs", "benchmark")
+    os.makedirs(out_dir, exist_ok=True)
+
+    if not args.no_memory:
+        tracemalloc.start()
+    results = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "settings": {
+            "runs": args.runs, "latency_s": args.latency, "output_tokens": args.output_tokens,
+            "parallel": args.parallel, "track_memory": not args.no_memory,
+            "template": "template.pdf" if template is not FALLBACK_TEMPLATE else "fallback outline",
+        },
+        "programs": {},
+    }
+    for program, code in programs.items():
+        runs = []
+        for _ in range(args.runs):
+            samples, calls, total_s, pdf = run_program(
+                code, template, model, args.parallel, not args.no_memory, not args.no_pdf, out_dir
+            )
+            runs.append({"nodes": samples, "calls": calls, "total_s": total_s, "pdf": pdf})
+        results["programs"][program] = {"source_chars": len(code), **summarize(runs)}
+    if resource is not None:
+        # ru_maxrss is in KB on Linux (bytes on macOS)
+        results["max_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    if "max_rss_mb" in results:
+        print(f"\nmax RSS {results['max_rss_mb']} MB")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main_cli()
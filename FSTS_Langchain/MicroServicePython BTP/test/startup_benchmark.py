@@ -0,0 +1,103 @@
+"""
+Startup benchmark for the FSTS microservice.
+
+Measures, each in a fresh interpreter:
+  - import time of api_server and main
+  - time from launching uvicorn until GET /health answers 200
+
+Run from the service directory:
+    python test/startup_benchmark.py [--runs 3] [--json startup.json]
+
+Exits with status 1 if a median exceeds its budget (see README "Startup budget").
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Budgets in seconds (override with env vars of the same name)
+BUDGETS = {
+    "import_api_server": float(os.getenv("FSTS_BUDGET_IMPORT_API_SERVER", 1.0)),
+    "import_main": float(os.getenv("FSTS_BUDGET_IMPORT_MAIN", 2.5)),
+    "first_healthy_response": float(os.getenv("FSTS_BUDGET_FIRST_HEALTHY", 3.0)),
+}
+
+
+def measure_import(module: str) -> float:
+    code = (
+        "import time; t = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - t)"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=SERVICE_DIR, capture_output=True, text=True, check=True
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_first_healthy(timeout: float = 60.0) -> float:
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/health"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api_server:app", "--port", str(port), "--log-level", "warning"],
+        cwd=SERVICE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {proc.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as resp:
+                    if resp.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.02)
+        raise TimeoutError(f"/health did not answer within {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    samples = {name: [] for name in BUDGETS}
+    for _ in range(args.runs):
+        samples["import_api_server"].append(measure_import("api_server"))
+        samples["import_main"].append(measure_import("main"))
+        samples["first_healthy_response"].append(measure_first_healthy())
+
+    results = {}
+    over_budget = False
+    for name, values in samples.items():
+        median = statistics.median(values)
+        ok = median <= BUDGETS[name]
+        over_budget |= not ok
+        results[name] = {"median_s": round(median, 3), "samples_s": [round(v, 3) for v in values],
+                         "budget_s": BUDGETS[name], "within_budget": ok}
+        print(f"{name:<24} median {median:6.3f}s  budget {BUDGETS[name]:.1f}s  {'OK' if ok else 'OVER'}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == "__main__":
+    main()
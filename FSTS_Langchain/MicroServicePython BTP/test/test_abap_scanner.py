@@ -0,0 +1,95 @@
+import abap_scanner
+from abap_scanner import scan_abap, split_statements, strip_comments
+
+PROGRAM = """REPORT zfi_docs.
+TABLES bkpf.
+DATA: BEGIN OF gt_docs OCCURS 0,
+        belnr TYPE belnr_d,
+        gjahr TYPE gjahr,
+      END OF gt_docs.
+DATA: gt_items TYPE STANDARD TABLE OF bseg,
+      gv_total TYPE p DECIMALS 2.
+PARAMETERS p_bukrs TYPE bukrs OBLIGATORY.
+
+START-OF-SELECTION.
+  PERFORM get_data.
+
+FORM get_data.
+  SELECT belnr gjahr FROM bkpf INTO TABLE gt_docs WHERE bukrs = p_bukrs.
+  SELECT * FROM bseg INTO TABLE gt_items
+    FOR ALL ENTRIES IN gt_docs
+    WHERE belnr = gt_docs-belnr AND gjahr = gt_docs-gjahr.
+  MODIFY gt_items FROM gs_item INDEX 1.
+  UPDATE gt_docs.
+  DELETE gt_items WHERE buzei = '001'.
+  UPDATE zfi_log SET status = 'X' WHERE bukrs = p_bukrs.
+ENDFORM.
+"""
+
+
+def test_chained_data_statement_is_expanded():
+    assert split_statements("DATA: a TYPE i, b TYPE c LENGTH 10.\nWRITE a.") == [
+        "DATA a TYPE i", "DATA b TYPE c LENGTH 10", "WRITE a",
+    ]
+
+
+def test_periods_commas_and_colons_inside_literals_do_not_split():
+    statements = split_statements(
+        "WRITE: 'Total: 1.5, net.', gv_total.\n"
+        "lv_text = |Amount { lv_amt }. Done, really.|.\n"
+        "lv_path = `C:\\tmp\\a. b`.\n"
+    )
+    assert statements == [
+        "WRITE 'Total: 1.5, net.'",
+        "WRITE gv_total",
+        "lv_text = |Amount { lv_amt }. Done, really.|",
+        "lv_path = `C:\\tmp\\a. b`",
+    ]
+
+
+def test_period_not_followed_by_blank_is_not_a_statement_end():
+    assert split_statements("lv_x = 1.5.\nWRITE lv_x.") == ["lv_x = 1.5", "WRITE lv_x"]
+
+
+def test_strip_comments_keeps_double_quotes_inside_literals():
+    code = (
+        "* full-line comment\n"
+        "WRITE 'say \"hi\"'.   \" trailing comment\n"
+        "lv_s = |quote \" inside|. \" another\n"
+        "\n"
+        "MOVE    a    TO    b.\n"
+    )
+    assert strip_comments(code) == "WRITE 'say \"hi\"'.\nlv_s = |quote \" inside|.\nMOVE a TO b."
+
+
+def test_select_for_all_entries():
+    access = scan_abap(PROGRAM)["db_access"]
+    assert access["bseg"]["for_all_entries"] is True
+    assert access["bseg"]["read"] == ["get_data"]
+    assert access["bkpf"]["for_all_entries"] is False
+    assert access["bkpf"]["fields"] == ["belnr gjahr"]
+
+
+def test_writes_to_internal_tables_are_not_database_access():
+    access = scan_abap(PROGRAM)["db_access"]
+    assert "gt_items" not in access and "gt_docs" not in access
+    assert access["zfi_log"]["write"] == ["get_data (UPDATE)"]
+
+
+def test_data_begin_of_occurs_is_an_internal_table():
+    structure = scan_abap(PROGRAM)
+    tables = {t["name"]: t for t in structure["internal_tables"]}
+    assert tables["gt_docs"] == {"name": "gt_docs", "kind": "STANDARD", "row_type": "gt_docs", "routine": "global"}
+    assert tables["gt_items"]["row_type"] == "bseg"
+    assert structure["local_types"]["gt_docs"] == ["belnr TYPE belnr_d", "gjahr TYPE gjahr"]
+
+
+def test_structure_summary_and_analysis_inputs(monkeypatch):
+    structure = scan_abap(PROGRAM)
+    assert structure["program"] == "zfi_docs"
+    assert structure["calls"]["START-OF-SELECTION"]["perform"] == ["get_data"]
+    assert [p["name"] for p in structure["selection_screen"]] == ["p_bukrs"]
+    inputs = abap_scanner.prepare_analysis_inputs(PROGRAM)
+    assert "BSEG" in inputs["abap_structure"].upper()
+    monkeypatch.setattr(abap_scanner, "ABAP_PREPARSE_ENABLED", False)
+    assert abap_scanner.prepare_analysis_inputs(PROGRAM)["analysis_code"] == PROGRAM
@@ -0,0 +1,35 @@
+import os
+import threading
+import zipfile
+import batch
+
+
+def run_together(fn, count=8):
+    barrier, errors = threading.Barrier(count), []
+
+    def worker():
+        barrier.wait()
+        try:
+            fn()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return errors
+
+
+def test_concurrent_archive_builds_of_one_batch(tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "OUTPUTS_DIR", str(tmp_path))
+    programs = []
+    for i in range(4):
+        (tmp_path / f"task{i}.pdf").write_bytes(os.urandom(500_000))
+        programs.append({"program": f"zprog{i}", "task_id": f"task{i}", "status": "Completed"})
+    summary = {"batch_id": "b1", "name": "nightly", "status": "Completed", "counts": {"Completed": 4}, "programs": programs}
+    assert run_together(lambda: batch.build_archive(summary)) == []
+    with zipfile.ZipFile(batch.archive_path("b1")) as zf:
+        assert sorted(zf.namelist()) == ["manifest.json"] + [f"zprog{i}.pdf" for i in range(4)]
+    assert not list(tmp_path.glob("*.tmp"))
@@ -0,0 +1,115 @@
+import asyncio
+import base64
+import uuid
+from collections import Counter
+import pytest
+from langgraph.checkpoint.base import empty_checkpoint
+import agents
+import checkpoint_saver
+import checkpoints
+import llm_backends
+import main
+import section_revision
+import task_registry
+
+CODE = base64.b64encode(b"REPORT zresume.\nSTART-OF-SELECTION.\n  PERFORM run.\nFORM run.\n  WRITE 'x'.\nENDFORM.\n").decode()
+
+
+@pytest.fixture(autouse=True)
+def registry():
+    task_registry.init_registry()
+    checkpoints.init_checkpoints()
+
+
+@pytest.fixture
+def fake_nodes(monkeypatch):
+    """Fake backend for every node; nodes listed in `failing` raise instead."""
+    monkeypatch.setattr(llm_backends, "DEFAULT_MODEL", "fake:fake")
+    monkeypatch.setattr(llm_backends, "NODE_MODELS", {})
+    monkeypatch.setattr(llm_backends, "ESCALATION_MODEL", "fake:fake")
+    monkeypatch.setattr(main.data_processor, "read_template_pdf", lambda template_id=None: "1. Purpose\n2. Logic")
+    calls, failing = Counter(), set()
+
+    async def ainvoke_node(node, messages, state=None):
+        calls[node] += 1
+        if node in failing:
+            await asyncio.sleep(0.2)  # let the nodes running alongside finish first
+            raise RuntimeError(f"{node} failed")
+        return await llm_backends.ainvoke_node(node, messages, state)
+
+    monkeypatch.setattr(agents, "ainvoke_node", ainvoke_node)
+    monkeypatch.setattr(section_revision, "ainvoke_node", ainvoke_node)
+    return calls, failing
+
+
+def test_resume_skips_the_nodes_that_finished(fake_nodes):
+    calls, failing = fake_nodes
+    task_id = uuid.uuid4().hex
+    task_registry.register_task(task_id)
+    failing.add("technical_spec_writer")
+    with pytest.raises(RuntimeError, match="technical_spec_writer failed"):
+        asyncio.run(main.main_async(CODE, task_id))
+    assert checkpoints.has_checkpoint(task_id)
+    assert calls["abap_code_analyst"] == calls["functional_spec_drafter"] == 1
+
+    failing.clear()
+    calls.clear()
+    result = asyncio.run(main.resume_async(task_id))
+    assert result["manager_output"]
+    assert calls["technical_spec_writer"] == 1
+    for node in ("abap_code_analyst", "foreign_dependency_agent", "functional_spec_drafter"):
+        assert calls[node] == 0, node  # finished before, or alongside, the failure
+
+    calls.clear()
+    asyncio.run(main.resume_async(task_id))  # already through the graph: nothing runs
+    assert sum(calls.values()) == 0
+
+
+def test_resume_without_checkpoint():
+    with pytest.raises(LookupError):
+        asyncio.run(main.resume_async(uuid.uuid4().hex))
+
+
+def test_put_keeps_only_the_latest_checkpoint_and_its_parent():
+    saver = checkpoint_saver.SqliteSaver()
+    config = checkpoints.run_config(uuid.uuid4().hex)
+    ids = []
+    for step in range(4):
+        checkpoint = empty_checkpoint()
+        checkpoint["channel_values"] = {"step": step}
+        config = saver.put(config, checkpoint, {"step": step}, {})
+        saver.put_writes(config, [("manager_output", f"write {step}")], task_id=f"t{step}")
+        ids.append(checkpoint["id"])
+
+    thread_config = checkpoints.run_config(config["configurable"]["thread_id"])
+    kept = [t.config["configurable"]["checkpoint_id"] for t in saver.list(thread_config)]
+    assert kept == [ids[3], ids[2]]
+    latest = saver.get_tuple(thread_config)
+    assert latest.checkpoint["channel_values"] == {"step": 3}
+    assert latest.parent_config["configurable"]["checkpoint_id"] == ids[2]
+    assert latest.pending_writes == [("t3", "manager_output", "write 3")]
+    rows = task_registry.get_connection().execute(
+        "SELECT DISTINCT checkpoint_id FROM checkpoint_writes WHERE thread_id = ?", (config["configurable"]["thread_id"],)
+    ).fetchall()
+    assert sorted(r["checkpoint_id"] for r in rows) == sorted(ids[2:])
+
+
+def test_regular_writes_are_kept_once():
+    saver = checkpoint_saver.SqliteSaver()
+    config = saver.put(checkpoints.run_config(uuid.uuid4().hex), empty_checkpoint(), {}, {})
+    saver.put_writes(config, [("fs_output", "first")], task_id="t")
+    saver.put_writes(config, [("fs_output", "retried")], task_id="t")
+    assert saver.get_tuple(config).pending_writes == [("t", "fs_output", "first")]
+
+
+@pytest.mark.parametrize("value, compressed", [
+    ({"manager_output": "short"}, False),
+    ({"manager_output": "## Section\n" * 2000, "review_count": 2}, True),
+])
+def test_compressed_serializer_round_trip(value, compressed):
+    serde = checkpoint_saver.CompressedSerializer()
+    type_, data = serde.dumps_typed(value)
+    assert type_.endswith("+zstd") == compressed
+    if compressed:
+        assert len(data) < len("## Section\n" * 2000)
+    assert serde.loads_typed((type_, data)) == value
@@ -0,0 +1,60 @@
+import asyncio
+import pytest
+from langchain_core.messages import AIMessage
+import chunked_analysis
+import llm_backends
+import token_estimator
+from utils import task_tokens_spent
+
+CODE = "\n".join(f"FORM f{i}.\n  WRITE 'routine {i}'.\nENDFORM." for i in range(6))
+
+
+class StubModel:
+    def __init__(self, name, reply, calls):
+        self.model, self.reply, self.calls = name, reply, calls
+
+    def invoke(self, messages):
+        self.calls.append((self.model, messages[-1].content))
+        return AIMessage(self.reply)
+
+    async def ainvoke(self, messages):
+        return self.invoke(messages)
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    calls = []
+    models = {"cheap": StubModel("cheap", "too short", calls), "strong": StubModel("strong", "x" * 500, calls)}
+    monkeypatch.setattr(llm_backends, "NODE_MODELS", {"abap_code_analyst": "fake:cheap"})
+    monkeypatch.setattr(llm_backends, "ESCALATION_MODEL", "fake:strong")
+    monkeypatch.setattr(llm_backends, "get_model", lambda spec: models[spec.partition(":")[2]])
+    return calls
+
+
+def state():
+    return {"task_id": "chunk-task", "analysis_code": CODE, "abap_structure": "6 FORM routines"}
+
+
+def test_chunks_and_merge_go_through_node_routing_and_escalation(calls):
+    result = chunked_analysis.run_chunked_analysis(state(), max_chars=60, parallelism=2)
+    assert result == "x" * 500
+    chunk_count = len(chunked_analysis.chunk_code(CODE, 60))
+    assert [m for m, _ in calls].count("cheap") == chunk_count + 1  # every chunk plus the merge
+    assert [m for m, _ in calls].count("strong") == chunk_count + 1  # each short answer escalated
+
+
+def test_async_path_matches(calls):
+    result = asyncio.run(chunked_analysis.run_chunked_analysis_async(state(), max_chars=60, parallelism=2))
+    assert result == "x" * 500
+    assert len(calls) == 2 * (len(chunked_analysis.chunk_code(CODE, 60)) + 1)
+
+
+def test_chunk_calls_respect_the_task_budget(calls, monkeypatch):
+    monkeypatch.setattr(token_estimator, "TASK_TOKEN_BUDGET", 1000)
+    task_tokens_spent["chunk-task"] = 1000
+    try:
+        with pytest.raises(token_estimator.TokenBudgetExceeded):
+            chunked_analysis.run_chunked_analysis(state(), max_chars=60)
+    finally:
+        task_tokens_spent.pop("chunk-task", None)
+    assert calls == []
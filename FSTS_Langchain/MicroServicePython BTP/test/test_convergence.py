@@ -0,0 +1,48 @@
+import convergence
+
+DOC = (
+    "# Specification\n\n## 1. Overview\n\n" + "Overview line.\n" * 40
+    + "\n## 2. Logic Flow\n\n" + "Step.\n" * 40 + "\n[ROUTE: output_reviewer]"
+)
+
+
+def state(**values):
+    return {"task_id": None, "review_count": 1, "min_output_reviews": 1, "max_output_reviews": 2, **values}
+
+
+def test_feedback_points():
+    assert convergence.feedback_points("NO ISSUES") == []
+    assert convergence.feedback_points("  no further issues. ") == []
+    assert convergence.feedback_points("- a\n  continued\n2. b") == ["- a\ncontinued", "2. b"]
+    assert convergence.feedback_points("Clarify the header.") == ["Clarify the header."]
+
+
+def test_document_change_ignores_route_directive():
+    change = convergence.document_change(DOC, DOC.replace("output_reviewer]", "final_output]"))
+    assert change == {"sections_changed": 0, "sections_total": 3, "change_ratio": 0.0}
+
+
+def test_document_change_counts_new_sections_in_full():
+    small = convergence.document_change(DOC, DOC.replace("Step.\n", "Step two.\n", 2))
+    large = convergence.document_change(DOC, DOC + "\n## 3. Tests\n\n" + "x" * 2000)
+    assert small["sections_changed"] == 1 and small["change_ratio"] < 0.05
+    assert large["change_ratio"] > 0.5
+
+
+def test_clean_review_skips_revision():
+    s = state(review_feedback="NO ISSUES")
+    assert convergence.after_review(s) == "final_output"
+    assert s["review_rounds_saved"] == 1
+    assert convergence.after_review(state(review_feedback="- [1. Overview] too short")) == "manager_agent"
+
+
+def test_small_revision_ends_loop():
+    s = state(manager_output=DOC.replace("Step.\n", "Step two.\n", 1))
+    assert convergence.after_revision(s, DOC, "output_reviewer") == "final_output"
+    s = state(manager_output=DOC + "\n## 3. Tests\n\n" + "x" * 2000)
+    assert convergence.after_revision(s, DOC, "output_reviewer") == "output_reviewer"
+
+
+def test_first_consolidation_is_always_reviewed():
+    s = state(review_count=0, manager_output=DOC)
+    assert convergence.after_revision(s, DOC, "output_reviewer") == "output_reviewer"
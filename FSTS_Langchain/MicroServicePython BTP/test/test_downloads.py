@@ -0,0 +1,34 @@
+import gzip
+import os
+import threading
+import api_server
+
+
+def run_together(fn, count=8):
+    barrier, errors = threading.Barrier(count), []
+
+    def worker():
+        barrier.wait()
+        try:
+            fn()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return errors
+
+
+def test_concurrent_gzip_of_the_same_file(tmp_path):
+    source = tmp_path / "task.txt"
+    source.write_bytes(os.urandom(2_000_000))
+    for _ in range(5):
+        os.utime(source)  # newer than any existing .gz: every call rebuilds it
+        for gz in tmp_path.glob("*.gz"):
+            os.utime(gz, (0, 0))
+        assert run_together(lambda: api_server.gzip_file(str(source))) == []
+    assert gzip.decompress((tmp_path / "task.txt.gz").read_bytes()) == source.read_bytes()
+    assert not list(tmp_path.glob("*.tmp"))
@@ -0,0 +1,69 @@
+import incremental
+
+OLD = """REPORT ztest.
+PARAMETERS p_bukrs TYPE bukrs.
+START-OF-SELECTION.
+  PERFORM get_data.
+  PERFORM show.
+
+FORM get_data.
+  SELECT * FROM bkpf INTO TABLE gt_bkpf WHERE bukrs = p_bukrs.
+ENDFORM.
+
+FORM show.
+  WRITE 'done'.
+ENDFORM.
+"""
+
+DOCUMENT = """# Functional Specification
+
+## 1. Purpose
+Reports accounting documents.
+
+## 2. Data Selection
+GET_DATA reads BKPF for the company code.
+
+## 3. Output
+SHOW writes the list.
+
+## 4. Authorisation
+None.
+"""
+
+
+def test_comment_only_edit_is_not_a_change():
+    commented = OLD.replace("  WRITE 'done'.", "* final message\n  WRITE 'done'.  \" shown at the end")
+    diff = incremental.diff_routines(OLD, commented)
+    assert (diff["changed"], diff["added"], diff["removed"]) == ([], [], [])
+
+
+def test_changed_added_and_removed_routines():
+    new = OLD.replace("WRITE 'done'.", "WRITE 'finished'.").replace(
+        "\nFORM get_data.", "\nFORM log.\n  WRITE 'log'.\nENDFORM.\n\nFORM get_data2.")
+    diff = incremental.diff_routines(OLD, new)
+    assert diff["changed"] == ["show"]
+    assert diff["added"] == ["get_data2", "log"]
+    assert diff["removed"] == ["get_data"]
+
+
+def test_plan_update_unchanged():
+    assert incremental.plan_update(OLD, OLD, DOCUMENT)["mode"] == "unchanged"
+
+
+def test_plan_update_targets_sections_mentioning_the_changed_routine():
+    plan = incremental.plan_update(OLD, OLD.replace("WRITE 'done'.", "WRITE 'finished'."), DOCUMENT)
+    assert plan["mode"] == "incremental"
+    assert [plan["document_sections"][i].splitlines()[0] for i in plan["sections"]] == ["## 3. Output"]
+    assert "+  WRITE 'finished'." in plan["code_changes"]
+
+
+def test_plan_update_falls_back_when_no_section_refers_to_the_change():
+    document = DOCUMENT.replace("SHOW writes", "The report writes")
+    plan = incremental.plan_update(OLD, OLD.replace("WRITE 'done'.", "WRITE 'finished'."), document)
+    assert plan["mode"] == "full"
+
+
+def test_split_sections_round_trips():
+    sections = incremental.split_sections(DOCUMENT)
+    assert "".join(sections) == DOCUMENT
+    assert len(sections) == 5
@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from job_queue import JobQueue, QueueFull
+
+
+async def noop():
+    pass
+
+
+def pop_all(queue):
+    order = []
+    while (job := queue._pop_next()) is not None:
+        order.append(job.job_id)
+    return order
+
+
+def test_clients_take_turns_within_a_priority():
+    queue = JobQueue(max_pending=20, max_per_client=10)
+    for i in range(3):
+        queue.submit(f"a{i}", "a", 0, noop)
+    queue.submit("b0", "b", 0, noop)
+    queue.submit("c0", "c", 0, noop)
+    assert queue.position("b0") == 2
+    assert [job.job_id for job in queue._dispatch_order()] == ["a0", "b0", "c0", "a1", "a2"]
+    assert pop_all(queue) == ["a0", "b0", "c0", "a1", "a2"]
+
+
+def test_higher_priority_goes_first():
+    queue = JobQueue(max_pending=20, max_per_client=10)
+    queue.submit("low", "a", 0, noop)
+    assert queue.submit("high", "b", 5, noop) == 1
+    queue.submit("clamped", "c", 99, noop)
+    assert pop_all(queue) == ["clamped", "high", "low"]
+
+
+def test_dispatch_order_matches_pops_after_interleaved_submits():
+    queue = JobQueue(max_pending=20, max_per_client=10)
+    for job_id, client in [("a0", "a"), ("a1", "a"), ("b0", "b")]:
+        queue.submit(job_id, client, 1, noop)
+    assert queue._pop_next().job_id == "a0"
+    queue.submit("c0", "c", 1, noop)
+    predicted = [job.job_id for job in queue._dispatch_order()]
+    assert predicted == pop_all(queue)
+
+
+def test_admission_limits():
+    queue = JobQueue(max_pending=3, max_per_client=2)
+    queue.submit("a0", "a", 0, noop)
+    queue.submit("a1", "a", 0, noop)
+    with pytest.raises(QueueFull, match="this client"):
+        queue.submit("a2", "a", 0, noop)
+    queue.submit("b0", "b", 0, noop)
+    with pytest.raises(QueueFull, match="full") as error:
+        queue.submit("c0", "c", 0, noop)
+    assert error.value.retry_after >= 1
+    queue._pop_next()
+    queue.submit("a2", "a", 0, noop)  # a's first job left the queue
+
+
+def test_workers_run_jobs_in_dispatch_order():
+    ran = []
+
+    async def scenario():
+        queue = JobQueue(slots=1, max_pending=20, max_per_client=10)
+
+        def job(name):
+            async def run():
+                ran.append(name)
+            return run
+
+        for job_id, client in [("a0", "a"), ("a1", "a"), ("b0", "b")]:
+            queue.submit(job_id, client, 0, job(job_id))
+        queue.start()
+        for _ in range(20):
+            if len(ran) == 3:
+                break
+            await asyncio.sleep(0.01)
+        await queue.stop()
+
+    asyncio.run(scenario())
+    assert ran == ["a0", "b0", "a1"]
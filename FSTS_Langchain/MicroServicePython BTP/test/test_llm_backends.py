@@ -0,0 +1,44 @@
+from langchain_core.messages import AIMessage, HumanMessage
+import llm_backends
+
+
+class StubModel:
+    def __init__(self, name, reply, calls):
+        self.model, self.reply, self.calls = name, reply, calls
+
+    def invoke(self, messages):
+        self.calls.append(self.model)
+        return AIMessage(self.reply)
+
+
+def route(monkeypatch, reply):
+    calls = []
+    models = {"cheap": StubModel("cheap", reply, calls), "strong": StubModel("strong", "x" * 500, calls)}
+    monkeypatch.setattr(llm_backends, "NODE_MODELS", {"output_reviewer": "fake:cheap", "foreign_dependency_agent": "fake:cheap"})
+    monkeypatch.setattr(llm_backends, "ESCALATION_MODEL", "fake:strong")
+    monkeypatch.setattr(llm_backends, "get_model", lambda spec: models[spec.partition(":")[2]])
+    return calls
+
+
+def test_reviewer_approval_is_not_escalated(monkeypatch):
+    calls = route(monkeypatch, "NO ISSUES")
+    response = llm_backends.invoke_node("output_reviewer", [HumanMessage("review")])
+    assert response.content == "NO ISSUES"
+    assert calls == ["cheap"]
+
+
+def test_short_output_of_other_nodes_is_escalated(monkeypatch):
+    calls = route(monkeypatch, "too short")
+    llm_backends.invoke_node("foreign_dependency_agent", [HumanMessage("scan")])
+    assert calls == ["cheap", "strong"]
+
+
+def test_validate_output_reasons():
+    assert llm_backends.validate_output(AIMessage("I'm sorry, I cannot help" + " x" * 200)) == "refusal"
+    truncated = AIMessage("x" * 500, response_metadata={"finish_reason": "MAX_TOKENS"})
+    assert llm_backends.validate_output(truncated).startswith("truncated")
+    assert llm_backends.validate_output(AIMessage("ok"), "output_reviewer") == ""
+
+
+def test_parse_node_min_chars():
+    assert llm_backends.parse_node_min_chars("output_reviewer=0, manager_agent=500") == {"output_reviewer": 0, "manager_agent": 500}
@@ -0,0 +1,58 @@
+import asyncio
+import uuid
+import pytest
+from fastapi.testclient import TestClient
+import api_server
+import progress
+import task_registry
+
+
+@pytest.fixture
+def task_id():
+    task_registry.init_registry()
+    task_id = uuid.uuid4().hex
+    task_registry.register_task(task_id)
+    return task_id
+
+
+def event_names(task_id):
+    return [e["event"] for e in task_registry.get_task_events(task_id)]
+
+
+def boom(state):
+    raise RuntimeError("model unavailable")
+
+
+async def aboom(state):
+    raise RuntimeError("model unavailable")
+
+
+def test_failing_node_records_node_failed(task_id):
+    with pytest.raises(RuntimeError):
+        progress.progress_wrapper(boom, "abap_code_analyst")({"task_id": task_id})
+    assert event_names(task_id) == ["node_started", "node_failed"]
+    failed = task_registry.get_task_events(task_id)[-1]["data"]
+    assert failed["node"] == "abap_code_analyst"
+    assert failed["error"] == "RuntimeError: model unavailable"
+
+
+def test_failing_async_node_records_node_failed(task_id):
+    with pytest.raises(RuntimeError):
+        asyncio.run(progress.progress_wrapper(aboom, "manager_agent")({"task_id": task_id}))
+    assert event_names(task_id) == ["node_started", "node_failed"]
+
+
+def test_stream_sends_events_written_as_the_task_finished(task_id, monkeypatch):
+    status_calls = []
+
+    def status_changes_after_fetch(tid):
+        status_calls.append(tid)
+        if len(status_calls) == 2:  # first call is the endpoint's 404 check
+            task_registry.set_task_status(tid, "Completed")
+            task_registry.add_task_event(tid, "run_finished", {"status": "Completed"})
+        return task_registry.get_task_status_value(tid)
+
+    monkeypatch.setattr(api_server, "get_task_status_value", status_changes_after_fetch)
+    body = TestClient(api_server.app).get(f"/code2fsts/stream/{task_id}").text
+    assert "event: run_finished" in body
+    assert body.index("event: run_finished") < body.index("event: end")
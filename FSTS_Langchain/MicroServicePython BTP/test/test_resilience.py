@@ -0,0 +1,79 @@
+import asyncio
+import pytest
+import resilience
+
+
+class FlakyModel:
+    """Raises the queued errors in turn, then answers."""
+
+    def __init__(self, *errors, model="flaky"):
+        self.model = model
+        self.errors = list(errors)
+        self.calls = 0
+
+    def invoke(self, messages):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+    async def ainvoke(self, messages):
+        return self.invoke(messages)
+
+
+class HangingModel:
+    model = "hanging"
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(3600)
+
+
+@pytest.fixture(autouse=True)
+def fast_resilience(monkeypatch):
+    monkeypatch.setattr(resilience, "_breakers", {})
+    monkeypatch.setattr(resilience, "backoff_seconds", lambda attempt: 0)
+    monkeypatch.setattr(resilience, "LLM_MAX_RETRIES", 2)
+    monkeypatch.setattr(resilience, "BREAKER_FAILURES", 3)
+
+
+def test_transient_errors_are_retried():
+    model = FlakyModel(TimeoutError(), TimeoutError())
+    assert resilience.call(model, []) == "ok"
+    assert model.calls == 3
+    assert resilience.breaker_for(model).failures == 0
+
+
+def test_permanent_error_is_not_retried():
+    model = FlakyModel(ValueError("bad request"))
+    with pytest.raises(ValueError):
+        resilience.call(model, [])
+    assert model.calls == 1
+
+
+def test_breaker_opens_after_consecutive_failures():
+    model = FlakyModel(*[TimeoutError()] * 3)
+    with pytest.raises(TimeoutError):
+        resilience.call(model, [])
+    with pytest.raises(resilience.CircuitOpen):
+        resilience.call(model, [])
+    assert model.calls == 3
+
+
+def test_cancelled_probe_does_not_leave_breaker_stuck(monkeypatch):
+    monkeypatch.setattr(resilience, "BREAKER_RESET_SECONDS", 0)
+    model = HangingModel()
+    breaker = resilience.breaker_for(model)
+    breaker.failures, breaker.opened_at = 3, 0.0  # open, reset window passed
+
+    async def cancel_probe():
+        probe = asyncio.ensure_future(resilience.acall(model, [], node="probe"))
+        await asyncio.sleep(0.01)
+        assert breaker.probing
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    asyncio.run(cancel_probe())
+    assert not breaker.probing
+    breaker.before_call()  # the next call may probe again instead of CircuitOpen
+    assert breaker.probing
@@ -0,0 +1,75 @@
+import os
+import pytest
+import result_cache
+import task_registry
+
+PROMPTS = {"manager_agent": "aa", "output_reviewer": "bb"}
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    task_registry.init_registry()
+    monkeypatch.setattr(result_cache, "RESULT_CACHE_DIR", str(tmp_path / "result_cache"))
+    result_cache.init_result_cache()
+    conn = task_registry.get_connection()
+    conn.execute("DELETE FROM result_cache")
+    conn.execute("DELETE FROM result_cache_stats")
+    return tmp_path
+
+
+def store(tmp_path, key, size=10):
+    md, pdf = tmp_path / f"{key}.md", tmp_path / f"{key}.pdf"
+    md.write_text("x" * size)
+    pdf.write_bytes(b"%PDF")
+    result_cache.store(key, str(md), str(pdf))
+
+
+def set_last_used(key, when):
+    task_registry.get_connection().execute("UPDATE result_cache SET last_used = ? WHERE cache_key = ?", (when, key))
+
+
+def test_key_changes_with_every_input():
+    base = result_cache.compute_cache_key("code", "template", "gemini", PROMPTS)
+    assert base == result_cache.compute_cache_key("code", "template", "gemini", dict(reversed(PROMPTS.items())))
+    assert base != result_cache.compute_cache_key("code2", "template", "gemini", PROMPTS)
+    assert base != result_cache.compute_cache_key("code", "template2", "gemini", PROMPTS)
+    assert base != result_cache.compute_cache_key("code", "template", "openai", PROMPTS)
+    assert base != result_cache.compute_cache_key("code", "template", "gemini", {**PROMPTS, "manager_agent": "ab"})
+
+
+def test_key_parts_cannot_run_into_each_other():
+    assert result_cache.compute_cache_key("ab", "c", "m", {}) != result_cache.compute_cache_key("a", "bc", "m", {})
+
+
+def test_store_then_lookup_counts_hits_and_misses(cache):
+    assert result_cache.lookup("k1") is None
+    store(cache, "k1")
+    md_path, pdf_path = result_cache.lookup("k1")
+    assert open(md_path).read() == "x" * 10
+    stats = result_cache.cache_stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 1, 1)
+
+
+def test_least_recently_used_entries_are_evicted_first(cache, monkeypatch):
+    for i, key in enumerate(("old", "used", "new")):
+        store(cache, key)
+        set_last_used(key, 1000 + i)
+    set_last_used("used", 5000)
+    monkeypatch.setattr(result_cache, "RESULT_CACHE_MAX_ENTRIES", 2)
+    assert result_cache.evict() == 1
+    assert result_cache.lookup("old") is None
+    assert result_cache.lookup("used") and result_cache.lookup("new")
+    assert not os.path.exists(os.path.join(result_cache.RESULT_CACHE_DIR, "old.txt"))
+
+
+def test_size_and_age_limits(cache, monkeypatch):
+    store(cache, "stale")
+    task_registry.get_connection().execute("UPDATE result_cache SET created_at = 0 WHERE cache_key = 'stale'")
+    monkeypatch.setattr(result_cache, "RESULT_CACHE_MAX_BYTES", 40)
+    store(cache, "small", size=10)
+    set_last_used("small", 1)
+    store(cache, "large", size=30)  # together over 40 bytes: the older one goes
+    assert result_cache.lookup("stale") is None
+    assert result_cache.lookup("small") is None
+    assert result_cache.lookup("large")
+    assert result_cache.cache_stats()["evictions"] == 2
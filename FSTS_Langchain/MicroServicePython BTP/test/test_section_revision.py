@@ -0,0 +1,69 @@
+import pytest
+import section_revision
+
+DOCUMENT = """## 1. Purpose
+Reports accounting documents.
+
+## 2. Data Selection
+Reads BKPF.
+
+## 3. Logic Flow
+Loops over the documents.
+
+## 4. Output
+Writes a list.
+
+## 5. Error Handling
+None.
+[ROUTE: output_reviewer]"""
+
+
+@pytest.fixture(autouse=True)
+def enabled(monkeypatch):
+    monkeypatch.setattr(section_revision, "SECTION_REVISIONS_ENABLED", True)
+    monkeypatch.setattr(section_revision, "SECTION_REVISION_MAX_RATIO", 0.5)
+
+
+def headings(plan):
+    return [plan["document_sections"][i].splitlines()[0] for i in plan["flagged"]]
+
+
+def test_feedback_by_label_number_and_title_maps_to_sections():
+    plan = section_revision.plan_revision(DOCUMENT, "- [3. Logic Flow] Explain the loop exit.\n- Section 2 misses BSEG.")
+    assert plan["mode"] == "sections"
+    assert sorted(headings(plan)) == ["## 2. Data Selection", "## 3. Logic Flow"]
+
+
+def test_unplaced_feedback_falls_back_to_full_revision():
+    plan = section_revision.plan_revision(DOCUMENT, "- [Logic Flow] Fine.\n- The tone is too informal overall.")
+    assert plan["mode"] == "full"
+    assert "not tied to a section" in plan["reason"]
+
+
+def test_most_sections_flagged_falls_back_to_full_revision():
+    feedback = "\n".join(f"- Section {n} needs more detail." for n in (1, 2, 3, 4))
+    plan = section_revision.plan_revision(DOCUMENT, feedback)
+    assert plan["mode"] == "full"
+    assert plan["reason"] == "4 of 5 sections flagged"
+
+
+def test_disabled_always_revises_in_full(monkeypatch):
+    monkeypatch.setattr(section_revision, "SECTION_REVISIONS_ENABLED", False)
+    assert section_revision.plan_revision(DOCUMENT, "- Section 2 misses BSEG.")["reason"] == "disabled"
+
+
+def test_short_titles_do_not_match_by_accident():
+    headings = [(None, "io"), ("7", "output")]
+    assert section_revision.locate("- Review the radio buttons", headings) == set()
+    assert section_revision.locate("- Output should list totals", headings) == {1}
+
+
+def test_splice_keeps_spacing_and_drops_route_directive():
+    plan = section_revision.plan_revision(DOCUMENT, "- Section 3 misses the loop exit.")
+    (index,) = plan["flagged"]
+    revised = section_revision._revised_section(
+        plan["document_sections"][index], "## 3. Logic Flow\nLoops until EXIT.\n[ROUTE: output_reviewer]\n")
+    document = section_revision._splice(plan, {index: revised})
+    assert "[ROUTE:" not in document
+    assert "## 3. Logic Flow\nLoops until EXIT.\n\n## 4. Output" in document
+    assert document.startswith("## 1. Purpose\nReports accounting documents.\n\n## 2. Data Selection")
@@ -0,0 +1,43 @@
+import os
+import time
+import uuid
+import task_registry
+
+
+def legacy_file(tmp_path, *task_ids):
+    path = tmp_path / "task_registry.txt"
+    path.write_text("".join(f"{tid},{int(time.time())},Completed\n" for tid in task_ids) + "garbage line\n")
+    return str(path)
+
+
+def test_legacy_registry_is_imported_once(tmp_path):
+    task_registry.init_registry()
+    tid = uuid.uuid4().hex
+    path = legacy_file(tmp_path, tid)
+    assert task_registry.migrate_legacy_registry(path) == 1
+    assert task_registry.get_task_status_value(tid) == "Completed"
+    assert os.path.exists(path + ".migrated") and not os.path.exists(path)
+    assert task_registry.migrate_legacy_registry(path) == 0
+
+
+def test_worker_losing_the_rename_race_still_starts(tmp_path, monkeypatch):
+    task_registry.init_registry()
+    tid = uuid.uuid4().hex
+    path = legacy_file(tmp_path, tid)
+    real_replace = os.replace
+
+    def other_worker_renames_first(src, dst):
+        real_replace(src, dst)  # the other worker's rename
+        real_replace(src, dst)  # ours: the file is gone
+
+    monkeypatch.setattr(os, "replace", other_worker_renames_first)
+    assert task_registry.migrate_legacy_registry(path) == 0
+    monkeypatch.undo()
+    assert task_registry.get_task_status_value(tid) == "Completed"
+
+
+def test_worker_finding_the_file_gone_before_reading(tmp_path, monkeypatch):
+    task_registry.init_registry()
+    path = str(tmp_path / "task_registry.txt")  # another worker already renamed it
+    monkeypatch.setattr(os.path, "exists", lambda p: True)
+    assert task_registry.migrate_legacy_registry(path) == 0
@@ -0,0 +1,63 @@
+import os
+import threading
+import pytest
+import template_store
+
+VALID_ID = "0123456789abcdef0123456789abcdef"
+
+
+@pytest.mark.parametrize("template_id", [
+    "../outputs/0123456789abcdef0123456789abcdef",
+    "../../etc/passwd",
+    VALID_ID.upper(),
+    VALID_ID[:-1],
+    VALID_ID + "0",
+    "",
+    None,
+])
+def test_invalid_ids_are_rejected(template_id):
+    assert not template_store.is_valid_template_id(template_id)
+    assert not template_store.template_exists(template_id)
+    with pytest.raises(ValueError):
+        template_store._paths(template_id)
+
+
+def test_traversal_cannot_reach_other_outputs(tmp_path, monkeypatch):
+    monkeypatch.setattr(template_store, "TEMPLATES_DIR", str(tmp_path / "templates"))
+    os.makedirs(tmp_path / "outputs")
+    (tmp_path / "outputs" / f"{VALID_ID}.txt").write_text("another client's document")
+    with pytest.raises(ValueError):
+        template_store.get_template_text(f"../outputs/{VALID_ID}")
+
+
+def test_stored_template_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(template_store, "TEMPLATES_DIR", str(tmp_path))
+    (tmp_path / f"{VALID_ID}.txt").write_text("template text")
+    assert template_store.template_exists(VALID_ID)
+    assert template_store.get_template_text(VALID_ID) == "template text"
+    with pytest.raises(KeyError):
+        template_store.get_template_text("f" * 32)
+
+
+def test_concurrent_uploads_of_the_same_template(tmp_path, monkeypatch):
+    monkeypatch.setattr(template_store, "TEMPLATES_DIR", str(tmp_path))
+    monkeypatch.setattr(template_store, "extract_pdf_text", lambda path: ("1. Purpose\n2. Logic", 1))
+    pdf = b"%PDF-1.4 " + os.urandom(1_000_000)
+    barrier, results, errors = threading.Barrier(6), [], []
+
+    def upload():
+        barrier.wait()
+        try:
+            results.append(template_store.ingest_template(pdf, "FS template")["template_id"])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=upload) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert set(results) == {template_store.template_id_for(pdf)}
+    assert template_store.get_template_text(results[0]) == "1. Purpose\n2. Logic"
+    assert not list(tmp_path.glob("*.tmp"))
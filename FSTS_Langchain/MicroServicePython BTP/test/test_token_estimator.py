@@ -0,0 +1,73 @@
+import pytest
+from langchain_core.messages import HumanMessage
+import token_estimator
+from utils import task_tokens_spent
+
+
+def format_fn(state):
+    return [HumanMessage(content=f"Analyse:\n{state['analysis_code']}\nTemplate:\n{state['template_text']}")]
+
+
+@pytest.fixture
+def task_budget(monkeypatch):
+    monkeypatch.setattr(token_estimator, "TASK_TOKEN_BUDGET", 10000)
+    monkeypatch.setitem(token_estimator.EXPECTED_OUTPUT_TOKENS, "test_agent", 1000)
+    yield "budget-task"
+    task_tokens_spent.pop("budget-task", None)
+
+
+def test_prompt_within_budget_is_unchanged(task_budget):
+    state = {"task_id": task_budget, "analysis_code": "WRITE 'x'.", "template_text": "1. Purpose"}
+    assert token_estimator.fit_to_budget("test_agent", state, format_fn) == format_fn(state)
+
+
+def test_exhausted_task_budget_fails_instead_of_sending(task_budget):
+    task_tokens_spent[task_budget] = 9500
+    state = {"task_id": task_budget, "analysis_code": "WRITE 'x'.", "template_text": "1. Purpose"}
+    with pytest.raises(token_estimator.TokenBudgetExceeded):
+        token_estimator.fit_to_budget("test_agent", state, lambda s: [HumanMessage(content="x" * 4000)])
+
+
+def test_prompt_that_cannot_fit_remaining_budget_fails(task_budget):
+    task_tokens_spent[task_budget] = 8900  # 100 input tokens left
+    fixed_prompt = lambda s: [HumanMessage(content="instructions " * 100 + s["analysis_code"])]
+    state = {"task_id": task_budget, "analysis_code": "WRITE 'x'.\n" * 50, "template_text": ""}
+    with pytest.raises(token_estimator.TokenBudgetExceeded):
+        token_estimator.fit_to_budget("test_agent", state, fixed_prompt)
+
+
+def test_over_per_call_cap_only_is_trimmed_and_sent(monkeypatch):
+    monkeypatch.setattr(token_estimator, "PROMPT_TOKEN_BUDGET", 200)
+    state = {"analysis_code": "WRITE 'x'.\n" * 400, "template_text": ""}
+    messages = token_estimator.fit_to_budget("abap_code_analyst", state, format_fn)
+    assert "truncated to fit the token budget" in messages[0].content
+
+
+def test_comment_stripping_targets_analysis_code(monkeypatch):
+    monkeypatch.setattr(token_estimator, "PROMPT_TOKEN_BUDGET", 120)
+    code = "\n".join(f"* comment line {i} explaining the report\nWRITE 'x'." for i in range(20))
+    state = {"analysis_code": code, "code_input": code, "template_text": ""}
+    content = token_estimator.fit_to_budget("abap_code_analyst", state, format_fn)[0].content
+    assert "comment line" not in content
+    assert "WRITE 'x'." in content
+
+
+def test_nodes_are_priced_at_their_routed_model(monkeypatch):
+    import llm_backends
+    monkeypatch.setattr(llm_backends, "DEFAULT_MODEL", "gemini:gemini-2.5-pro")
+    monkeypatch.setattr(llm_backends, "NODE_MODELS", {"output_reviewer": "gemini:gemini-2.5-flash", "local": "fake:x"})
+    assert token_estimator.estimate_cost(1_000_000, 1_000_000, "manager_agent") == 11.25
+    assert token_estimator.estimate_cost(1_000_000, 1_000_000, "output_reviewer") == 2.8
+    assert token_estimator.estimate_cost(1_000_000, 1_000_000, "local") == 0
+
+
+def test_estimate_run_totals_add_up_per_model(monkeypatch):
+    import llm_backends
+    monkeypatch.setattr(llm_backends, "NODE_MODELS", {"output_reviewer": "gemini:gemini-2.5-flash"})
+    estimate = token_estimator.estimate_run("REPORT ztest.\nWRITE 'x'.\n", "1. Purpose\n2. Logic", 1, 1)
+    nodes = estimate["nodes"]
+    assert nodes["output_reviewer"]["model"] == "gemini:gemini-2.5-flash"
+    reviewer = nodes["output_reviewer"]
+    assert reviewer["cost_usd"] < token_estimator.estimate_cost(reviewer["input_tokens"], reviewer["output_tokens"])
+    assert estimate["expected"]["cost_usd"] < token_estimator.estimate_cost(
+        estimate["expected"]["input_tokens"], estimate["expected"]["output_tokens"])
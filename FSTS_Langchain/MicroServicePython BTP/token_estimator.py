@@ -0,0 +1,318 @@
+# token_estimator.py
+# Offline token estimates (no tokenizer download, no API call) for the
+# pre-flight /code2fsts/estimate endpoint, and the per-call / per-task token
+# budget that trims low-value context before a prompt is sent.
+import logging
+import math
+import os
+import re
+from collections import Counter
+from abap_chunker import chunk_code, should_chunk
+from abap_scanner import prepare_analysis_inputs, strip_comments
+from prompt_registry import get_prompt
+from utils import current_task_id, task_tokens_spent
+import tracing
+
+# Gemini averages about 4 characters per token on English prose and ABAP
+CHARS_PER_TOKEN = float(os.getenv("FSTS_CHARS_PER_TOKEN", 4.0))
+MESSAGE_OVERHEAD_TOKENS = 4  # role markers per message
+
+# USD per million input/output tokens by model (prompts up to 200k tokens)
+MODEL_PRICES = {
+    "gemini-2.5-pro": (1.25, 10.0),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+}
+# Models not listed above (e.g. an OpenAI-compatible server); the fake backend is free
+PRICE_INPUT_PER_MTOK = float(os.getenv("FSTS_PRICE_INPUT_PER_MTOK", 1.25))
+PRICE_OUTPUT_PER_MTOK = float(os.getenv("FSTS_PRICE_OUTPUT_PER_MTOK", 10.0))
+
+# Largest prompt sent in one call; above 200k tokens Gemini 2.5 Pro bills at the higher tier
+PROMPT_TOKEN_BUDGET = int(os.getenv("FSTS_PROMPT_TOKEN_BUDGET", 200000))
+# Total billed tokens one task may use (0 = unlimited)
+TASK_TOKEN_BUDGET = int(os.getenv("FSTS_TASK_TOKEN_BUDGET", 0))
+
+# Typical response sizes, used for outputs that do not exist yet
+EXPECTED_OUTPUT_TOKENS = {
+    "abap_code_analyst": 3000,
+    "abap_chunk_analyst": 1500,
+    "abap_analysis_merger": 3000,
+    "foreign_dependency_agent": 1500,
+    "functional_spec_drafter": 3000,
+    "technical_spec_writer": 4000,
+    "manager_agent": 6000,
+    "output_reviewer": 1200,
+}
+
+# State key -> node whose output fills it
+PRODUCED_BY = {
+    "abap_analysis": "abap_code_analyst",
+    "foreign_dependencies": "foreign_dependency_agent",
+    "fs_output": "functional_spec_drafter",
+    "ts_output": "technical_spec_writer",
+    "manager_output": "manager_agent",
+    "review_feedback": "output_reviewer",
+}
+
+
+def estimate_tokens(text) -> int:
+    if not text:
+        return 0
+    return math.ceil(len(text if isinstance(text, str) else str(text)) / CHARS_PER_TOKEN)
+
+
+def estimate_messages(messages) -> int:
+    return sum(estimate_tokens(m.content) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+def model_prices(spec: str) -> tuple:
+    """(input, output) USD per million tokens for a "backend:model" spec."""
+    backend, _, model_name = spec.partition(":")
+    if backend == "fake":
+        return 0.0, 0.0
+    return MODEL_PRICES.get(model_name, (PRICE_INPUT_PER_MTOK, PRICE_OUTPUT_PER_MTOK))
+
+
+def estimate_cost(input_tokens: int, output_tokens: int, node=None) -> float:
+    """Cost at the rates of the model the node is routed to (the default model without a node)."""
+    # llm_backends loads langchain; api_server imports this module at startup, so import it at call time
+    from llm_backends import node_model_spec
+
+    input_price, output_price = model_prices(node_model_spec(node))
+    return round(input_tokens * input_price / 1e6 + output_tokens * output_price / 1e6, 6)
+
+
+def _filler(node):
+    """Placeholder text the size of a node's expected output."""
+    return "x" * int(EXPECTED_OUTPUT_TOKENS[node] * CHARS_PER_TOKEN)
+
+
+# --- Context trimming ---------------------------------------------------------
+
+PAGE_NUMBER = re.compile(r"^\s*(page\s+)?\d+(\s*(of|/)\s*\d+)?\s*$", re.IGNORECASE)
+DOT_LEADER = re.compile(r"(\.\s?){4,}|_{4,}|-{4,}")
+HEADING = re.compile(r"^\s*(\d+(\.\d+)*\.?|[A-Z]\.|[IVX]+\.)\s+\S")
+
+
+def compact_template(text: str) -> str:
+    """
+    Drop template boilerplate: page headers/footers repeated on every page,
+    page numbers, table-of-contents dot leaders and blank runs.
+    """
+    lines = [line.strip() for line in text.splitlines()]
+    counts = Counter(line for line in lines if line)
+    kept, seen = [], set()
+    for line in lines:
+        if not line or PAGE_NUMBER.match(line):
+            continue
+        if counts[line] >= 3 and not HEADING.match(line):
+            if line in seen:
+                continue  # page header/footer: keep the first occurrence only
+            seen.add(line)
+        kept.append(" ".join(DOT_LEADER.sub(" ", line).split()))
+    return "\n".join(line for line in kept if line)
+
+
+def template_outline(text: str) -> str:
+    """Only the section headings of the template."""
+    outline = [line for line in compact_template(text).splitlines() if HEADING.match(line) and len(line) <= 120]
+    return "\n".join(outline) or compact_template(text)[:2000]
+
+
+def _truncate(text: str, drop_tokens: int) -> str:
+    keep = max(0, len(text) - int(drop_tokens * CHARS_PER_TOKEN) - 200)
+    return text[:keep] + "\n... (truncated to fit the token budget)"
+
+
+# Cheapest loss first; each step is kept only if it makes the prompt smaller
+TRIM_STEPS = [
+    ("compact_template", "template_text", compact_template),
+    ("strip_code_comments", "analysis_code", strip_comments),  # only shrinks it with FSTS_ABAP_PREPARSE=0
+    ("template_outline", "template_text", template_outline),
+]
+TRUNCATABLE_KEYS = ["analysis_code", "code_input", "template_text", "partial_analyses", "chunk_code"]
+
+
+class TokenBudgetExceeded(RuntimeError):
+    """What is left of FSTS_TASK_TOKEN_BUDGET cannot hold the next prompt, even trimmed."""
+
+
+def task_tokens_left(agent_name: str, task_id=None):
+    """Input tokens the task budget leaves for the next call after its expected output, or None if unlimited."""
+    if not TASK_TOKEN_BUDGET or not task_id:
+        return None
+    return TASK_TOKEN_BUDGET - task_tokens_spent.get(task_id, 0) - EXPECTED_OUTPUT_TOKENS.get(agent_name, 0)
+
+
+def call_budget(agent_name: str, task_id=None) -> int:
+    """Input tokens the next call may use: the per-call cap, lowered by what is left of the task budget."""
+    remaining = task_tokens_left(agent_name, task_id)
+    return PROMPT_TOKEN_BUDGET if remaining is None else min(PROMPT_TOKEN_BUDGET, max(remaining, 0))
+
+
+def fit_to_budget(agent_name, state, format_fn):
+    """
+    Format the prompt with format_fn(state). If its estimate exceeds the call
+    budget, re-format with progressively trimmed context (the state itself is
+    not modified). Returns the messages to send.
+
+    Raises TokenBudgetExceeded when the task budget is what limits the call
+    and no trimming fits the prompt in it; a prompt over only the per-call
+    cap is sent as trimmed.
+    """
+    messages = format_fn(state)
+    task_id = state.get("task_id") or current_task_id.get()
+    remaining = task_tokens_left(agent_name, task_id)
+    if remaining is not None and remaining <= 0:
+        raise TokenBudgetExceeded(
+            f"Task token budget of {TASK_TOKEN_BUDGET} is used up before {agent_name} "
+            f"({task_tokens_spent.get(task_id, 0)} tokens spent)"
+        )
+    budget = call_budget(agent_name, task_id)
+    tokens = estimate_messages(messages)
+    if tokens <= budget:
+        return messages
+
+    view = dict(state)
+    start_tokens, applied = tokens, []
+    for step, key, reduce in TRIM_STEPS:
+        if not isinstance(view.get(key), str):
+            continue
+        candidate = {**view, key: reduce(view[key])}
+        candidate_messages = format_fn(candidate)
+        candidate_tokens = estimate_messages(candidate_messages)
+        if candidate_tokens < tokens:
+            view, messages, tokens = candidate, candidate_messages, candidate_tokens
+            applied.append(step)
+        if tokens <= budget:
+            break
+    for key in TRUNCATABLE_KEYS:
+        if tokens <= budget:
+            break
+        if not isinstance(view.get(key), str) or not view[key]:
+            continue
+        candidate = {**view, key: _truncate(view[key], tokens - budget)}
+        candidate_messages = format_fn(candidate)
+        candidate_tokens = estimate_messages(candidate_messages)
+        if candidate_tokens < tokens:
+            view, messages, tokens = candidate, candidate_messages, candidate_tokens
+            applied.append(f"truncate_{key}")
+
+    tracing.event(
+        logging.INFO if tokens <= budget else logging.WARNING, "budget",
+        agent=agent_name, tokens_before=start_tokens, tokens_after=tokens, budget=budget,
+        trimmed=",".join(applied) or "none",
+    )
+    if tokens > budget and budget < PROMPT_TOKEN_BUDGET:
+        raise TokenBudgetExceeded(
+            f"{agent_name} needs about {tokens} input tokens but only {budget} are left "
+            f"of the task token budget of {TASK_TOKEN_BUDGET}"
+        )
+    return messages
+
+
+# --- Pre-flight estimate ------------------------------------------------------
+
+def _node_estimate(node, input_tokens, calls=1):
+    output_tokens = EXPECTED_OUTPUT_TOKENS[node] * calls
+    return {
+        "calls": calls,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "max_prompt_tokens": input_tokens // calls if calls else 0,
+    }
+
+
+def estimate_run(code_text: str, template_text: str, min_reviews: int = 1, max_reviews: int = 2) -> dict:
+    """
+    Predict per-node and total tokens and cost for one submission without
+    calling the model. Outputs that do not exist yet (analysis, specs, review
+    feedback) are sized from EXPECTED_OUTPUT_TOKENS. Manager and reviewer
+    figures are for one round; totals are given for min and max review rounds.
+    """
+    # agents imports this module for fit_to_budget, so import it at call time
+    from agents import format_agent_prompt, build_manager_prompt
+    from llm_backends import node_model_spec
+
+    state = {"code_input": code_text, "template_text": template_text, **prepare_analysis_inputs(code_text)}
+    for key, node in PRODUCED_BY.items():
+        state[key] = _filler(node)
+    state["review_feedback"] = ""  # first manager round has no feedback
+
+    nodes = {}
+    if should_chunk(state["analysis_code"]):
+        chunks = chunk_code(state["analysis_code"])
+        chunk_prompt = get_prompt("abap_chunk_analyst").chat_prompt
+        chunk_inputs = [
+            estimate_messages(chunk_prompt.format_messages(
+                chunk_index=i, chunk_count=len(chunks), routine_names=", ".join(c["routines"]), chunk_code=c["text"]))
+            for i, c in enumerate(chunks, start=1)
+        ]
+        merge_input = estimate_messages(get_prompt("abap_analysis_merger").chat_prompt.format_messages(
+            chunk_count=len(chunks), abap_structure=state["abap_structure"],
+            partial_analyses=_filler("abap_chunk_analyst") * len(chunks)))
+        nodes["abap_code_analyst"] = {
+            "calls": len(chunks) + 1,
+            "input_tokens": sum(chunk_inputs) + merge_input,
+            "output_tokens": EXPECTED_OUTPUT_TOKENS["abap_chunk_analyst"] * len(chunks)
+            + EXPECTED_OUTPUT_TOKENS["abap_analysis_merger"],
+            "max_prompt_tokens": max(chunk_inputs + [merge_input]),
+        }
+    else:
+        nodes["abap_code_analyst"] = _node_estimate(
+            "abap_code_analyst", estimate_messages(format_agent_prompt("abap_code_analyst", state)))
+
+    for node in ("foreign_dependency_agent", "functional_spec_drafter", "technical_spec_writer", "output_reviewer"):
+        nodes[node] = _node_estimate(node, estimate_messages(format_agent_prompt(node, state)))
+
+    first_round = estimate_messages(build_manager_prompt(state))
+    revision = estimate_messages(build_manager_prompt({**state, "review_feedback": _filler("output_reviewer")}))
+    nodes["manager_agent"] = _node_estimate("manager_agent", first_round)
+    nodes["manager_agent"]["revision_input_tokens"] = revision
+
+    for node, entry in nodes.items():
+        entry["model"] = node_model_spec(node)
+        entry["cost_usd"] = estimate_cost(entry["input_tokens"], entry["output_tokens"], node)
+
+    def total(reviews):
+        # node -> (input, output) tokens over the whole run
+        usage = {n: (e["input_tokens"], e["output_tokens"]) for n, e in nodes.items()}
+        usage["manager_agent"] = (
+            first_round + reviews * revision, (1 + reviews) * EXPECTED_OUTPUT_TOKENS["manager_agent"])
+        usage["output_reviewer"] = (
+            reviews * nodes["output_reviewer"]["input_tokens"], reviews * EXPECTED_OUTPUT_TOKENS["output_reviewer"])
+        input_tokens = sum(i for i, _ in usage.values())
+        output_tokens = sum(o for _, o in usage.values())
+        return {
+            "review_rounds": reviews,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+            "cost_usd": round(sum(estimate_cost(i, o, n) for n, (i, o) in usage.items()), 6),
+        }
+
+    expected, worst_case = total(min_reviews), total(max_reviews)
+    largest = max(max(e["max_prompt_tokens"], e.get("revision_input_tokens", 0)) for e in nodes.values())
+    return {
+        "code_chars": len(code_text),
+        "template_chars": len(template_text),
+        "chunked_analysis": nodes["abap_code_analyst"]["calls"] > 1,
+        "nodes": nodes,
+        "expected": expected,
+        "worst_case": worst_case,
+        "budget": {
+            "prompt_token_budget": PROMPT_TOKEN_BUDGET,
+            "task_token_budget": TASK_TOKEN_BUDGET or None,
+            "largest_prompt_tokens": largest,
+            "nodes_over_prompt_budget": sorted(
+                n for n, e in nodes.items()
+                if max(e["max_prompt_tokens"], e.get("revision_input_tokens", 0)) > PROMPT_TOKEN_BUDGET
+            ),
+            "within_task_budget": not TASK_TOKEN_BUDGET or worst_case["total_tokens"] <= TASK_TOKEN_BUDGET,
+        },
+        "assumptions": {
+            "chars_per_token": CHARS_PER_TOKEN,
+            "model_prices_per_mtok": {**MODEL_PRICES, "other": (PRICE_INPUT_PER_MTOK, PRICE_OUTPUT_PER_MTOK)},
+            "expected_output_tokens": EXPECTED_OUTPUT_TOKENS,
+        },
+    }
@@ -0,0 +1,157 @@
+# tracing.py
+# Span-based tracing of workflow nodes: one log line per node with its
+# timestamps, prompt/response sizes and token counts, through a levelled
+# logger. Full prompts and responses are only written for a sampled share of
+# tasks, to outputs/{task_id}.trace.jsonl (removed with the task's other files).
+import contextvars
+import hashlib
+import inspect
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from task_registry import OUTPUTS_DIR
+
+LOG_LEVEL = os.getenv("FSTS_LOG_LEVEL", "INFO").upper()
+# Share of tasks whose full prompts and responses are captured (0 = off, 1 = all)
+TRACE_PAYLOAD_SAMPLE_RATE = float(os.getenv("FSTS_TRACE_PAYLOAD_SAMPLE_RATE", 0))
+TRACE_PAYLOAD_MAX_CHARS = int(os.getenv("FSTS_TRACE_PAYLOAD_MAX_CHARS", 200000))
+
+log = logging.getLogger("fsts")
+if not log.handlers:
+    # Own handler: utils silences the root logger for the PDF libraries
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    log.addHandler(_handler)
+    log.propagate = False
+log.setLevel(LOG_LEVEL)
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+_payload_lock = threading.Lock()
+
+
+def _format_fields(fields):
+    return " ".join(f"{k}={v}" for k, v in fields.items() if v is not None)
+
+
+def event(level: int, message: str, **fields):
+    """Log `message key=value ...`; the fields are only formatted if the level is enabled."""
+    if log.isEnabledFor(level):
+        log.log(level, f"{message} {_format_fields(fields)}".rstrip())
+
+
+def payload_sampled(task_id) -> bool:
+    """Stable per-task decision, so a sampled task is captured completely."""
+    if TRACE_PAYLOAD_SAMPLE_RATE <= 0:
+        return False
+    if TRACE_PAYLOAD_SAMPLE_RATE >= 1:
+        return True
+    if task_id is None:
+        return random.random() < TRACE_PAYLOAD_SAMPLE_RATE
+    bucket = int(hashlib.sha1(str(task_id).encode()).hexdigest()[:8], 16) / 0x100000000
+    return bucket < TRACE_PAYLOAD_SAMPLE_RATE
+
+
+def trace_path(task_id) -> str:
+    return os.path.join(OUTPUTS_DIR, f"{task_id or 'cli'}.trace.jsonl")
+
+
+class Span:
+    def __init__(self, name, task_id=None, **attrs):
+        self.name = name
+        self.task_id = task_id
+        self.attrs = dict(attrs)
+        self.capture = payload_sampled(task_id)
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        """Accumulate numeric attributes (model calls may run in several threads)."""
+        with self._lock:
+            for k, v in counts.items():
+                self.attrs[k] = self.attrs.get(k, 0) + v
+
+
+@contextmanager
+def span(name: str, task_id=None, **attrs):
+    current = Span(name, task_id, **attrs)
+    token = _current_span.set(current)
+    event(logging.DEBUG, "span_start", span=name, task=task_id)
+    status = "ok"
+    try:
+        yield current
+    except BaseException as e:
+        status = f"error:{type(e).__name__}"
+        raise
+    finally:
+        _current_span.reset(token)
+        ended = time.time()
+        event(
+            logging.INFO if status == "ok" else logging.WARNING, "span",
+            span=name, task=task_id, status=status,
+            start=round(current.started, 3), end=round(ended, 3),
+            duration_ms=int((ended - current.started) * 1000),
+            **current.attrs,
+        )
+
+
+def _message_text(message):
+    content = getattr(message, "content", message)
+    return content if isinstance(content, str) else json.dumps(content, default=str)
+
+
+def record_llm_call(messages, response, cached: bool):
+    """Add one model call's sizes and tokens to the current span; capture the payload if sampled."""
+    current = _current_span.get()
+    prompt_chars = sum(len(_message_text(m)) for m in messages)
+    response_text = _message_text(response)
+    usage = getattr(response, "usage_metadata", None) or {}
+    counts = {"llm_calls": 1, "prompt_chars": prompt_chars, "response_chars": len(response_text)}
+    if cached:
+        counts["cached_calls"] = 1
+    else:
+        counts["input_tokens"] = usage.get("input_tokens", 0)
+        counts["output_tokens"] = usage.get("output_tokens", 0)
+    if current is None:
+        event(logging.DEBUG, "llm_call", cached=cached, **counts)
+        return
+    current.add(**counts)
+    if current.capture:
+        _write_payload(current, messages, response_text, usage, cached)
+
+
+def _write_payload(current, messages, response_text, usage, cached):
+    limit = TRACE_PAYLOAD_MAX_CHARS
+    record = {
+        "time": time.time(),
+        "span": current.name,
+        "cached": cached,
+        "usage": usage,
+        "messages": [
+            {"type": getattr(m, "type", "message"), "content": _message_text(m)[:limit]} for m in messages
+        ],
+        "response": response_text[:limit],
+    }
+    os.makedirs(OUTPUTS_DIR, exist_ok=True)
+    with _payload_lock, open(trace_path(current.task_id), "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, default=str) + "\n")
+
+
+def trace_node(fn, name):
+    """Run a workflow node inside a span named after it."""
+    if inspect.iscoroutinefunction(fn):
+        async def wrapped_async(state):
+            with span(name, state.get("task_id")):
+                return await fn(state)
+
+        return wrapped_async
+
+    def wrapped(state):
+        with span(name, state.get("task_id")):
+            return fn(state)
+
+    return wrapped
@@ -1,29 +1,32 @@
 from collections import defaultdict
+import contextvars
 import os
 import re
 import markdown2
-from weasyprint import HTML, CSS
 import logging
-from fontTools.misc.loggingTools import configLogger
-import yaml
-from xhtml2pdf import pisa
+from prompt_registry import get_prompt
+import metrics
 
-# --- Disable fontTools internal logging completely ---
-configLogger(level=logging.CRITICAL)
+# PDF renderers (weasyprint, xhtml2pdf, fontTools) are imported on first use in
+# load_weasyprint()/convert_markdown_to_pdf_test so importing utils stays cheap.
 
-# --- Also silence root-level loggers for good measure ---
+# --- Silence root-level loggers for good measure ---
 logging.getLogger('fontTools').setLevel(logging.CRITICAL)
 logging.getLogger('weasyprint').setLevel(logging.CRITICAL)
 logging.getLogger().setLevel(logging.CRITICAL)
 
-token_usage_history = []  # Global list to collect token usage from all agent steps
+# Task the current run belongs to; set by main()/main_async() and inherited by
+# the graph's node tasks and threads, so usage can be charged to the right task
+current_task_id = contextvars.ContextVar("current_task_id", default=None)
+# task_id -> usage entries of its agent steps (None for CLI runs); released
+# with release_task_usage() when the task finishes
+task_token_usage = defaultdict(list)
+task_tokens_spent = defaultdict(int)  # task_id -> billed total_tokens so far
 
 
 def load_prompt(agent_name: str):
-    """Load a prompt definition from prompts/{agent_name}.yaml"""
-    path = os.path.join("prompts", f"{agent_name}.yaml")
-    with open(path, "r", encoding="utf-8") as f:
-        return yaml.safe_load(f)
+    """Return the prompt definition from prompts/{agent_name}.yaml (cached by the prompt registry)"""
+    return get_prompt(agent_name).definition
 
 def format_user_prompt(prompt_def, state):
     params = {key: state[key] for key in prompt_def.get("parameters", {})}
@@ -53,17 +56,32 @@ def parse_route(content):
     
 #     print(f"✅ Graph exported to {filename}")
 
-def add_token_usage(response, agent_name):
+def add_token_usage(response, agent_name, cached=False):
     """
-    Adds token usage for an agent step to the global history using usage_metadata.
+    Adds token usage for an agent step to the current task's ledger using usage_metadata.
+    Responses replayed from the LLM cache are flagged `cached` so they are not
+    counted as spent tokens.
     """
     usage = getattr(response, "usage_metadata", None)
     if usage:
-        token_usage_history.append({'agent': agent_name, 'usage': usage})
-
-def print_total_token_usage(token_usage_history):
+        task_id = current_task_id.get()
+        task_token_usage[task_id].append({'agent': agent_name, 'usage': usage, 'cached': cached})
+        if task_id and not cached:
+            task_tokens_spent[task_id] += usage.get('total_tokens', 0)
+        metrics.record_llm_call(agent_name, usage, cached)
+
+def task_usage_entries(task_id=None) -> list:
+    """Usage entries recorded so far for task_id (default: the current task)."""
+    return task_token_usage.get(task_id if task_id is not None else current_task_id.get(), [])
+
+def release_task_usage(task_id) -> list:
+    """Drop a finished task's ledger from memory and return its entries."""
+    task_tokens_spent.pop(task_id, None)
+    return task_token_usage.pop(task_id, [])
+
+def sum_token_usage(entries):
     total_tokens = defaultdict(int)
-    for entry in token_usage_history:
+    for entry in entries:
         usage = entry['usage']
         for k, v in usage.items():
             if isinstance(v, int):
@@ -73,40 +91,30 @@ def print_total_token_usage(token_usage_history):
                 for sub_k, sub_v in v.items():
                     flat_key = f"{k}.{sub_k}"  # e.g., input_token_details.cache_read
                     total_tokens[flat_key] += sub_v
-    print("\nTotal token usage by type:")
-    for k, v in total_tokens.items():
-        print(f"{k}: {v}")
-
-def logging_wrapper(fn, name):
-    def wrapped(state):
-        print(f"\n🟦 Running node: {name}")
-        print(f"🔷 Input state: {state}")
-
-        before_usage_count = len(token_usage_history)
-        result = fn(state)
-        
-        # Print the last prompt given to the agent, if present (after fn runs)
-        last_prompt = result.get('last_user_prompt', None)
-        if last_prompt:
-            print(f"📝 Prompt sent to agent:\n{last_prompt}\n")
-
-        print(f"🟩 Output from {name}: {result}\n")
-
-        # Print token usage for this run (if any new usage was added)
-        new_usages = token_usage_history[before_usage_count:]
-        if new_usages:
-            print(f"🟨 Token usage for {name}:")
-            for entry in new_usages:
-                print(f"    {entry['agent']}: {entry['usage']}")
-        else:
-            print(f"🟨 Token usage for {name}: No new usage recorded.")
-
-        return result
+    return total_tokens
+
+def summarize_task_usage(entries) -> dict:
+    """Billed and cache-served totals of a ledger, plus billed totals per agent."""
+    by_agent = defaultdict(list)
+    for entry in entries:
+        if not entry.get('cached'):
+            by_agent[entry['agent']].append(entry)
+    return {
+        "billed": dict(sum_token_usage(e for e in entries if not e.get('cached'))),
+        "cached": dict(sum_token_usage(e for e in entries if e.get('cached'))),
+        "calls": len(entries),
+        "by_agent": {agent: dict(sum_token_usage(items)) for agent, items in by_agent.items()},
+    }
 
-    return wrapped
-    # def wrapped(state):
-    #     return fn(state)
-    # return wrapped
+def merge_task_usage(a: dict, b: dict) -> dict:
+    """Add two summaries of summarize_task_usage (e.g. a failed run and its resume)."""
+    merged = dict(a)
+    for k, v in b.items():
+        if isinstance(v, dict):
+            merged[k] = merge_task_usage(merged.get(k, {}), v)
+        else:
+            merged[k] = merged.get(k, 0) + v
+    return merged
 
 def clean_markdown(md: str) -> str:
     lines = md.splitlines()
@@ -175,23 +183,21 @@ def clean_markdown(md: str) -> str:
 
     return '\n'.join(cleaned) + "\n"
 
-def convert_markdown_to_pdf(markdown_file: str, output_pdf: str):
-    if not os.path.exists(markdown_file):
-        raise FileNotFoundError(f"File not found -> '{markdown_file}'")
+_weasyprint = None
 
-    with open(markdown_file, 'r', encoding='utf-8') as f:
-        markdown_content = f.read()
+def load_weasyprint():
+    """Import weasyprint on first use and silence fontTools logging once."""
+    global _weasyprint
+    if _weasyprint is None:
+        import weasyprint
+        from fontTools.misc.loggingTools import configLogger
 
-    html = markdown2.markdown(markdown_content, extras=[
-        "fenced-code-blocks",
-        "tables",
-        "strike",
-        "cuddled-lists",
-        "header-ids",
-        "code-friendly"
-    ])
+        # --- Disable fontTools internal logging completely ---
+        configLogger(level=logging.CRITICAL)
+        _weasyprint = weasyprint
+    return _weasyprint
 
-    css = """
+PDF_CSS = """
 @page {
     size: A4;
     margin: 1in 0.7in 1.1in 0.7in;
@@ -242,9 +248,36 @@ ul, ol {
     margin-left: 1.5em;
 }
 """
+
+_pdf_stylesheet = None
+
+def get_pdf_stylesheet():
+    """PDF_CSS parsed once per process (render workers reuse it for every document)."""
+    global _pdf_stylesheet
+    if _pdf_stylesheet is None:
+        _pdf_stylesheet = load_weasyprint().CSS(string=PDF_CSS)
+    return _pdf_stylesheet
+
+def convert_markdown_to_pdf(markdown_file: str, output_pdf: str):
+    if not os.path.exists(markdown_file):
+        raise FileNotFoundError(f"File not found -> '{markdown_file}'")
+
+    with open(markdown_file, 'r', encoding='utf-8') as f:
+        markdown_content = f.read()
+
+    html = markdown2.markdown(markdown_content, extras=[
+        "fenced-code-blocks",
+        "tables",
+        "strike",
+        "cuddled-lists",
+        "header-ids",
+        "code-friendly"
+    ])
+
     full_html = f"<html><head><meta charset='utf-8'></head><body>{html}</body></html>"
 
-    HTML(string=full_html).write_pdf(output_pdf, stylesheets=[CSS(string=css)])
+    weasyprint = load_weasyprint()
+    weasyprint.HTML(string=full_html).write_pdf(output_pdf, stylesheets=[get_pdf_stylesheet()])
     return output_pdf
 
 def convert_markdown_to_pdf_test(markdown_file: str, output_pdf: str):
@@ -323,6 +356,8 @@ def convert_markdown_to_pdf_test(markdown_file: str, output_pdf: str):
     </html>
     """
 
+    from xhtml2pdf import pisa
+
     with open(output_pdf, "w+b") as output_file:
         pisa_status = pisa.CreatePDF(src=full_html, dest=output_file, encoding='utf-8')
 
@@ -1,18 +1,58 @@
 #workflow_graph.py
-from langgraph.graph import StateGraph, END
-from utils import logging_wrapper
+from langgraph.graph import StateGraph, START, END
+from tracing import trace_node
+from progress import progress_wrapper
+import inspect
 from agents import abap_code_analyst, foreign_dependency_agent, functional_spec_drafter, technical_spec_writer, manager_agent, output_reviewer, final_output
-# from typing_extensions import TypedDict
+from workflow_state import WorkflowState, STATE_KEYS, PROMPT_INPUTS, validate_prompts
+from agents import (
+    abap_code_analyst_async, foreign_dependency_agent_async, functional_spec_drafter_async,
+    technical_spec_writer_async, manager_agent_async, output_reviewer_async, final_output_async,
+)
 
-def build_workflow():
+# node name -> (sync agent, async agent)
+AGENT_NODES = {
+    "abap_code_analyst": (abap_code_analyst, abap_code_analyst_async),
+    "foreign_dependency_agent": (foreign_dependency_agent, foreign_dependency_agent_async),
+    "functional_spec_drafter": (functional_spec_drafter, functional_spec_drafter_async),
+    "technical_spec_writer": (technical_spec_writer, technical_spec_writer_async),
+    "manager_agent": (manager_agent, manager_agent_async),
+    "output_reviewer": (output_reviewer, output_reviewer_async),
+    "final_output": (final_output, final_output_async),
+}
+
+
+def agent_node(name, use_async=False):
+    """The traced node function for `name`; async nodes need app.ainvoke()."""
+    return progress_wrapper(trace_node(AGENT_NODES[name][1 if use_async else 0], name), name)
+
+
+def partial_update(fn, output_keys):
+    """
+    Run an agent on a private copy of the state and return only the keys it owns.
+    Agents mutate and return the whole state; in a fan-out step that would make
+    every branch write every key at once.
+    """
+    if inspect.iscoroutinefunction(fn):
+        async def wrapped_async(state):
+            result = await fn(dict(state))
+            return {k: result[k] for k in output_keys}
+        return wrapped_async
+
+    def wrapped(state):
+        result = fn(dict(state))
+        return {k: result[k] for k in output_keys}
+    return wrapped
+
+def build_workflow(use_async=False):
     workflow = StateGraph(dict)
-    workflow.add_node("abap_code_analyst", logging_wrapper(abap_code_analyst, "abap_code_analyst"))
-    workflow.add_node("functional_spec_drafter", logging_wrapper(functional_spec_drafter, "functional_spec_drafter"))
-    workflow.add_node("foreign_dependency_agent", logging_wrapper(foreign_dependency_agent, "foreign_dependency_agent"))
-    workflow.add_node("technical_spec_writer", logging_wrapper(technical_spec_writer, "technical_spec_writer"))
-    workflow.add_node("manager_agent", logging_wrapper(manager_agent, "manager_agent"))
-    workflow.add_node("output_reviewer", logging_wrapper(output_reviewer, "output_reviewer"))
-    workflow.add_node("final_output", logging_wrapper(final_output, "final_output"))
+    workflow.add_node("abap_code_analyst", agent_node("abap_code_analyst", use_async))
+    workflow.add_node("functional_spec_drafter", agent_node("functional_spec_drafter", use_async))
+    workflow.add_node("foreign_dependency_agent", agent_node("foreign_dependency_agent", use_async))
+    workflow.add_node("technical_spec_writer", agent_node("technical_spec_writer", use_async))
+    workflow.add_node("manager_agent", agent_node("manager_agent", use_async))
+    workflow.add_node("output_reviewer", agent_node("output_reviewer", use_async))
+    workflow.add_node("final_output", agent_node("final_output", use_async))
     workflow.set_entry_point("abap_code_analyst")
     
     # Normal edges
@@ -20,7 +60,6 @@ def build_workflow():
     workflow.add_edge("foreign_dependency_agent", "functional_spec_drafter")
     workflow.add_edge("functional_spec_drafter", "technical_spec_writer")
     workflow.add_edge("technical_spec_writer", "manager_agent")
-    workflow.add_edge("output_reviewer", "manager_agent")
     workflow.add_edge("final_output", END)
 
     # Conditional edges from manager_agent
@@ -35,4 +74,62 @@ def build_workflow():
             "final_output": "final_output",
         }
     )
+
+    # A review without issues skips the manager's revision (see convergence.py)
+    workflow.add_conditional_edges(
+        "output_reviewer",
+        lambda state: state["next_node"],
+        {
+            "manager_agent": "manager_agent",
+            "final_output": "final_output",
+        }
+    )
+    return workflow
+
+
+def build_parallel_workflow(use_async=False):
+    """
+    Same agents as build_workflow, with the independent ones fanned out:
+    foreign_dependency_agent runs alongside abap_code_analyst, then the FS and
+    TS drafters run together; manager_agent waits for all three branches.
+    """
+    workflow = StateGraph(WorkflowState)
+    workflow.add_node("abap_code_analyst", partial_update(agent_node("abap_code_analyst", use_async), ["abap_analysis"]))
+    workflow.add_node("foreign_dependency_agent", partial_update(agent_node("foreign_dependency_agent", use_async), ["foreign_dependencies"]))
+    workflow.add_node("functional_spec_drafter", partial_update(agent_node("functional_spec_drafter", use_async), ["fs_output"]))
+    workflow.add_node("technical_spec_writer", partial_update(agent_node("technical_spec_writer", use_async), ["ts_output"]))
+    workflow.add_node("manager_agent", agent_node("manager_agent", use_async))
+    workflow.add_node("output_reviewer", agent_node("output_reviewer", use_async))
+    workflow.add_node("final_output", agent_node("final_output", use_async))
+
+    # Fan out from the start: analysis and dependency scan only need code_input
+    workflow.add_edge(START, "abap_code_analyst")
+    workflow.add_edge(START, "foreign_dependency_agent")
+
+    # FS and TS drafting only need the analysis and the template
+    workflow.add_edge("abap_code_analyst", "functional_spec_drafter")
+    workflow.add_edge("abap_code_analyst", "technical_spec_writer")
+
+    # Join: manager_agent runs once all three branches have finished
+    workflow.add_edge(["foreign_dependency_agent", "functional_spec_drafter", "technical_spec_writer"], "manager_agent")
+    workflow.add_edge("final_output", END)
+
+    workflow.add_conditional_edges(
+        "manager_agent",
+        lambda state: state["next_node"],
+        {
+            "output_reviewer": "output_reviewer",
+            "final_output": "final_output",
+        }
+    )
+
+    # A review without issues skips the manager's revision (see convergence.py)
+    workflow.add_conditional_edges(
+        "output_reviewer",
+        lambda state: state["next_node"],
+        {
+            "manager_agent": "manager_agent",
+            "final_output": "final_output",
+        }
+    )
     return workflow
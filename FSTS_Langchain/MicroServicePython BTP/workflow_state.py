@@ -0,0 +1,66 @@
+# workflow_state.py
+# State schema and prompt inputs of the workflow. Kept free of LangGraph and
+# LLM imports so the API server can validate prompts at boot cheaply.
+from typing import Any
+from typing_extensions import TypedDict
+from prompt_registry import get_prompt_registry
+
+
+# Keyed state for the parallel graph: every key is its own channel, so branches
+# running in the same step can write different keys without conflicting.
+class WorkflowState(TypedDict, total=False):
+    task_id: str
+    code_input: str
+    abap_structure: str
+    analysis_code: str
+    template_text: str
+    model: Any  # optional: overrides llm_backends routing for every node
+    messages: list
+    review_count: int
+    review_rounds_saved: int
+    min_output_reviews: int
+    max_output_reviews: int
+    abap_analysis: str
+    foreign_dependencies: str
+    fs_output: str
+    ts_output: str
+    manager_output: str
+    review_feedback: str
+    last_user_prompt: str
+    next_node: str
+
+
+STATE_KEYS = set(WorkflowState.__annotations__)
+
+# Inputs build_manager_prompt formats the manager_agent prompt with
+MANAGER_PROMPT_KEYS = {"task_description", "task_expected_output", "template_text", "previous_manager_block", "feedback_block"}
+
+# Inputs of the chunked (map-reduce) analysis prompts, see chunked_analysis.py
+CHUNK_PROMPT_KEYS = {"chunk_index", "chunk_count", "routine_names", "chunk_code"}
+MERGE_PROMPT_KEYS = {"chunk_count", "partial_analyses", "abap_structure"}
+
+# Inputs of the incremental section revision prompt, see incremental.py
+SECTION_PROMPT_KEYS = {"changed_routines", "code_changes", "abap_structure", "section_text"}
+
+# Inputs of the manager's section-scoped revision prompt, see section_revision.py
+MANAGER_SECTION_PROMPT_KEYS = {"document_outline", "section_feedback", "section_text"}
+
+# Prompt name -> keys it is formatted with. generic_run_agent formats with the
+# whole workflow state; manager_agent builds its own blocks.
+PROMPT_INPUTS = {
+    "abap_code_analyst": STATE_KEYS,
+    "foreign_dependency_agent": STATE_KEYS,
+    "functional_spec_drafter": STATE_KEYS,
+    "technical_spec_writer": STATE_KEYS,
+    "output_reviewer": STATE_KEYS,
+    "manager_agent": MANAGER_PROMPT_KEYS,
+    "abap_chunk_analyst": CHUNK_PROMPT_KEYS,
+    "abap_analysis_merger": MERGE_PROMPT_KEYS,
+    "section_reviser": SECTION_PROMPT_KEYS,
+    "manager_section_reviser": MANAGER_SECTION_PROMPT_KEYS,
+}
+
+
+def validate_prompts():
+    """Load and compile every prompt; raise ValueError if any placeholder has no source."""
+    get_prompt_registry().validate(PROMPT_INPUTS)